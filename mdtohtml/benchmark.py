@@ -0,0 +1,1411 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Markdown to HTML converter
+Generates synthetic documents and times individual conversion stages
+"""
+
+import argparse
+import gc
+import http.client
+import json
+import os
+import random
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from html.parser import HTMLParser
+from pathlib import Path
+
+from md2html import (
+    CLASS_ATTRIBUTE_PATTERN, IMG_TAG_PATTERN, PRECOMPRESS_FORMATS, PRECOMPRESS_SUFFIXES, TABLE_PATTERN,
+    VIRTUAL_TABLE_MIN_ROWS, HeadingIndex, MarkdownToHtmlConverter, SearchIndexBuilder, collapse_toc,
+    convert_string_result, get_pygments_css, get_pygments_rules, virtualize_tables
+)
+from md2html_server import RENDER_PATH, RenderServer
+
+
+def build_document(heading_count, definitions=False):
+    """Build a synthetic report with chapters, related-chapter lists and references
+    
+    With definitions, chapters also cite footnotes, reference links and
+    abbreviations defined in other chapters, and link to an autolink.
+    """
+    lines = ['# Synthetic Handbook', '']
+    for number in range(1, heading_count + 1):
+        lines.append(f'## Topic Area {number}')
+        lines.append('')
+        lines.append(
+            f'Body text for topic area {number}. See **Chapter {number + 1}: '
+            f'Topic Area {number + 1}** and Appendix A: Topic Area {number}.'
+        )
+        lines.append('')
+        if definitions:
+            lines.append(
+                f'As the HTML spec[^note{number % 50}] and [its errata][spec{number % 20}] say, '
+                f'see <https://example.com/topics/{number}>.'
+            )
+            lines.append('')
+            if number % 10 == 0:
+                lines.append(f'[^note{number % 50}]: A note on the HTML spec[^note{(number + 10) % 50}].')
+                lines.append(f'[spec{number % 20}]: https://example.com/spec/{number} "Errata {number}"')
+                lines.append('')
+        if number % 10 == 0:
+            lines.append('### Related Chapters')
+            lines.append('')
+            for offset in range(1, 4):
+                lines.append(f'- Topic Area {number + offset}')
+            lines.append('')
+    if definitions:
+        lines += ['*[HTML]: HyperText Markup Language', '']
+    return '\n'.join(lines)
+
+
+def build_corpus_document(number, document_count, heading_count):
+    """Build report number of a corpus whose chapters reference the next report's"""
+    target = (number + 1) % document_count
+    lines = [f'# Report {number}', '']
+    for chapter in range(1, heading_count + 1):
+        lines += [f'## Report {number} Chapter {chapter}', '', f'Findings of chapter {chapter}.', '']
+        lines += [f'Chapter {chapter}: Report {target} Chapter {chapter}', '']
+    return '\n'.join(lines)
+
+
+def build_outline_document(heading_count):
+    """Build a document of chapters, sections and subsections with heading_count headings"""
+    lines = []
+    for number in range(heading_count):
+        # One chapter per 20 headings, each section followed by three subsections
+        level = 1 if number % 20 == 0 else 2 if number % 4 == 1 else 3
+        lines.extend([f"{'#' * level} Heading {number}", '', f'Text under heading {number}.', ''])
+    return '\n'.join(lines)
+
+
+CODE_SAMPLES = {
+    'python': (
+        'def handle_{n}(request, retries=3):\n'
+        '    """Process request {n} with retries"""\n'
+        '    for attempt in range(retries):\n'
+        '        try:\n'
+        '            return dispatch(request, timeout=attempt * 2.5)\n'
+        '        except TimeoutError as err:\n'
+        '            log.warning("attempt %d failed: %s", attempt, err)\n'
+        '    raise RuntimeError(f"request {{request.id}} failed")\n'
+    ),
+    'javascript': (
+        'async function load{n}(url, options = {{}}) {{\n'
+        '  const response = await fetch(url, {{ ...options, cache: "no-store" }});\n'
+        '  if (!response.ok) throw new Error(`${{response.status}} for ${{url}}`);\n'
+        '  return response.json().then(data => data.items.filter(item => item.id > {n}));\n'
+        '}}\n'
+    ),
+    'sql': (
+        'SELECT region, COUNT(*) AS accounts, SUM(revenue) AS total\n'
+        'FROM customers c JOIN orders o ON o.customer_id = c.id\n'
+        'WHERE o.created_at > NOW() - INTERVAL \'{n} days\'\n'
+        'GROUP BY region ORDER BY total DESC;\n'
+    ),
+}
+
+
+def build_code_document(block_count, distinct):
+    """Build a document of fenced code blocks cycling through distinct variants"""
+    lines = ['# Code Handbook', '']
+    languages = list(CODE_SAMPLES)
+    for number in range(block_count):
+        variant = number % distinct
+        language = languages[variant % len(languages)]
+        lines.append(f'## Example {number + 1}')
+        lines.append('')
+        lines.append(f'```{language}')
+        lines.append(CODE_SAMPLES[language].format(n=variant).rstrip('\n'))
+        lines.append('```')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def build_table_document(row_count):
+    """Build an appendix with one large data table and one small one"""
+    lines = ['# Data Appendix', '', '## Measurements', '', '| ID | Site | Reading | Code |', '|---:|:-----|------:|------|']
+    for number in range(row_count):
+        lines.append(f'| {number} | Site <{number % 97}> & annex | {number * 7919 % 100000 / 100} | `S-{number % 13}` |')
+    lines += ['', '## Legend', '', '| Code | Meaning |', '|------|---------|', '| S | Sensor |', '']
+    return '\n'.join(lines)
+
+
+def build_dictionary_document(size):
+    """Build a data dictionary of about size bytes: a heading and a column table per entity"""
+    lines = ['# Data Dictionary', '']
+    entity = 0
+    total = 0
+    while total < size:
+        entity += 1
+        block = [
+            f'## Table customer_{entity}', '',
+            f'Records for entity {entity}. Chapter 1: Table customer_{entity + 1}', '',
+            '| Column | Type | Description |', '|---|---|---|',
+        ]
+        block += [
+            f'| field_{entity}_{column} | varchar({column * 8}) | Attribute {column} of entity {entity}, '
+            f'see `code_{column}` and *notes* |'
+            for column in range(30)
+        ]
+        block.append('')
+        total += sum(len(line) + 1 for line in block)
+        lines += block
+    return '\n'.join(lines)
+
+
+def build_image_document(workdir, image_count, width):
+    """Write image_count noisy PNG screenshots and a report that shows them"""
+    from PIL import Image, ImageDraw
+
+    lines = ['# Image Report', '']
+    height = width * 5 // 8
+    for number in range(1, image_count + 1):
+        image = Image.effect_noise((width // 4, height // 4), 24).convert('RGB')
+        draw = ImageDraw.Draw(image)
+        for band in range(0, image.width, 40):
+            draw.rectangle((band, 0, band + 20, image.height), fill=(number * 37 % 256, band % 256, 160))
+        image = image.resize((width, height))
+        image.save(Path(workdir) / f'figure-{number}.png')
+        lines.extend([f'## Figure {number}', '', f'![Figure {number}](figure-{number}.png)', ''])
+    # A small diagram that ends up inlined
+    Image.new('RGB', (96, 64), (30, 64, 175)).save(Path(workdir) / 'icon.png')
+    lines.extend(['![Icon](icon.png)', ''])
+    markdown_file = Path(workdir) / 'report.md'
+    markdown_file.write_text('\n'.join(lines), encoding='utf-8')
+    return markdown_file
+
+
+def page_weight(output_file, image_dir):
+    """Return the bytes a browser loads for output_file, its images included"""
+    html_content = output_file.read_text(encoding='utf-8')
+    total = len(html_content.encode('utf-8'))
+    for attributes, _ in IMG_TAG_PATTERN.findall(html_content):
+        src = attributes.split(' src="', 1)[1].split('"', 1)[0]
+        if not src.startswith('data:'):
+            total += (image_dir / src).stat().st_size
+    return total, html_content
+
+
+def benchmark_crossrefs(args):
+    """Time the cross-reference treeprocessor as the heading count grows"""
+    converter = MarkdownToHtmlConverter()
+    converter._render_markdown('')
+    processor = converter.md.treeprocessors['cross_references']
+    run = processor.run
+    timings = []
+
+    def timed_run(root):
+        # Disable the collector while timing, as timeit does
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        run(root)
+        timings.append(time.perf_counter() - start)
+        gc.enable()
+
+    processor.run = timed_run
+    previous = None
+
+    print(f"{'headings':>10} {'html bytes':>12} {'seconds':>10} {'us/heading':>12} {'growth':>8}")
+    for heading_count in args.sizes:
+        md_content = build_document(heading_count)
+
+        timings.clear()
+        for _ in range(args.repeat):
+            html_content, _ = converter._render_markdown(md_content)
+        best = min(timings)
+
+        growth = f'{best / previous:.2f}x' if previous else '-'
+        print(f'{heading_count:>10} {len(html_content):>12} {best:>10.4f} '
+              f'{best / heading_count * 1e6:>12.1f} {growth:>8}')
+        previous = best
+
+    # Doubling the heading count should roughly double the time
+    print('\nLinear scaling shows as a constant us/heading and ~2x growth per doubling.')
+
+
+def benchmark_corpus(args):
+    """Time building a heading index across documents and adding one document to it"""
+    with tempfile.TemporaryDirectory() as workdir:
+        input_files = []
+        for number in range(args.documents):
+            input_file = Path(workdir) / f'report_{number}.md'
+            input_file.write_text(build_corpus_document(number, args.documents, args.headings), encoding='utf-8')
+            input_files.append(input_file)
+
+        converter = MarkdownToHtmlConverter()
+        index_file = Path(workdir) / 'headings.json'
+        runs = []
+        for label in ('initial', 'unchanged', 'one added'):
+            if label == 'one added':
+                input_file = Path(workdir) / f'report_{args.documents}.md'
+                input_file.write_text(
+                    build_corpus_document(args.documents, args.documents + 1, args.headings), encoding='utf-8'
+                )
+                input_files.append(input_file)
+            start = time.perf_counter()
+            heading_index = HeadingIndex(index_file)
+            indexed = sum(heading_index.update(converter, input_file) for input_file in input_files)
+            corpus_headings = heading_index.lookup()
+            heading_index.save()
+            runs.append((label, time.perf_counter() - start, indexed))
+
+        print(f'{len(input_files)} documents of {args.headings} chapters, {len(corpus_headings)} headings indexed')
+        print(f"{'run':>10} {'ms':>10} {'files indexed':>14}")
+        for label, elapsed, indexed in runs:
+            print(f'{label:>10} {elapsed * 1000:>10.1f} {indexed:>14}')
+
+        # Every reference in the first report should link to the next one
+        converter = MarkdownToHtmlConverter(corpus_headings=corpus_headings)
+        output_file = converter.convert(input_files[0])
+        page = output_file.read_text(encoding='utf-8')
+        target = Path(corpus_headings['Report 1 Chapter 1'][0]).name
+        links = re.findall(rf'<a href="{re.escape(target)}#([^"]*)">', page)
+        target_page = converter.convert(input_files[1]).read_text(encoding='utf-8')
+        failures = 0
+        resolved = sum(f'id="{heading_id}"' in target_page for heading_id in links)
+        if len(links) != args.headings or resolved != len(links):
+            failures += 1
+            print(f'Expected {args.headings} links into {target}, found {len(links)} ({resolved} resolve)',
+                  file=sys.stderr)
+        if runs[1][2] != 0 or runs[2][2] != 1:
+            failures += 1
+            print('Unchanged documents were indexed again', file=sys.stderr)
+
+    print('Cross-document references resolve' if not failures else f'{failures} check(s) failed')
+    return 1 if failures else 0
+
+
+def benchmark_batch(args):
+    """Time a batch conversion with a fresh engine per file versus a reused one"""
+    with tempfile.TemporaryDirectory() as workdir:
+        input_files = []
+        for number in range(args.files):
+            input_file = Path(workdir) / f'report_{number}.md'
+            input_file.write_text(build_document(args.headings), encoding='utf-8')
+            input_files.append(input_file)
+
+        # Cold: a new converter and a regenerated stylesheet for every file,
+        # matching the per-call setup cost of earlier versions
+        start = time.perf_counter()
+        for input_file in input_files:
+            get_pygments_css.cache_clear()
+            MarkdownToHtmlConverter().convert(input_file)
+        cold = time.perf_counter() - start
+
+        # Warm: one converter whose engine and stylesheet are reused
+        converter = MarkdownToHtmlConverter()
+        start = time.perf_counter()
+        for input_file in input_files:
+            converter.convert(input_file)
+        warm = time.perf_counter() - start
+
+    print(f"{'mode':>6} {'seconds':>10} {'ms/file':>10}")
+    for mode, elapsed in (('cold', cold), ('warm', warm)):
+        print(f'{mode:>6} {elapsed:>10.2f} {elapsed / args.files * 1000:>10.2f}')
+    print(f'\nReusing the engine saves {(cold - warm) / cold * 100:.1f}% on {args.files} files.')
+
+
+def benchmark_sections(args):
+    """Re-render a document after one-word edits with and without the section cache"""
+    md_content = Path(args.document).read_text(encoding='utf-8')
+    full = MarkdownToHtmlConverter(toc_depth=args.toc_depth)
+    cached = MarkdownToHtmlConverter(toc_depth=args.toc_depth, section_cache=True)
+    sections = cached._split_sections(md_content)
+    if not sections or len(sections) < 2:
+        print(f'{args.document} cannot be split into sections; it is always rendered in full')
+        return 1
+
+    # Warm the cache with the unedited document
+    cached._render_markdown(md_content)
+
+    full_time = cached_time = 0.0
+    mismatches = 0
+    for edit in range(args.edits):
+        # Replace one word in one section
+        index = edit % len(sections)
+        edited = list(sections)
+        edited[index] = edited[index].replace(' the ', f' the edit{edit} ', 1)
+        document = ''.join(edited)
+
+        start = time.perf_counter()
+        expected = full._render_markdown(document)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = cached._render_markdown(document)
+        cached_time += time.perf_counter() - start
+
+        if actual != expected:
+            mismatches += 1
+            print(f'Mismatch after editing section {index + 1}', file=sys.stderr)
+
+    print(f'{len(sections)} sections, {args.edits} single-word edits')
+    print(f"{'mode':>8} {'ms/render':>10}")
+    print(f"{'full':>8} {full_time / args.edits * 1000:>10.2f}")
+    print(f"{'cached':>8} {cached_time / args.edits * 1000:>10.2f}")
+    print('Output identical to a full render' if not mismatches else f'{mismatches} mismatched render(s)')
+    return 1 if mismatches else 0
+
+
+def benchmark_search(args):
+    """Time building the embedded search index for a large document"""
+    converter = MarkdownToHtmlConverter()
+    heading_count = 100
+    while True:
+        html_content, _ = converter._render_markdown(build_document(heading_count))
+        if len(html_content) >= args.size * 1024 * 1024:
+            break
+        heading_count *= 2
+
+    start = time.perf_counter()
+    search_sections, search_index = converter._build_search_index(SearchIndexBuilder().build(html_content))
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(html_content) / 1024 / 1024:.1f} MB of HTML, {heading_count} headings')
+    print(f'Index built in {elapsed:.2f}s: {len(search_index) / 1024:.0f} KB of postings, '
+          f'{len(search_sections) / 1024:.0f} KB of section ids')
+
+
+def benchmark_toc(args):
+    """Count the TOC links a page lays out up front, with and without collapsed subtrees"""
+    converter = MarkdownToHtmlConverter(toc_depth=6)
+    _, toc_html = converter._render_markdown(build_outline_document(args.headings))
+
+    start = time.perf_counter()
+    collapsed = collapse_toc(toc_html)
+    elapsed = time.perf_counter() - start
+
+    # Links nested in a <template> are not rendered until expanded
+    visible = depth = 0
+    for part in re.split(r'(</?template>|<a )', collapsed):
+        if part == '<template>':
+            depth += 1
+        elif part == '</template>':
+            depth -= 1
+        elif part == '<a ' and depth == 0:
+            visible += 1
+
+    links = re.findall(r'<a href="([^"]*)"', toc_html)
+    print(f'{args.headings} headings, TOC collapsed in {elapsed * 1000:.1f} ms')
+    print(f"{'mode':>10} {'links laid out':>15}")
+    print(f"{'full':>10} {len(links):>15}")
+    print(f"{'collapsed':>10} {visible:>15}")
+    if re.findall(r'<a href="([^"]*)"', collapsed) != links:
+        print('The collapsed TOC lost or reordered links', file=sys.stderr)
+        return 1
+    return 0
+
+
+def benchmark_tables(args):
+    """Compare a page with a large table as markup and as a virtual table"""
+    converter = MarkdownToHtmlConverter()
+    html_content, _ = converter._render_markdown(build_table_document(args.rows))
+
+    start = time.perf_counter()
+    virtual = virtualize_tables(html_content, args.min_rows)
+    elapsed = time.perf_counter() - start
+
+    print(f'{args.rows}-row table virtualized in {elapsed * 1000:.1f} ms')
+    print(f"{'mode':>8} {'KB':>10} {'rows in DOM':>12}")
+    for mode, content in (('markup', html_content), ('virtual', virtual)):
+        # Rows inside the JSON payload are data, not elements
+        rows = re.sub(r'<script\b.*?</script>', '', content, flags=re.DOTALL).count('<tr>')
+        print(f'{mode:>8} {len(content.encode("utf-8")) / 1024:>10.1f} {rows:>12}')
+
+    # The rows printing renders from the payload must match the original markup
+    failures = 0
+    tables = [match.group('body') for match in TABLE_PATTERN.finditer(html_content)]
+    payloads = re.findall(r'class="virtual-table-data">(.*?)</script>', virtual, re.DOTALL)
+    if len(payloads) != sum(body.count('<tr>') >= args.min_rows for body in tables):
+        failures += 1
+        print(f'Expected every table of at least {args.min_rows} rows to be virtualized', file=sys.stderr)
+    for payload, body in zip(payloads, (body for body in tables if body.count('<tr>') >= args.min_rows)):
+        data = json.loads(payload)
+        rendered = ''.join(
+            '<tr>\n' + ''.join(f'<td{attributes}>{cell}</td>\n' for attributes, cell in zip(data['columns'], row)) + '</tr>\n'
+            for row in data['rows']
+        )
+        if rendered != body:
+            failures += 1
+            print('A virtual table does not render its original rows', file=sys.stderr)
+    print('Virtual tables render their original rows' if not failures else f'{failures} table check(s) failed')
+    return 1 if failures else 0
+
+
+def benchmark_highlight(args):
+    """Time code highlighting without a cache, with a cold and warm disk cache, and in parallel"""
+    md_content = build_code_document(args.blocks, args.distinct)
+    with tempfile.TemporaryDirectory() as workdir:
+        modes = [
+            ('uncached', {}),
+            ('cold', {'highlight_cache': Path(workdir) / 'serial'}),
+            ('warm', {'highlight_cache': Path(workdir) / 'serial'}),
+        ]
+        if args.jobs > 1:
+            modes.append((f'{args.jobs} jobs', {
+                'highlight_cache': Path(workdir) / 'parallel',
+                'highlight_jobs': args.jobs,
+            }))
+
+        # Import the lexers up front so the first mode is not charged for it
+        MarkdownToHtmlConverter()._render_markdown(build_code_document(len(CODE_SAMPLES), len(CODE_SAMPLES)))
+
+        expected = None
+        mismatches = 0
+        print(f'{args.blocks} fenced blocks, {args.distinct} distinct')
+        print(f"{'mode':>10} {'seconds':>10}")
+        for mode, options in modes:
+            converter = MarkdownToHtmlConverter(**options)
+            start = time.perf_counter()
+            html_content, _ = converter._render_markdown(md_content)
+            elapsed = time.perf_counter() - start
+            print(f'{mode:>10} {elapsed:>10.3f}')
+            if expected is None:
+                expected = html_content
+            elif html_content != expected:
+                mismatches += 1
+                print(f'{mode} output differs from the uncached render', file=sys.stderr)
+
+    print('Output identical in every mode' if not mismatches else f'{mismatches} mismatched render(s)')
+    return 1 if mismatches else 0
+
+
+def benchmark_compress(args):
+    """Compare bytes served per page with the full and pruned Pygments CSS, plain and precompressed"""
+    documents = [
+        ('report', Path(args.document).read_text(encoding='utf-8')),
+        ('code', build_code_document(args.blocks, args.blocks)),
+    ]
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        converter = MarkdownToHtmlConverter(precompress=args.formats)
+        full_css = len(get_pygments_css('github-dark').encode('utf-8'))
+        print(f"{'document':>9} {'CSS full':>9} {'CSS pruned':>11} {'KB':>8}"
+              + ''.join(f" {f'KB {compression}':>10}" for compression in args.formats))
+        for name, md_content in documents:
+            output_file = Path(workdir) / f'{name}.html'
+            converter.convert_content(md_content, Path(workdir) / f'{name}.md', output_file)
+            page = output_file.read_text(encoding='utf-8')
+            css = page[page.index('/* Syntax highlighting (Pygments) */'):]
+            css = css[:css.index('</style>')].split('*/', 1)[1].strip()
+
+            # Every rule for a class the content uses must survive pruning
+            used = {name for names in CLASS_ATTRIBUTE_PATTERN.findall(page) for name in names.split()}
+            missing = [rule for name, rule in get_pygments_rules('github-dark')
+                       if name in used and 'highlight' in used and rule not in css]
+            if missing:
+                failures += 1
+                print(f'{name}: pruned CSS lost {len(missing)} rule(s) in use, e.g. {missing[0]}', file=sys.stderr)
+
+            sizes = []
+            for compression in args.formats:
+                variant = output_file.with_name(output_file.name + PRECOMPRESS_SUFFIXES[compression])
+                compressed = variant.read_bytes()
+                if compression == 'gzip':
+                    import gzip
+                    restored = gzip.decompress(compressed)
+                else:
+                    import brotli
+                    restored = brotli.decompress(compressed)
+                if restored != page.encode('utf-8'):
+                    failures += 1
+                    print(f'{variant.name} does not decompress to the page', file=sys.stderr)
+                sizes.append(len(compressed))
+            print(f'{name:>9} {full_css:>9} {len(css.encode("utf-8")):>11} {len(page.encode("utf-8")) / 1024:>8.1f}'
+                  + ''.join(f' {size / 1024:>10.1f}' for size in sizes))
+
+    print('Pruned CSS and precompressed copies match the page' if not failures else f'{failures} check(s) failed')
+    return 1 if failures else 0
+
+
+def benchmark_parallel(args):
+    """Render a large document serially and split across worker processes"""
+    # Size the document from a sample rather than rendering candidates
+    sample = build_document(100)
+    md_content = build_document(max(100, int(100 * args.size * 1024 * 1024 / len(sample))))
+
+    start = time.perf_counter()
+    expected = MarkdownToHtmlConverter()._render_markdown(md_content)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = MarkdownToHtmlConverter(section_jobs=args.jobs)._render_markdown(md_content)
+    parallel = time.perf_counter() - start
+
+    print(f'{len(md_content) / 1024 / 1024:.1f} MB of markdown')
+    print(f"{'mode':>10} {'seconds':>10}")
+    print(f"{'serial':>10} {serial:>10.2f}")
+    print(f"{f'{args.jobs} jobs':>10} {parallel:>10.2f}")
+    if actual != expected:
+        print('Parallel output differs from the serial render', file=sys.stderr)
+        return 1
+    
+    # Footnotes, reference links and abbreviations resolve across sections
+    md_content = build_document(max(100, int(100 * args.size * 1024 * 1024 / len(sample) / 2)), definitions=True)
+    converter = MarkdownToHtmlConverter(section_jobs=args.jobs)
+    if not converter._split_sections(md_content):
+        print('A document with definitions is rendered in one process', file=sys.stderr)
+        return 1
+    if converter._render_markdown(md_content) != MarkdownToHtmlConverter()._render_markdown(md_content):
+        print('Parallel output with definitions differs from the serial render', file=sys.stderr)
+        return 1
+    print(f'Output identical, {serial / parallel:.2f}x speedup, also with footnotes, reference links and abbreviations')
+    return 0
+
+
+def benchmark_serve(args):
+    """Time render service requests against running the CLI once per document"""
+    # Distinct documents of about --size KB, so every request renders
+    sample = build_document(100)
+    heading_count = max(10, int(100 * args.size * 1024 / len(sample)))
+    documents = [
+        build_document(heading_count).replace('Body text', f'Request {number} body text')
+        for number in range(args.requests)
+    ]
+
+    server = RenderServer(('127.0.0.1', 0), MarkdownToHtmlConverter, {}, jobs=args.jobs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+
+        def post(number, document, headers=None):
+            start = time.perf_counter()
+            connection.request('POST', f'{RENDER_PATH}?name=report-{number}', body=document.encode('utf-8'),
+                               headers=headers or {})
+            response = connection.getresponse()
+            page = response.read()
+            return time.perf_counter() - start, response, page
+
+        timings = {'rendered': [], 'edited': [], 'cached': [], 'not modified': []}
+        etags = []
+        for number, document in enumerate(documents):
+            elapsed, response, page = post(number, document)
+            timings['rendered'].append(elapsed)
+            etags.append(response.getheader('ETag'))
+            # A one-word edit re-renders only the section it touches
+            timings['edited'].append(post(number, document.replace('Topic Area 3.', 'Topic Area 3 (edited).', 1))[0])
+        for number, (document, etag) in enumerate(zip(documents, etags)):
+            timings['cached'].append(post(number, document)[0])
+            timings['not modified'].append(post(number, document, {'If-None-Match': etag})[0])
+
+        # The service must send exactly what the converter renders
+        expected = ''.join(MarkdownToHtmlConverter().render_content(documents[0], Path.cwd() / 'report-0.md'))
+        _, response, page = post(0, documents[0])
+        # A wildcard If-None-Match cannot match the page a POST creates
+        _, wildcard, _ = post(0, documents[0], {'If-None-Match': '*'})
+        # A negative length must not make the service read until the client closes
+        connection.putrequest('POST', RENDER_PATH)
+        connection.putheader('Content-Length', '-1')
+        connection.endheaders(b'# Unbounded\n')
+        rejected = connection.getresponse()
+        rejected.read()
+        connection.close()
+
+        # Kill every worker, as the OOM killer would; the service must start new ones
+        for executor in server.executors:
+            os.kill(executor.submit(os.getpid).result(), signal.SIGKILL)
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+        # New names, so no response comes from the cache
+        recovered = [post(len(documents) + number, document)[1].status
+                     for number, document in enumerate(documents[:2] * 2)]
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        markdown_file = Path(workdir) / 'document.md'
+        markdown_file.write_text(documents[0], encoding='utf-8')
+        cli_timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, str(Path(__file__).parent / 'md2html.py'), str(markdown_file)],
+                           check=True, stdout=subprocess.DEVNULL)
+            cli_timings.append(time.perf_counter() - start)
+
+    print(f'{args.requests} requests of {len(documents[0]) / 1024:.0f} KB, {args.jobs} worker(s)')
+    print(f"{'mode':>14} {'p50 ms':>10} {'p95 ms':>10}")
+    for mode, samples in list(timings.items()) + [('cli process', cli_timings)]:
+        samples = sorted(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f'{mode:>14} {statistics.median(samples) * 1000:>10.1f} {p95 * 1000:>10.1f}')
+    if page.decode('utf-8') != expected:
+        print('The service response differs from a direct render', file=sys.stderr)
+        return 1
+    if recovered != [200] * len(recovered):
+        print(f'After its workers were killed the service answered {recovered}', file=sys.stderr)
+        return 1
+    if wildcard.status != 200 or rejected.status != 400:
+        print(f'If-None-Match: * answered {wildcard.status} and a negative Content-Length '
+              f'{rejected.status}, expected 200 and 400', file=sys.stderr)
+        return 1
+    print('Service output identical to a direct render, and killed workers are replaced')
+    return 0
+
+
+def benchmark_stream(args):
+    """Compare streaming a page to disk with building it in memory first"""
+    converter = MarkdownToHtmlConverter(toc_depth=args.toc_depth)
+    with tempfile.TemporaryDirectory() as workdir:
+        output_file = Path(workdir) / 'page.html'
+
+        # Warm the engine so both runs measure steady-state conversions
+        converter.convert(args.document, output_file)
+        output_file.unlink()
+
+        # The static head, stylesheet included, must not wait for the render
+        first_chunk = stylesheet = None
+        start = time.perf_counter()
+        for chunk in converter.render(args.document, output_file):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            if stylesheet is None and '</style>' in chunk:
+                stylesheet = time.perf_counter() - start
+        total = time.perf_counter() - start
+
+        tracemalloc.start()
+        page = ''.join(converter.render(args.document, output_file))
+        output_file.write_text(page, encoding='utf-8')
+        del page
+        joined_peak = tracemalloc.get_traced_memory()[1]
+        output_file.unlink()
+        tracemalloc.reset_peak()
+        converter.convert(args.document, output_file)
+        streamed_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f'First chunk after {first_chunk * 1000:.2f} ms and the stylesheet after '
+          f'{stylesheet * 1000:.2f} ms of a {total * 1000:.1f} ms render')
+    print(f"{'mode':>8} {'peak MB':>10}")
+    print(f"{'joined':>8} {joined_peak / 1024 / 1024:>10.2f}")
+    print(f"{'streamed':>8} {streamed_peak / 1024 / 1024:>10.2f}")
+    if stylesheet > total / 10:
+        print('The stylesheet waited for the markdown to render', file=sys.stderr)
+        return 1
+    return 0
+
+
+# Peak traced memory a low-memory conversion may reach, in window sizes
+MEMORY_PEAK_FACTOR = 100
+
+
+def merge_search_indexes(indexes):
+    """Merge a low-memory page's per-window search indexes as the page script does"""
+    merged = {}
+    for index in indexes:
+        for term, postings in index.items():
+            merged_postings = merged.setdefault(term, [])
+            for section in postings:
+                if not merged_postings or merged_postings[-1] != section:
+                    merged_postings.append(section)
+    return merged
+
+
+def benchmark_memory(args):
+    """Measure peak memory of low-memory conversions against converting in memory"""
+    window = args.window * 1024
+    search_index_pattern = re.compile(r'(<script type="application/json" id="searchIndex">)(.*?)(</script>)', re.DOTALL)
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        # Warm the engines first, so imports don't count towards the peaks
+        warmup_file = Path(workdir) / 'warmup.md'
+        warmup_file.write_text(build_dictionary_document(window), encoding='utf-8')
+        MarkdownToHtmlConverter(low_memory=window).convert(warmup_file)
+
+        print(f"{'KB':>6} {'mode':>10} {'seconds':>10} {'peak MB':>10} {'peak/window':>12}")
+        for size in (args.size * 1024 // 4, args.size * 1024):
+            input_file = Path(workdir) / f'dictionary_{size}.md'
+            input_file.write_text(build_dictionary_document(size), encoding='utf-8')
+            pages = {}
+            modes = [('low memory', window)] + ([('in memory', None)] if size == args.size * 1024 else [])
+            for mode, low_memory in modes:
+                output_file = Path(workdir) / f"{mode.replace(' ', '_')}.html"
+                converter = MarkdownToHtmlConverter(low_memory=low_memory)
+                gc.collect()
+                tracemalloc.start()
+                start = time.perf_counter()
+                converter.convert(input_file, output_file)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                pages[mode] = output_file.read_text(encoding='utf-8')
+                print(f'{size // 1024:>6} {mode:>10} {elapsed:>10.2f} {peak / 1024 / 1024:>10.2f} {peak / window:>12.1f}')
+                if low_memory and peak > MEMORY_PEAK_FACTOR * window:
+                    failures += 1
+                    print(f'Peak of {peak} bytes exceeds {MEMORY_PEAK_FACTOR} windows of {window} bytes',
+                          file=sys.stderr)
+
+        # The pages differ only in how the search index is split
+        low_memory_index = merge_search_indexes(json.loads(search_index_pattern.search(pages['low memory']).group(2)))
+        in_memory_index = json.loads(search_index_pattern.search(pages['in memory']).group(2))
+        if low_memory_index != in_memory_index or \
+                search_index_pattern.sub('', pages['low memory']) != search_index_pattern.sub('', pages['in memory']):
+            failures += 1
+            print('Low-memory page differs from the in-memory page', file=sys.stderr)
+
+    print(f'Low-memory peaks stay within {MEMORY_PEAK_FACTOR} windows and the pages match' if not failures
+          else f'{failures} check(s) failed')
+    return 1 if failures else 0
+
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+CSS_RULE_PATTERN = re.compile(r'([^{};]+)\{([^{}]*)\}')
+UNIVERSAL_SELECTOR_PATTERN = re.compile(r'(?:^|[\s>+~,])\*')
+TRANSITION_PATTERN = re.compile(r'(?<![\w-])transition(?:-property)?\s*:')
+
+
+class PageCounter(HTMLParser):
+    """Count a page's elements and what the browser lays out up front
+    
+    Elements in a lazy section are laid out only near the viewport, except
+    those of the first, which is in view when the page opens.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.elements = 0
+        self.content_elements = 0
+        self.deferred_elements = 0
+        self.content_children = 0
+        self.lazy_sections = 0
+        self.headings = []
+        self.text = []
+        self.styles = []
+        self.stack = []
+        self.content_depth = None
+        self.lazy_depth = None
+        self.in_style = False
+    
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        self.elements += 1
+        depth = len(self.stack)
+        if self.content_depth is not None:
+            self.content_elements += 1
+            if depth == self.content_depth + 1:
+                self.content_children += 1
+            if self.lazy_depth is not None and self.lazy_sections > 1:
+                self.deferred_elements += 1
+            if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+                self.headings.append((int(tag[1]), self.lazy_depth is not None))
+            if 'lazy-section' in (attributes.get('class') or '').split() and self.lazy_depth is None:
+                self.lazy_sections += 1
+                self.lazy_depth = depth
+        elif attributes.get('id') == 'content':
+            self.content_depth = depth
+        self.in_style = tag == 'style'
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+    
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS or tag not in self.stack:
+            return
+        while self.stack.pop() != tag:
+            pass
+        depth = len(self.stack)
+        if depth == self.lazy_depth:
+            self.lazy_depth = None
+        if depth == self.content_depth:
+            self.content_depth = None
+        self.in_style = False
+    
+    def handle_data(self, data):
+        if self.in_style:
+            self.styles.append(data)
+        elif self.content_depth is not None and data.strip():
+            self.text.append(''.join(data.split()))
+
+
+def css_rules(css):
+    """Return the (selector, declarations) of a stylesheet's rules, at-rules left out"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    return [
+        (selector.strip(), declarations) for selector, declarations in CSS_RULE_PATTERN.findall(css)
+        if not selector.strip().startswith('@')
+    ]
+
+
+def benchmark_paint(args):
+    """Compare the DOM and styles a page lays out up front with and without lazy sections"""
+    modes = [
+        ('standard', {}),
+        ('lazy', {'lazy_sections': True}),
+        ('lazy, windows', {'lazy_sections': True, 'low_memory': args.window * 1024}),
+    ]
+    failures = 0
+    counters = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        input_file = Path(workdir) / 'handbook.md'
+        input_file.write_text(build_document(args.headings), encoding='utf-8')
+        print(f'{args.headings} chapters')
+        print(f"{'mode':>14} {'KB':>8} {'elements':>9} {'laid out':>9} {'content children':>17} "
+              f"{'CSS rules':>10} {'universal':>10} {'transitions':>12}")
+        for mode, options in modes:
+            output_file = Path(workdir) / f"{mode.replace(', ', '_')}.html"
+            MarkdownToHtmlConverter(**options).convert(input_file, output_file)
+            page = output_file.read_text(encoding='utf-8')
+            counter = counters[mode] = PageCounter()
+            counter.feed(page)
+            css = ''.join(counter.styles)
+            rules = css_rules(css)
+            universal = [declarations for selector, declarations in rules if UNIVERSAL_SELECTOR_PATTERN.search(selector)]
+            transitions = sum(len(TRANSITION_PATTERN.findall(declarations)) for _, declarations in rules)
+            laid_out = counter.elements - counter.deferred_elements
+            print(f'{mode:>14} {len(page.encode("utf-8")) / 1024:>8.1f} {counter.elements:>9} {laid_out:>9} '
+                  f'{counter.content_children:>17} {len(rules):>10} {len(universal):>10} {transitions:>12}')
+            
+            if options.get('lazy_sections'):
+                if any(TRANSITION_PATTERN.search(declarations) for declarations in universal):
+                    failures += 1
+                    print(f'{mode}: every element still has a transition', file=sys.stderr)
+                levels = [level for level, _ in counter.headings]
+                top_level = min(level for level in set(levels) if levels.count(level) > 1)
+                if not all(lazy for level, lazy in counter.headings if level == top_level):
+                    failures += 1
+                    print(f'{mode}: a top-level heading is outside a lazy section', file=sys.stderr)
+                if counter.text != counters['standard'].text:
+                    failures += 1
+                    print(f'{mode}: the content differs from the standard page', file=sys.stderr)
+    
+    print('Lazy pages keep the content, wrap every top-level section and transition no universal selector'
+          if not failures else f'{failures} check(s) failed')
+    return 1 if failures else 0
+
+
+def thread_option_sets(cache_dir):
+    """Return the converter options the thread stress test converts with"""
+    return [
+        {},
+        {'toc_depth': 2, 'lazy_sections': True},
+        {'split_chapters': True, 'assets': 'external', 'highlight_cache': str(cache_dir)},
+    ]
+
+
+def benchmark_threads(args):
+    """Run convert_string_result() from a thread pool and compare with serial conversions"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    documents = [
+        build_document(20 + number * 7) + '\n\n' + build_code_document(6, 3 + number % 3)
+        for number in range(args.documents)
+    ]
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        # Separate highlight caches, so the threads fill theirs concurrently
+        serial_options = thread_option_sets(Path(workdir) / 'serial')
+        thread_options = thread_option_sets(Path(workdir) / 'threads')
+
+        start = time.perf_counter()
+        expected = {}
+        for option_number, options in enumerate(serial_options):
+            converter = MarkdownToHtmlConverter(**options)
+            for number, document in enumerate(documents):
+                result = converter.convert_string_result(document)
+                expected[number, option_number] = (result.html, result.toc, result.headings, result.files)
+        serial = time.perf_counter() - start
+
+        # Every document with every option set, several times over in a shuffled order
+        tasks = list(expected) * args.rounds
+        random.Random(0).shuffle(tasks)
+
+        def convert(task):
+            number, option_number = task
+            result = convert_string_result(documents[number], **thread_options[option_number])
+            return result.html, result.toc, result.headings, result.files
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            futures = [executor.submit(convert, task) for task in tasks]
+            for task, future in zip(tasks, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f'Document {task[0]}, options {task[1]}: {e!r}', file=sys.stderr)
+                    continue
+                if result != expected[task]:
+                    failures += 1
+                    print(f'Document {task[0]}, options {task[1]}: differs from the serial conversion',
+                          file=sys.stderr)
+        threaded = time.perf_counter() - start
+
+    print(f'{args.documents} documents x {len(serial_options)} option sets, '
+          f'{args.rounds} rounds on {args.threads} threads')
+    print(f"{'mode':>8} {'conversions':>12} {'seconds':>10} {'per conversion ms':>18}")
+    for mode, count, elapsed in (('serial', len(expected), serial), ('threads', len(tasks), threaded)):
+        print(f'{mode:>8} {count:>12} {elapsed:>10.2f} {elapsed / count * 1000:>18.1f}')
+    print('Every threaded conversion matches its serial conversion' if not failures
+          else f'{failures} of {len(tasks)} threaded conversion(s) failed')
+    return 1 if failures else 0
+
+
+def benchmark_images(args):
+    """Compare page weight and build time with linked and optimized images"""
+    with tempfile.TemporaryDirectory() as workdir:
+        markdown_file = build_image_document(workdir, args.images, args.width)
+        modes = [
+            ('link', {}),
+            ('cold', {'images': 'optimize', 'image_format': args.format, 'image_cache': Path(workdir) / 'cache'}),
+            ('warm', {'images': 'optimize', 'image_format': args.format, 'image_cache': Path(workdir) / 'cache'}),
+        ]
+
+        failures = 0
+        print(f'{args.images} images of {args.width}px, transcoded to {args.format}')
+        print(f"{'mode':>6} {'seconds':>10} {'page + images KB':>18}")
+        for mode, options in modes:
+            output_file = Path(workdir) / mode / 'report.html'
+            start = time.perf_counter()
+            MarkdownToHtmlConverter(**options).convert(markdown_file, output_file)
+            elapsed = time.perf_counter() - start
+            # Linked images are resolved next to the markdown
+            image_dir = Path(workdir) if mode == 'link' else output_file.parent
+            total, html_content = page_weight(output_file, image_dir)
+            if mode != 'link':
+                for attributes, _ in IMG_TAG_PATTERN.findall(html_content):
+                    if not all(f' {name}="' in attributes for name in ('width', 'height', 'loading')):
+                        failures += 1
+                        print(f'Image without width, height or loading: <img{attributes[:80]}', file=sys.stderr)
+            print(f'{mode:>6} {elapsed:>10.3f} {total / 1024:>18.1f}')
+
+    print('Every optimized image has width, height and loading' if not failures
+          else f'{failures} image(s) missing attributes')
+    return 1 if failures else 0
+
+
+STARTUP_RUNS = 7
+# Milliseconds a --help or --version may take beyond a bare interpreter start
+STARTUP_BUDGET_MS = 120
+STARTUP_HEAVY_MODULES = ('markdown', 'pygments', 'PIL', 'reportlab', 'markdown2', 'bs4')
+IMPORT_TIME_PATTERN = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+
+def best_time(command, runs):
+    """Fastest wall time of a command over several runs, in seconds"""
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def import_times(command):
+    """Cumulative import time in microseconds of each top-level module a command loads"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', *command[1:]],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    modules = {}
+    for _, cumulative, indent, name in IMPORT_TIME_PATTERN.findall(result.stderr):
+        if len(indent) == 1:
+            modules[name] = int(cumulative)
+    return modules
+
+
+def benchmark_startup(args):
+    """Time CLI cold starts against a budget and break down their imports"""
+    here = Path(__file__).parent
+    commands = [
+        ('md2html --help', [sys.executable, str(here / 'md2html.py'), '--help'], True),
+        ('md2html --version', [sys.executable, str(here / 'md2html.py'), '--version'], True),
+    ]
+    md2pdf = here.parent / 'mdtopdf' / 'md2pdf.py'
+    if md2pdf.exists():
+        commands += [
+            ('md2pdf --help', [sys.executable, str(md2pdf), '--help'], True),
+            ('md2pdf --version', [sys.executable, str(md2pdf), '--version'], True),
+        ]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        markdown_file = Path(workdir) / 'report.md'
+        markdown_file.write_text(build_document(args.headings), encoding='utf-8')
+        commands.append(('md2html convert', [
+            sys.executable, str(here / 'md2html.py'), str(markdown_file), '-o', str(Path(workdir) / 'report.html')
+        ], False))
+
+        interpreter = best_time([sys.executable, '-c', 'pass'], args.runs)
+        failures = 0
+        print(f'Bare interpreter {interpreter * 1000:.1f} ms, budget +{args.budget} ms for --help and --version')
+        print(f"{'command':>18} {'ms':>8} {'over python':>12}  slowest imports")
+        for label, command, budgeted in commands:
+            elapsed = best_time(command, args.runs)
+            modules = import_times(command)
+            slowest = sorted(modules, key=modules.get, reverse=True)[:3]
+            breakdown = ', '.join(f'{name} {modules[name] / 1000:.0f}' for name in slowest)
+            overhead = (elapsed - interpreter) * 1000
+            print(f'{label:>18} {elapsed * 1000:>8.1f} {overhead:>12.1f}  {breakdown}')
+            if not budgeted:
+                continue
+            heavy = sorted(set(modules) & set(STARTUP_HEAVY_MODULES))
+            if heavy:
+                failures += 1
+                print(f'{label} imports {", ".join(heavy)}', file=sys.stderr)
+            if overhead > args.budget:
+                failures += 1
+                print(f'{label} is {overhead - args.budget:.1f} ms over budget', file=sys.stderr)
+
+    print('Startup within budget' if not failures else f'{failures} startup check(s) failed')
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark stages of the Markdown to HTML converter'
+    )
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    crossrefs = subparsers.add_parser(
+        'crossrefs',
+        help='Time the cross-reference linker against growing heading counts'
+    )
+    crossrefs.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[250, 500, 1000, 2000, 4000],
+        help='Heading counts to benchmark (default: 250 500 1000 2000 4000)'
+    )
+    crossrefs.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='Runs per size; the fastest is reported (default: 3)'
+    )
+    crossrefs.set_defaults(func=benchmark_crossrefs)
+
+    corpus = subparsers.add_parser(
+        'corpus',
+        help='Time building and incrementally updating a heading index across documents'
+    )
+    corpus.add_argument(
+        '--documents',
+        type=int,
+        default=200,
+        help='Documents in the corpus (default: 200)'
+    )
+    corpus.add_argument(
+        '--headings',
+        type=int,
+        default=50,
+        help='Chapters per document (default: 50)'
+    )
+    corpus.set_defaults(func=benchmark_corpus)
+    
+    batch = subparsers.add_parser(
+        'batch',
+        help='Compare a fresh markdown engine per file with a reused one'
+    )
+    batch.add_argument(
+        '--files',
+        type=int,
+        default=500,
+        help='Number of files in the batch (default: 500)'
+    )
+    batch.add_argument(
+        '--headings',
+        type=int,
+        default=20,
+        help='Headings per synthetic file (default: 20)'
+    )
+    batch.set_defaults(func=benchmark_batch)
+
+    sections = subparsers.add_parser(
+        'sections',
+        help='Check and time section-cached re-renders against full renders'
+    )
+    sections.add_argument(
+        'document',
+        nargs='?',
+        default=str(Path(__file__).parent / 'sutherland_report_enhanced.md'),
+        help='Markdown document to edit (default: the Sutherland report)'
+    )
+    sections.add_argument(
+        '--edits',
+        type=int,
+        default=50,
+        help='Number of single-word edits to render (default: 50)'
+    )
+    sections.add_argument(
+        '-d', '--toc-depth',
+        type=int,
+        default=3,
+        help='TOC depth used for both renders (default: 3)'
+    )
+    sections.set_defaults(func=benchmark_sections)
+
+    search = subparsers.add_parser(
+        'search',
+        help='Time building the embedded search index for a large document'
+    )
+    search.add_argument(
+        '--size',
+        type=float,
+        default=5,
+        help='Minimum size of the rendered HTML in MB (default: 5)'
+    )
+    search.set_defaults(func=benchmark_search)
+
+    toc = subparsers.add_parser(
+        'toc',
+        help='Count the TOC links laid out up front for a deep table of contents'
+    )
+    toc.add_argument(
+        '--headings',
+        type=int,
+        default=5000,
+        help='Number of headings in the document (default: 5000)'
+    )
+    toc.set_defaults(func=benchmark_toc)
+
+    compress = subparsers.add_parser(
+        'compress',
+        help='Compare bytes per page with the pruned Pygments CSS and precompressed copies'
+    )
+    compress.add_argument(
+        'document',
+        nargs='?',
+        default=str(Path(__file__).parent / 'sutherland_report_enhanced.md'),
+        help='Markdown document without much code (default: the Sutherland report)'
+    )
+    compress.add_argument(
+        '--blocks',
+        type=int,
+        default=30,
+        help='Fenced code blocks in the code document (default: 30)'
+    )
+    compress.add_argument(
+        '--formats',
+        nargs='+',
+        choices=PRECOMPRESS_FORMATS,
+        default=list(PRECOMPRESS_FORMATS),
+        help='Precompressed formats to write (default: gzip brotli)'
+    )
+    compress.set_defaults(func=benchmark_compress)
+    
+    tables = subparsers.add_parser(
+        'tables',
+        help='Compare a large table rendered as markup and as a virtual table'
+    )
+    tables.add_argument(
+        '--rows',
+        type=int,
+        default=20000,
+        help='Rows in the large table (default: 20000)'
+    )
+    tables.add_argument(
+        '--min-rows',
+        type=int,
+        default=VIRTUAL_TABLE_MIN_ROWS,
+        help=f'Row threshold for virtual tables (default: {VIRTUAL_TABLE_MIN_ROWS})'
+    )
+    tables.set_defaults(func=benchmark_tables)
+    
+    highlight = subparsers.add_parser(
+        'highlight',
+        help='Time code highlighting with and without the highlight cache'
+    )
+    highlight.add_argument(
+        '--blocks',
+        type=int,
+        default=600,
+        help='Number of fenced code blocks (default: 600)'
+    )
+    highlight.add_argument(
+        '--distinct',
+        type=int,
+        default=200,
+        help='Number of distinct blocks among them (default: 200)'
+    )
+    highlight.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Worker processes for the parallel run; 1 skips it (default: CPU count)'
+    )
+    highlight.set_defaults(func=benchmark_highlight)
+
+    parallel = subparsers.add_parser(
+        'parallel',
+        help='Compare serial and parallel rendering of one large document'
+    )
+    parallel.add_argument(
+        '--size',
+        type=float,
+        default=2,
+        help='Size of the synthetic markdown in MB (default: 2)'
+    )
+    parallel.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=max(2, os.cpu_count() or 1),
+        help='Worker processes for the parallel render (default: CPU count, at least 2)'
+    )
+    parallel.set_defaults(func=benchmark_parallel)
+
+    serve = subparsers.add_parser(
+        'serve',
+        help='Time render service requests against running the CLI per document'
+    )
+    serve.add_argument(
+        '--size',
+        type=float,
+        default=50,
+        help='Size of each markdown document in KB (default: 50)'
+    )
+    serve.add_argument(
+        '--requests',
+        type=int,
+        default=50,
+        help='Number of distinct documents posted (default: 50)'
+    )
+    serve.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Render service worker processes (default: 1)'
+    )
+    serve.set_defaults(func=benchmark_serve)
+
+    stream = subparsers.add_parser(
+        'stream',
+        help='Compare streaming a page to disk with building it in memory first'
+    )
+    stream.add_argument(
+        'document',
+        nargs='?',
+        default=str(Path(__file__).parent / 'sutherland_report_enhanced.md'),
+        help='Markdown document to convert (default: the Sutherland report)'
+    )
+    stream.add_argument(
+        '-d', '--toc-depth',
+        type=int,
+        default=2,
+        help='TOC depth used for the conversion (default: 2)'
+    )
+    stream.set_defaults(func=benchmark_stream)
+
+    memory = subparsers.add_parser(
+        'memory',
+        help='Check that low-memory conversions stay within a multiple of the window size'
+    )
+    memory.add_argument(
+        '--size',
+        type=int,
+        default=256,
+        help='Size of the larger synthetic data dictionary in KB; a quarter-size one is also converted (default: 256)'
+    )
+    memory.add_argument(
+        '--window',
+        type=int,
+        default=16,
+        help='Low-memory window size in KB (default: 16)'
+    )
+    memory.set_defaults(func=benchmark_memory)
+
+    paint = subparsers.add_parser(
+        'paint',
+        help='Compare the DOM and styles laid out up front with and without lazy sections'
+    )
+    paint.add_argument(
+        '--headings',
+        type=int,
+        default=2000,
+        help='Chapters in the document (default: 2000)'
+    )
+    paint.add_argument(
+        '--window',
+        type=int,
+        default=16,
+        help='Window size in KB of the low-memory lazy page (default: 16)'
+    )
+    paint.set_defaults(func=benchmark_paint)
+
+    threads = subparsers.add_parser(
+        'threads',
+        help='Stress convert_string() from a thread pool against serial conversions'
+    )
+    threads.add_argument(
+        '--documents',
+        type=int,
+        default=8,
+        help='Distinct documents converted (default: 8)'
+    )
+    threads.add_argument(
+        '--threads',
+        type=int,
+        default=8,
+        help='Threads in the pool (default: 8)'
+    )
+    threads.add_argument(
+        '--rounds',
+        type=int,
+        default=4,
+        help='Times each document is converted with each option set (default: 4)'
+    )
+    threads.set_defaults(func=benchmark_threads)
+
+    images = subparsers.add_parser(
+        'images',
+        help='Compare linked and optimized images (needs Pillow)'
+    )
+    images.add_argument(
+        '--images',
+        type=int,
+        default=12,
+        help='Number of screenshots in the report (default: 12)'
+    )
+    images.add_argument(
+        '--width',
+        type=int,
+        default=3200,
+        help='Width of each screenshot in pixels (default: 3200)'
+    )
+    images.add_argument(
+        '--format',
+        choices=['webp', 'avif'],
+        default='webp',
+        help='Format images are transcoded to (default: webp)'
+    )
+    images.set_defaults(func=benchmark_images)
+
+    startup = subparsers.add_parser(
+        'startup',
+        help='Time CLI cold starts against a budget with an import breakdown'
+    )
+    startup.add_argument(
+        '--runs',
+        type=int,
+        default=STARTUP_RUNS,
+        help=f'Runs per command, the fastest is kept (default: {STARTUP_RUNS})'
+    )
+    startup.add_argument(
+        '--budget',
+        type=float,
+        default=STARTUP_BUDGET_MS,
+        help=f'Milliseconds --help and --version may add to a bare interpreter (default: {STARTUP_BUDGET_MS})'
+    )
+    startup.add_argument(
+        '--headings',
+        type=int,
+        default=20,
+        help='Chapters in the converted document (default: 20)'
+    )
+    startup.set_defaults(func=benchmark_startup)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
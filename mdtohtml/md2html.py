@@ -5,28 +5,1113 @@ Converts markdown files to modern, self-contained HTML with advanced navigation
 Styled to match the Sutherland AI Innovation microsite
 """
 
+# Markdown, Pygments, Pillow, process pools and the HTTP servers are
+# imported where they are first used, so --help, --version and conversions
+# that don't need them start quickly
 import argparse
+import base64
+import functools
+import hashlib
+import mmap
 import os
 import re
+import string
 import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from html.parser import HTMLParser
+from importlib.util import find_spec
 from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
 import json
-import markdown
-from markdown.extensions import codehilite, fenced_code, tables, toc, attr_list, nl2br, smarty
-from markdown.extensions.toc import TocExtension
-from markdown.extensions.codehilite import CodeHiliteExtension
-from pygments.formatters import HtmlFormatter
 import html
 
+__version__ = '1.1.0'
+
+# Default manifest used by --cache for incremental builds
+DEFAULT_CACHE_FILE = '.md2html-cache.json'
+# Default index used by --heading-index to link references across documents
+DEFAULT_HEADING_INDEX_FILE = '.md2html-headings.json'
+
+# '-' reads the markdown from stdin or writes the page to stdout; documents
+# read from stdin without an H1 are titled after STDIN_NAME
+STDIO_PATH = '-'
+STDIN_NAME = 'document'
+
+
+# Split output mode writes chapter fragments to <output stem>_chapters/
+CHAPTER_DIR_SUFFIX = '_chapters'
+
+# Ways of shipping the markdown source for the "Copy Markdown" button
+MARKDOWN_SOURCE_MODES = ('inline', 'compressed', 'external', 'none')
+# External mode writes the source next to the output as <output stem>_source.md
+SOURCE_FILE_SUFFIX = '_source.md'
+
+# External assets mode writes the shared stylesheet and script here,
+# relative to each output directory
+ASSET_MODES = ('inline', 'external')
+ASSETS_DIR = 'assets'
+
+# Highlighted code blocks are cached here when --highlight-cache is given
+DEFAULT_HIGHLIGHT_CACHE_DIR = '.md2html-highlight-cache'
+HIGHLIGHT_CACHE_SIZE = 64 * 1024 * 1024
+# Watch mode and the render service prune the highlight cache after a
+# render at most this often, in seconds
+HIGHLIGHT_PRUNE_INTERVAL = 60
+
+# Documents smaller than this are never split for parallel rendering
+PARALLEL_SECTION_MIN_SIZE = 1024 * 1024
+
+# --images optimize resizes and transcodes local images; link leaves them alone
+IMAGE_MODES = ('link', 'optimize')
+IMAGE_FORMATS = ('webp', 'avif')
+DEFAULT_IMAGE_CACHE_DIR = '.md2html-image-cache'
+IMAGE_MAX_WIDTH = 1600
+IMAGE_QUALITY = 80
+# Optimized images up to this size are inlined as data URIs
+IMAGE_INLINE_LIMIT = 16 * 1024
+# Optimized images kept in memory when there is no image cache directory
+IMAGE_MEMORY_CACHE_SIZE = 32 * 1024 * 1024
+# Formats browsers display, kept as they are when transcoding doesn't shrink them
+WEB_IMAGE_FORMATS = {'PNG', 'JPEG', 'GIF', 'WEBP', 'AVIF'}
+
+# --precompress writes <file>.gz and <file>.br next to pages, chapters and
+# text assets, for servers that send precompressed files as they are
+PRECOMPRESS_FORMATS = ('gzip', 'brotli')
+PRECOMPRESS_SUFFIXES = {'gzip': '.gz', 'brotli': '.br'}
+
+# Elements' class attributes, for pruning the Pygments stylesheet
+CLASS_ATTRIBUTE_PATTERN = re.compile(r'\sclass="([^"]*)"')
+
+# Tables of contents with at least this many links start with their subtrees
+# collapsed; the page renders a subtree when it is expanded
+TOC_COLLAPSE_MIN_LINKS = 200
+TOC_LIST_PATTERN = re.compile(r'(</?ul>)')
+
+# With --virtual-tables, tables with at least this many body rows are embedded
+# as data and only the rows in view are rendered
+VIRTUAL_TABLE_MIN_ROWS = 1000
+TABLE_PATTERN = re.compile(
+    r'<table>\n(?:<thead>\n(?P<head>.*?)</thead>\n)?<tbody>\n(?P<body>.*?)</tbody>\n</table>', re.DOTALL
+)
+TABLE_ROW_PATTERN = re.compile(r'<tr>\n(.*?)</tr>\n', re.DOTALL)
+TABLE_CELL_PATTERN = re.compile(r'<td((?: [^>]*)?)>(.*?)</td>\n', re.DOTALL)
+TABLE_CELLS_PATTERN = re.compile(r'(?:<td(?: [^>]*)?>.*?</td>\n)+', re.DOTALL)
+
+# With --low-memory, documents are mapped rather than read and rendered in
+# windows of about this many bytes, each starting where a block does
+LOW_MEMORY_WINDOW = 1024 * 1024
+# A window ends at the next heading, or past this many window sizes
+# without one, at the next block
+LOW_MEMORY_BLOCK_SPLIT = 2
+# Lines after a blank line that may still continue the block before it
+BLOCK_CONTINUATION_PATTERN = re.compile(r'[ \t>:<]|(?:[*+-]|\d+[.)])[ \t]')
+
+# With --lazy-sections, the transitions on every element and on content
+# links are dropped from the stylesheet; the widgets keep their own
+UNIVERSAL_TRANSITION_PATTERN = re.compile(r'\n *?/\* Smooth transitions \*/\n *\* \{\{.*?\}\}\n', re.DOTALL)
+LINK_TRANSITION_PATTERN = re.compile(r'(\n *a \{\{[^}]*?)\n *transition: [^;]*;')
+
+# convert_string() keeps a converter for each of this many recent option sets
+STRING_CONVERTERS = 16
+
+# Maximum number of rendered sections kept by the section cache
+FRAGMENT_CACHE_SIZE = 4096
+# Top-level sections are rendered in groups, so small sections don't each
+# pay for a markdown run: a group ends once it holds SECTION_GROUP_SIZE
+# characters, or at a heading line whose CRC is a multiple of SECTION_GROUP_CUT,
+# so an edit moves at most the group boundaries up to the next such heading
+SECTION_GROUP_SIZE = 4096
+SECTION_GROUP_CUT = 16
+
+# Maximum number of documents whose headings the section cache remembers
+SECTION_HEADINGS_SIZE = 256
+
+# Patterns used to split documents into independently rendered sections
+FENCE_PATTERN = re.compile(r'^(`{3,}|~{3,})')
+SPLIT_HEADING_PATTERN = re.compile(r'^(#{1,6})(?!#)')
+TITLE_PATTERN = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+# Constructs a section cannot be rendered on its own with, by group name
+WHOLE_DOCUMENT_PATTERN = re.compile(
+    r'(?P<toc>\[TOC\])'
+    r'|(?P<footnotes>///Footnotes Go Here///)'
+    r"|(?P<abbreviations>^\*\[[^\]\n]*\] ?:[ ]*(?:''|\"\")[ ]*$)"
+    r'|(?P<html>^ {0,3}<(?:!--|\?|![A-Za-z]|/?(?i:address|article|aside|blockquote|body|canvas|center|colgroup'
+    r'|dd|details|div|dl|dt|fieldset|figcaption|figure|footer|form|group|h[1-6]|header|hgroup|hr|html'
+    r'|iframe|legend|li|main|map|math|menu|nav|noscript|object|ol|option|output|p|pre|progress|script'
+    r'|section|style|summary|table|tbody|td|textarea|tfoot|th|thead|tr|ul|video)(?=[\s/>]|$)))',
+    re.MULTILINE
+)
+WHOLE_DOCUMENT_CONSTRUCTS = {
+    'toc': 'a [TOC] marker',
+    'footnotes': 'a footnote placeholder',
+    'abbreviations': 'an abbreviation removal',
+    'html': 'raw HTML blocks',
+}
+# Reference, footnote and abbreviation definitions, to the end of their
+# block and any indented blocks that continue them
+DEFINITION_PATTERN = re.compile(
+    r'^ {0,3}(?:\[\^?[^\]\n]*\]|\*\[[^\]\n]*\] ?):.*(?:\n(?![ \t]*$).*)*(?:\n[ \t]*\n(?:    |\t).*(?:\n(?![ \t]*$).*)*)*',
+    re.MULTILINE
+)
+# Footnote references in rendered sections, numbered within the section,
+# and the text a section renders the document's footnote list from
+FOOTNOTE_REF_PATTERN = re.compile(r'<sup id="fnref\d*:([^"]*)">')
+FOOTNOTE_PLACEHOLDER = '///Footnotes Go Here///'
+# Words indexed for the sidebar search
+SEARCH_TERM_PATTERN = re.compile(r'\w+')
+
+ELEMENT_ID_PATTERN = re.compile(r'<[a-zA-Z][^>]*?\sid="([^"]*)"')
+HEADING_ID_PATTERN = re.compile(r'(<h[1-6](?: [^>]*)? id=")([^"]*)(")')
+# Image tags in rendered HTML and their double-quoted or bare attributes
+IMG_TAG_PATTERN = re.compile(r'<img\b([^>]*?)\s*(/?)>')
+ATTRIBUTE_PATTERN = re.compile(r'([^\s=/>]+)(?:="([^"]*)")?')
+
+
+
+def write_if_changed(output_file, content):
+    """Write content to output_file unless it already holds exactly that content"""
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+
+def write_chunks_if_changed(output_file, chunks):
+    """Stream chunks to output_file unless it already holds exactly that content
+    
+    The chunks go to a temporary file that replaces output_file only if the
+    content differs, so the whole page is never held in memory at once.
+    """
+    temp_file = output_file.with_name(f'{output_file.name}.{os.getpid()}.tmp')
+    try:
+        existing = open(output_file, 'r', encoding='utf-8')
+    except OSError:
+        existing = None
+    
+    changed = existing is None
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                if not changed:
+                    try:
+                        changed = existing.read(len(chunk)) != chunk
+                    except UnicodeDecodeError:
+                        changed = True
+        if not changed:
+            try:
+                changed = existing.read(1) != ''
+            except UnicodeDecodeError:
+                changed = True
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+    finally:
+        if existing is not None:
+            existing.close()
+    
+    if changed:
+        os.replace(temp_file, output_file)
+    else:
+        os.unlink(temp_file)
+    return changed
+
+
+def write_precompressed(path, formats):
+    """Write gzip and Brotli copies of path next to it, as path.gz and path.br
+    
+    A copy at least as new as path is kept, so unchanged files are not
+    compressed again. Files are compressed in blocks, so a page of any size
+    is never read into memory whole.
+    """
+    for compression in formats:
+        variant = path.with_name(path.name + PRECOMPRESS_SUFFIXES[compression])
+        try:
+            if variant.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        temp_file = variant.with_name(f'{variant.name}.{os.getpid()}.tmp')
+        with open(path, 'rb') as source, open(temp_file, 'wb') as target:
+            if compression == 'gzip':
+                import zlib
+                # zlib's gzip header has a zero mtime, which keeps the output identical across runs
+                compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+                compress, finish = compressor.compress, compressor.flush
+            else:
+                import brotli
+                compressor = brotli.Compressor(mode=brotli.MODE_TEXT)
+                compress, finish = compressor.process, compressor.finish
+            for block in iter(lambda: source.read(1 << 20), b''):
+                target.write(compress(block))
+            target.write(finish())
+        os.replace(temp_file, variant)
+
+
+def write_asset(asset_file, content):
+    """Write a content-hashed asset unless it exists, atomically for parallel workers and threads"""
+    if asset_file.exists():
+        return False
+    asset_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = asset_file.with_name(f'{asset_file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    if isinstance(content, bytes):
+        temp_file.write_bytes(content)
+    else:
+        temp_file.write_text(content, encoding='utf-8')
+    os.replace(temp_file, asset_file)
+    return True
+
+
+def minify_css(css):
+    """Strip comments and the whitespace around CSS punctuation"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """Strip indentation, blank lines and whole-line comments from JavaScript
+    
+    Line breaks are kept so automatic semicolon insertion is unaffected.
+    """
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+@functools.lru_cache(maxsize=None)
+def get_pygments_css(style):
+    """Return the code highlighting CSS for a Pygments style, generated once per style"""
+    from pygments.formatters import HtmlFormatter
+    return HtmlFormatter(style=style).get_style_defs('.highlight')
+
+
+@functools.lru_cache(maxsize=None)
+def get_pygments_rules(style):
+    """Return the rules of get_pygments_css(style) as (class, rule) pairs
+    
+    The class is the one a page must use for the rule to matter: the token
+    class for '.highlight .k' rules, and 'highlight' or 'linenos' for the
+    rules about code blocks as a whole.
+    """
+    rules = []
+    for rule in get_pygments_css(style).splitlines():
+        selector = rule.split('{', 1)[0]
+        classes = re.findall(r'\.([\w-]+)', selector)
+        if selector.startswith('.highlight .'):
+            rules.append((classes[1], rule))
+        else:
+            rules.append((classes[0] if classes else 'highlight', rule))
+    return rules
+
+
+def used_classes(html_content):
+    """Return the set of class names the elements of html_content use"""
+    return {name for names in CLASS_ATTRIBUTE_PATTERN.findall(html_content) for name in names.split()}
+
+
+def prune_pygments_css(style, used):
+    """Return the code highlighting CSS for a style, cut down to the used class names"""
+    if 'highlight' not in used:
+        return ''
+    return '\n'.join(rule for name, rule in get_pygments_rules(style) if name in used)
+
+
+def script_json(value):
+    """Return value as compact JSON for embedding in a script tag"""
+    # Keep '</script>' in the content from closing the tag early
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+
+def window_text(data, start, end):
+    """Decode bytes start:end of a mapped file, translating newlines as reading it as text would"""
+    text = data[start:end].decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def flatten_toc_tokens(toc_tokens):
+    """Flatten nested TOC tokens back into document order, without children"""
+    flat = []
+    for token in toc_tokens:
+        flat.append({key: value for key, value in token.items() if key != 'children'})
+        flat.extend(flatten_toc_tokens(token.get('children', [])))
+    return flat
+
+
+def atx_heading_lines(md_content):
+    """Return the ATX heading lines of markdown, skipping fenced code blocks"""
+    heading_lines = []
+    fence = None
+    for line in md_content.splitlines():
+        if fence:
+            if line.rstrip() == fence:
+                fence = None
+            continue
+        fence_match = FENCE_PATTERN.match(line)
+        if fence_match:
+            fence = fence_match.group(1)
+        elif SPLIT_HEADING_PATTERN.match(line):
+            heading_lines.append(line)
+    return heading_lines
+
+
+def collapse_toc(toc_html, nested=None):
+    """Wrap every nested list of a rendered TOC in a <template> with a toggle
+    
+    Template content is parsed but never laid out, so a TOC with thousands
+    of links costs the page only its top level until subtrees are expanded.
+    A TOC can be collapsed a line at a time by passing the same nested list
+    with each line.
+    """
+    parts = []
+    nested = [] if nested is None else nested
+    for part in TOC_LIST_PATTERN.split(toc_html):
+        if part == '<ul>':
+            nested.append(bool(nested))
+            if nested[-1]:
+                part = '<button class="toc-toggle" aria-expanded="false" aria-label="Expand section"></button><template><ul>'
+        elif part == '</ul>' and nested.pop():
+            part = '</ul></template>'
+        parts.append(part)
+    return ''.join(parts).replace('<div class="toc">', '<div class="toc toc-collapsible">', 1)
+
+
+def top_level(levels):
+    """Return the shallowest heading level that occurs more than once in levels, or None
+    
+    Top-level sections start at this level; a document where no level
+    repeats has none.
+    """
+    repeated = [level for level, count in Counter(levels).items() if count > 1]
+    return min(repeated) if repeated else None
+
+
+def top_level_offsets(section_starts):
+    """Return the offsets of the top-level headings among (offset, level) section starts"""
+    split_level = top_level([level for _, level in section_starts])
+    if split_level is None:
+        return []
+    return [offset for offset, level in section_starts if level <= split_level]
+
+
+def wrap_sections(html_content, offsets, virtual_tables=None):
+    """Wrap the content from each offset to the next in a lazily rendered section
+    
+    The browser lays out and paints a section only as it nears the
+    viewport, reserving the height hinted by its size until then. Content
+    before the first offset is left as it is. Tables with at least
+    virtual_tables rows are virtualized section by section first, so the
+    hints reflect the rows actually rendered.
+    """
+    def virtualize(part):
+        return virtualize_tables(part, virtual_tables) if virtual_tables else part
+    
+    if not offsets:
+        return virtualize(html_content)
+    sections = []
+    for start, end in zip(offsets, offsets[1:] + [len(html_content)]):
+        section = virtualize(html_content[start:end]).rstrip()
+        sections.append(
+            f'<section class="lazy-section" style="contain-intrinsic-size: auto {len(section) // 4}px">\n'
+            f'{section}\n</section>'
+        )
+    return virtualize(html_content[:offsets[0]]) + '\n'.join(sections)
+
+
+def virtualize_tables(html_content, min_rows=VIRTUAL_TABLE_MIN_ROWS):
+    """Replace tables with at least min_rows body rows by a virtual table
+    
+    The header stays markup; the rows move to a JSON payload of cell HTML
+    that the page script renders a window of, and renders in full for
+    printing. Tables whose rows do not share one cell layout, as raw HTML
+    tables may not, are left as they are.
+    """
+    def replace_table(match):
+        body = match.group('body')
+        # A nested table ends the match early; leave the outer one alone
+        if body.count('<tr>') < min_rows or '<table' in match.group(0)[1:]:
+            return match.group(0)
+        
+        columns = None
+        rows = []
+        consumed = 0
+        for row_match in TABLE_ROW_PATTERN.finditer(body):
+            if row_match.start() != consumed:
+                return match.group(0)
+            consumed = row_match.end()
+            if not TABLE_CELLS_PATTERN.fullmatch(row_match.group(1)):
+                return match.group(0)
+            cells = TABLE_CELL_PATTERN.findall(row_match.group(1))
+            layout = [attributes for attributes, _ in cells]
+            if columns is None:
+                columns = layout
+            elif layout != columns:
+                return match.group(0)
+            rows.append([cell for _, cell in cells])
+        if consumed != len(body) or not columns:
+            return match.group(0)
+        
+        payload = script_json({'columns': columns, 'rows': rows})
+        head = match.group('head') or ''
+        return (
+            f'<div class="virtual-table" data-rows="{len(rows)}">\n'
+            f'<div class="virtual-table-controls"><input type="search" class="virtual-table-filter" '
+            f'placeholder="Filter {len(rows)} rows" aria-label="Filter rows">'
+            f'<span class="virtual-table-count"></span></div>\n'
+            f'<div class="virtual-table-viewport" tabindex="0">\n'
+            f'<table>\n<thead>\n{head}</thead>\n<tbody></tbody>\n</table>\n</div>\n'
+            f'<script type="application/json" class="virtual-table-data">{payload}</script>\n'
+            f'</div>'
+        )
+    
+    return TABLE_PATTERN.sub(replace_table, html_content)
+
+
+def reference_words(text):
+    """Return text as lowercase words separated by single spaces
+    
+    Compares heading text with markdown source loosely enough to see past
+    emphasis markers and the quotes and dashes smarty substitutes.
+    """
+    return ' '.join(SEARCH_TERM_PATTERN.findall(text.lower()))
+
+
+class SearchIndexBuilder(HTMLParser):
+    """Build an inverted index of the words in rendered HTML
+    
+    The content is split into sections at top-level headings with an id
+    (plus a leading section for anything before the first heading). Every
+    lowercase word maps to the sorted list of sections that contain it.
+    """
+    
+    HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0
+        self.skip_depth = None
+        self.line_starts = [0]
+        self.section_ids = [None]
+        # (offset, level) of the heading that starts each section after the first
+        self.section_starts = []
+        # (level, text, id) of the same headings
+        self.headings = []
+        self.heading_text = None
+        self.terms = {}
+    
+    def handle_starttag(self, tag, attrs):
+        if self.depth == 0 and tag in self.HEADING_TAGS:
+            heading_id = dict(attrs).get('id')
+            if heading_id:
+                line, column = self.getpos()
+                self.section_ids.append(heading_id)
+                self.section_starts.append((self.line_starts[line - 1] + column, int(tag[1])))
+                self.headings.append((int(tag[1]), '', heading_id))
+                self.heading_text = []
+        if tag in ('script', 'style') and self.skip_depth is None:
+            self.skip_depth = self.depth
+        if tag not in self.VOID_TAGS:
+            self.depth += 1
+    
+    def handle_endtag(self, tag):
+        if tag not in self.VOID_TAGS and self.depth:
+            self.depth -= 1
+        if self.heading_text is not None and self.depth == 0:
+            level, _, heading_id = self.headings[-1]
+            self.headings[-1] = (level, ' '.join(''.join(self.heading_text).split()), heading_id)
+            self.heading_text = None
+        if self.skip_depth is not None and self.depth <= self.skip_depth:
+            self.skip_depth = None
+    
+    def handle_data(self, data):
+        if self.skip_depth is not None:
+            return
+        if self.heading_text is not None:
+            self.heading_text.append(data)
+        section = len(self.section_ids) - 1
+        for term in SEARCH_TERM_PATTERN.findall(data.lower()):
+            postings = self.terms.setdefault(term, [])
+            if not postings or postings[-1] != section:
+                postings.append(section)
+    
+    def build(self, html_content):
+        """Index html_content and return the builder"""
+        for line in html_content.splitlines(keepends=True):
+            self.line_starts.append(self.line_starts[-1] + len(line))
+        self.feed(html_content)
+        self.close()
+        return self
+
+
+class TocWriter:
+    """Write a TOC one heading at a time, as the TOC extension renders it whole
+    
+    Headings are nested exactly as nest_toc_tokens() nests them, so a TOC
+    of any length is written without holding its tokens.
+    """
+    
+    def __init__(self, write):
+        self.write = write
+        self.links = 0
+        self.levels = []
+        # Levels of the headings whose nested list is open
+        self.parents = []
+        self.last_level = None
+        write('<div class="toc">\n')
+    
+    def add(self, level, link_html):
+        """Write the entry for a heading of level, linked by link_html"""
+        self.links += 1
+        if not self.levels:
+            self.write(f'<ul>\n<li>{link_html}')
+            self.levels.append(level)
+            self.last_level = level
+            return
+        
+        closed = False
+        if level < self.levels[-1]:
+            self.levels.pop()
+            to_pop = 0
+            for parent_level in reversed(self.parents):
+                if level > parent_level:
+                    break
+                to_pop += 1
+            self.write('</li>\n' + '</ul>\n</li>\n' * to_pop)
+            closed = True
+            if to_pop:
+                del self.levels[-to_pop:]
+                del self.parents[-to_pop:]
+            self.levels.append(level)
+        
+        if level == self.levels[-1]:
+            self.write(('' if closed else '</li>\n') + f'<li>{link_html}')
+        else:
+            self.write(f'<ul>\n<li>{link_html}')
+            self.parents.append(self.last_level)
+            self.levels.append(level)
+        self.last_level = level
+    
+    def close(self):
+        """Close the lists left open and the TOC itself"""
+        if self.levels:
+            self.write('</li>\n' + '</ul>\n</li>\n' * len(self.parents) + '</ul>\n</div>\n')
+        else:
+            self.write('<ul></ul>\n</div>\n')
+
+
+class HighlightCache:
+    """Highlighted code blocks keyed by their code, language and options
+    
+    With a cache_dir each entry is a file named by its key, and reading an
+    entry refreshes its mtime so prune() can drop the least recently used
+    entries beyond max_bytes. Without one, entries live in memory under the
+    same size bound.
+    """
+    
+    def __init__(self, cache_dir=None, max_bytes=HIGHLIGHT_CACHE_SIZE):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        # Conversions on several threads can share the in-memory entries
+        self.lock = threading.Lock()
+        self.pruned_at = None
+    
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key}.html'
+    
+    def get(self, key):
+        """Return the highlighted HTML for key, or None"""
+        if self.cache_dir is None:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                return self.entries.get(key)
+        
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return content
+    
+    def put(self, key, content):
+        """Store the highlighted HTML for key"""
+        if self.cache_dir is not None:
+            write_asset(self._path(key), content)
+            return
+        
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = content
+                self.size += len(content)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+    
+    def prune(self, throttle=False):
+        """Remove the least recently used entries until the cache fits max_bytes
+        
+        With throttle, nothing is done if the cache was pruned less than
+        HIGHLIGHT_PRUNE_INTERVAL seconds ago, so long-running modes can prune
+        after every render.
+        """
+        if self.cache_dir is None:
+            return
+        now = time.monotonic()
+        if throttle and self.pruned_at is not None and now - self.pruned_at < HIGHLIGHT_PRUNE_INTERVAL:
+            return
+        self.pruned_at = now
+        
+        entries = []
+        for path in self.cache_dir.glob('*/*.html'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+
+class ImageOptimizer:
+    """Resize local images and transcode them to WebP or AVIF with Pillow
+    
+    Each result is keyed by the image bytes and the settings, and stored in
+    cache_dir, so an unchanged image is never transcoded twice. Without one,
+    the most recently used results are kept in memory up to
+    IMAGE_MEMORY_CACHE_SIZE bytes. Images that cannot be shrunk, or written
+    in a format the Pillow build lacks, are kept as they are.
+    """
+    
+    def __init__(self, image_format='webp', max_width=IMAGE_MAX_WIDTH,
+                 inline_limit=IMAGE_INLINE_LIMIT, cache_dir=None):
+        if find_spec('PIL') is None:
+            raise RuntimeError('Optimizing images requires Pillow (pip install Pillow)')
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"image_format must be one of {', '.join(IMAGE_FORMATS)}")
+        self.image_format = image_format
+        self.max_width = max_width
+        self.inline_limit = inline_limit
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.entries = OrderedDict()
+        self.size = 0
+        # Conversions on several threads can share the in-memory entries
+        self.lock = threading.Lock()
+    
+    def settings(self):
+        """Return the settings that affect optimized images"""
+        return {
+            'format': self.image_format,
+            'max_width': self.max_width,
+            'inline_limit': self.inline_limit,
+        }
+    
+    def optimize(self, image_file):
+        """Return (image bytes, Pillow format, (width, height)) for image_file
+        
+        Returns None for files Pillow cannot read, such as SVG.
+        """
+        import io
+        from PIL import Image, UnidentifiedImageError
+        
+        try:
+            source = Path(image_file).read_bytes()
+        except OSError:
+            return None
+        payload = json.dumps([Image.__version__, IMAGE_QUALITY, self.settings()], sort_keys=True)
+        key = hashlib.sha256(payload.encode('utf-8') + b'\0' + source).hexdigest()
+        
+        data = self._get(key)
+        if data is None:
+            try:
+                data = self._transcode(source)
+            except (UnidentifiedImageError, OSError, ValueError):
+                return None
+            except KeyError:
+                # Raised by Pillow builds without an encoder for the format
+                return None
+            self._put(key, data)
+        
+        # Only the header is read to get the format and size
+        with Image.open(io.BytesIO(data)) as image:
+            return data, image.format, image.size
+    
+    def _get(self, key):
+        """Return the cached result for key, or None"""
+        if self.cache_dir is not None:
+            try:
+                return (self.cache_dir / key[:2] / key).read_bytes()
+            except OSError:
+                return None
+        
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            return self.entries.get(key)
+    
+    def _put(self, key, data):
+        """Cache the result for key"""
+        if self.cache_dir is not None:
+            write_asset(self.cache_dir / key[:2] / key, data)
+            return
+        
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = data
+                self.size += len(data)
+            while self.size > IMAGE_MEMORY_CACHE_SIZE and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+    
+    def _transcode(self, source):
+        """Return source resized to max_width and transcoded, or unchanged if that isn't smaller"""
+        import io
+        from PIL import Image, ImageOps
+        
+        with Image.open(io.BytesIO(source)) as image:
+            # Animations would lose their frames
+            if getattr(image, 'is_animated', False) and image.format in WEB_IMAGE_FORMATS:
+                return source
+            resized = ImageOps.exif_transpose(image)
+            if resized.width > self.max_width:
+                height = max(1, round(resized.height * self.max_width / resized.width))
+                resized = resized.resize((self.max_width, height), Image.LANCZOS)
+            if resized.mode not in ('RGB', 'RGBA'):
+                resized = resized.convert('RGBA' if 'transparency' in resized.info or 'A' in resized.mode else 'RGB')
+            
+            output = io.BytesIO()
+            resized.save(output, format=self.image_format.upper(), quality=IMAGE_QUALITY)
+            if (image.format in WEB_IMAGE_FORMATS and resized.size == image.size
+                    and len(source) <= output.tell()):
+                return source
+            return output.getvalue()
+    
+    def rewrite(self, html_content, base_dir):
+        """Point the local images in html_content at optimized copies
+        
+        Images up to inline_limit bytes become data URIs; larger ones are
+        returned as {file name: bytes} to be written to the assets directory.
+        Every image gets loading="lazy", and optimized ones their width and height.
+        """
+        from PIL import Image
+        
+        files = {}
+        
+        def rewrite_tag(match):
+            attributes, closing = match.groups()
+            names = {name.lower(): value for name, value in ATTRIBUTE_PATTERN.findall(attributes)}
+            added = ''
+            if 'loading' not in names:
+                added += ' loading="lazy"'
+            
+            src = names.get('src')
+            result = None
+            if src:
+                url = urlsplit(html.unescape(src))
+                if not url.scheme and not url.netloc and url.path:
+                    result = self.optimize(Path(base_dir) / unquote(url.path))
+            if result is None:
+                return f'<img{attributes}{added}{" /" if closing else ""}>'
+            
+            data, image_format, (width, height) = result
+            if len(data) <= self.inline_limit:
+                new_src = f'data:{Image.MIME[image_format]};base64,{base64.b64encode(data).decode("ascii")}'
+            else:
+                digest = hashlib.sha256(data).hexdigest()[:16]
+                name = f'img.{digest}.{image_format.lower()}'
+                files[name] = data
+                new_src = f'{ASSETS_DIR}/{name}'
+            attributes = re.sub(r'(\ssrc=")[^"]*(")', lambda m: m.group(1) + new_src + m.group(2), attributes, count=1)
+            # Sizes given in the markdown win over the image's own
+            if 'width' not in names and 'height' not in names:
+                added = f' width="{width}" height="{height}"' + added
+            return f'<img{attributes}{added}{" /" if closing else ""}>'
+        
+        return IMG_TAG_PATTERN.sub(rewrite_tag, html_content), files
+
+
+class BuildCache:
+    """Persistent manifest of converted files for incremental batch builds
+    
+    Each entry is keyed by a hash of the input bytes together with the
+    converter settings, so a file is only reconverted when its content,
+    the settings or the converter version change.
+    """
+    
+    def __init__(self, manifest_file, settings):
+        self.manifest_file = Path(manifest_file)
+        self.fingerprint = hashlib.sha256(
+            json.dumps(settings, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        self.entries = self._load()
+    
+    def _load(self):
+        """Read the manifest, starting empty if it is missing or unreadable"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get('version') != __version__:
+            return {}
+        return manifest.get('files', {})
+    
+    def key(self, input_file):
+        """Hash the input bytes together with the converter settings"""
+        digest = hashlib.sha256(self.fingerprint.encode('utf-8'))
+        with open(input_file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def is_fresh(self, input_file, output_file, key):
+        """Return True if output_file is still the conversion of input_file"""
+        entry = self.entries.get(str(Path(input_file).resolve()))
+        if not entry or entry['key'] != key or entry['output'] != str(output_file):
+            return False
+        try:
+            return os.path.getsize(output_file) == entry['size']
+        except OSError:
+            return False
+    
+    def record(self, input_file, output_file, key):
+        """Remember a successful conversion"""
+        self.entries[str(Path(input_file).resolve())] = {
+            'key': key,
+            'output': str(output_file),
+            'size': os.path.getsize(output_file),
+        }
+    
+    def save(self):
+        """Write the manifest atomically"""
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.manifest_file.with_name(self.manifest_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': __version__, 'files': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temp_file, self.manifest_file)
+
+
+class HeadingIndex:
+    """Persistent index of the linkable headings of every document in a corpus
+    
+    Lets "Chapter N: <heading>" references link to headings in other
+    documents. Each entry holds a document's output file and headings, and
+    is only rebuilt when the file's size, mtime and then content hash say
+    it changed, so adding a document indexes just that document.
+    """
+    
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self.entries = self._load()
+        # What references resolved to before this run's updates
+        self.previous = self.lookup()
+    
+    def _load(self):
+        """Read the index, starting empty if it is missing or unreadable"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(index, dict) or index.get('version') != __version__:
+            return {}
+        return index.get('files', {})
+    
+    def update(self, converter, input_file, output_file=None):
+        """Index input_file unless it is unchanged; return True if it was indexed"""
+        input_file = Path(input_file).resolve()
+        output = str(converter.resolve_output_path(input_file, output_file))
+        stat = input_file.stat()
+        entry = self.entries.get(str(input_file))
+        if entry and entry['output'] == output and entry['size'] == stat.st_size \
+                and entry['mtime'] == stat.st_mtime_ns:
+            return False
+        
+        content = input_file.read_bytes()
+        key = hashlib.sha256(content).hexdigest()
+        if not entry or entry['key'] != key or entry['output'] != output:
+            headings = converter.extract_headings(content.decode('utf-8'))
+            entry = {'key': key, 'output': output, 'headings': list(headings.items())}
+        self.entries[str(input_file)] = dict(entry, size=stat.st_size, mtime=stat.st_mtime_ns)
+        return True
+    
+    def prune(self):
+        """Drop the entries of documents that no longer exist"""
+        for input_file in [input_file for input_file in self.entries if not os.path.exists(input_file)]:
+            del self.entries[input_file]
+    
+    def lookup(self):
+        """Return {heading text: (output file, id)}, the first document by path winning"""
+        headings = {}
+        for input_file in sorted(self.entries):
+            entry = self.entries[input_file]
+            for heading_text, heading_id in entry['headings']:
+                headings.setdefault(heading_text, (entry['output'], heading_id))
+        return headings
+    
+    def changed_headings(self, headings):
+        """Return the heading texts whose target differs from before this run"""
+        return {
+            heading_text for heading_text in self.previous.keys() | headings.keys()
+            if self.previous.get(heading_text) != headings.get(heading_text)
+        }
+    
+    @staticmethod
+    def mentions(input_file, phrases):
+        """Return True if input_file may reference a heading given as reference_words()
+        
+        Checked against the markdown source word by word, so it errs
+        towards True.
+        """
+        with open(input_file, 'r', encoding='utf-8') as f:
+            words = reference_words(f.read())
+        source = f' {words} '
+        vocabulary = set(words.split())
+        return any(
+            all(word in vocabulary for word in phrase.split()) and f' {phrase} ' in source
+            for phrase in phrases
+        )
+    
+    def save(self):
+        """Write the index atomically"""
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': __version__, 'files': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temp_file, self.index_file)
+
+
+class ConversionResult:
+    """A page converted in memory by MarkdownToHtmlConverter.convert_string_result()
+    
+    html is the page and title its title. toc is the table of contents as
+    the sidebar shows it, and headings the (level, text, id) of each heading
+    in the content. files maps the chapters, assets and markdown side file
+    the page loads, by their path relative to it, to their content.
+    """
+    
+    def __init__(self, html, title, toc, headings, files):
+        self.html = html
+        self.title = title
+        self.toc = toc
+        self.headings = headings
+        self.files = files
+    
+    def __str__(self):
+        return self.html
+
 
 class MarkdownToHtmlConverter:
-    def __init__(self, toc_depth=1):
-        self.toc_items = []
+    def __init__(self, toc_depth=1, section_cache=False, split_chapters=False, markdown_source='inline',
+                 assets='inline', highlight_cache=None, highlight_cache_size=HIGHLIGHT_CACHE_SIZE,
+                 highlight_jobs=1, section_jobs=1, images='link', image_format='webp',
+                 image_max_width=IMAGE_MAX_WIDTH, image_inline_limit=IMAGE_INLINE_LIMIT, image_cache=None,
+                 virtual_tables=None, precompress=(), corpus_headings=None, low_memory=None,
+                 lazy_sections=False):
         self.html_template = self._get_html_template()
+        # Top-level sections are rendered by the browser only near the viewport
+        self.lazy_sections = lazy_sections
+        if lazy_sections:
+            self.html_template = self._lazy_sections_template(self.html_template)
+        # In external mode the page links a shared stylesheet and script
+        if assets not in ASSET_MODES:
+            raise ValueError(f"assets must be one of {', '.join(ASSET_MODES)}")
+        self.assets = {}
+        if assets == 'external':
+            self.html_template, self.assets = self._externalize_assets(self.html_template)
+        # (literal text, field name) pairs, parsed once and replayed by render()
+        self.template_parts = [
+            (literal, field) for literal, field, _, _ in string.Formatter().parse(self.html_template)
+        ]
         self.toc_depth = toc_depth
+        # Write chapters after the first as fragments loaded on demand
+        self.split_chapters = split_chapters
+        if markdown_source not in MARKDOWN_SOURCE_MODES:
+            raise ValueError(f"markdown_source must be one of {', '.join(MARKDOWN_SOURCE_MODES)}")
+        self.markdown_source = markdown_source
+        self.md = None
+        # One markdown engine per thread for convert_string(), as engines
+        # keep per-document state while converting
+        self.thread_engines = threading.local()
+        # Rendered sections by content hash, used to re-render only edited sections
+        self.section_cache = section_cache
+        self.fragments = OrderedDict()
+        self.chapters = []
+        # (level, text, id) of the headings of the last rendered document
+        self.headings = []
+        # Highlighted code blocks, on disk when highlight_cache names a
+        # directory; parallel highlighting fills an in-memory cache otherwise
+        self.highlight_jobs = highlight_jobs
+        self.highlight_cache = None
+        if highlight_cache or highlight_jobs > 1:
+            self.highlight_cache = HighlightCache(highlight_cache, highlight_cache_size)
+        # Large documents are split into sections rendered in this many processes
+        self.section_jobs = section_jobs
+        # (outline key, linkable headings) of section-cached renders by output file
+        self.section_headings = OrderedDict()
+        # Local images resized and transcoded; large ones are written to the
+        # assets directory and kept in self.image_files until then
+        if images not in IMAGE_MODES:
+            raise ValueError(f"images must be one of {', '.join(IMAGE_MODES)}")
+        self.image_optimizer = None
+        if images == 'optimize':
+            self.image_optimizer = ImageOptimizer(image_format, image_max_width, image_inline_limit, image_cache)
+        self.image_files = {}
+        # Tables with at least this many rows are rendered as virtual tables
+        if virtual_tables is not None and virtual_tables < 1:
+            raise ValueError('virtual_tables must be at least 1')
+        self.virtual_tables = virtual_tables
+        # Formats every written page, chapter and text asset is also
+        # compressed to, for static hosting
+        for compression in precompress:
+            if compression not in PRECOMPRESS_FORMATS:
+                raise ValueError(f"precompress formats must be among {', '.join(PRECOMPRESS_FORMATS)}")
+        if 'brotli' in precompress and find_spec('brotli') is None:
+            raise RuntimeError('Brotli precompression requires Brotli (pip install Brotli)')
+        self.precompress = tuple(precompress)
+        # {heading text: (output file, id)} of the other documents in a batch,
+        # for references to headings a document lacks (see HeadingIndex)
+        self.corpus_headings = corpus_headings or {}
+        # Window size in bytes for converting files in low-memory mode
+        if low_memory is not None:
+            if low_memory < 1:
+                raise ValueError('low_memory must be at least 1')
+            if split_chapters:
+                raise ValueError('low_memory cannot be combined with split_chapters')
+        self.low_memory = low_memory
         
     def convert(self, markdown_file, output_file=None):
         """Convert markdown file to HTML"""
+        if self.low_memory:
+            return self._convert_windowed(markdown_file, output_file)
+        
         # Convert to absolute path to handle relative paths correctly
         markdown_file = Path(markdown_file).resolve()
         
@@ -34,14 +1119,1011 @@ class MarkdownToHtmlConverter:
         with open(markdown_file, 'r', encoding='utf-8') as f:
             md_content = f.read()
         
-        # Store the original markdown content for copy functionality
-        self.original_markdown = md_content
+        return self.convert_content(md_content, markdown_file, output_file)
+    
+    def convert_content(self, md_content, markdown_file, output_file=None):
+        """Convert md_content to HTML, like convert()
+        
+        markdown_file need not exist: it only provides the fallback title,
+        the directory local images are resolved against and the default
+        output path.
+        """
+        markdown_file = Path(markdown_file).resolve()
+        output_file = self.resolve_output_path(markdown_file, output_file)
+        
+        # Ensure output directory exists
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Stream the page to disk, leaving unchanged outputs untouched so
+        # their mtimes stay stable
+        write_chunks_if_changed(output_file, self.render_content(md_content, markdown_file, output_file))
+        if self.markdown_source == 'external':
+            source_file = output_file.with_name(output_file.stem + SOURCE_FILE_SUFFIX)
+            write_if_changed(source_file, md_content)
+        self._write_side_files(output_file)
+        
+        return output_file
+    
+    def _convert_windowed(self, markdown_file, output_file=None):
+        """Convert a markdown file in low-memory mode, like convert()
+        
+        The file is memory-mapped and rendered a window at a time (see
+        _window_bounds()). The content, TOC and search index are spooled to
+        temporary files next to the output and copied into the page in
+        blocks, so memory use follows the window size and the number of
+        headings rather than the size of the document.
+        """
+        markdown_file = Path(markdown_file).resolve()
+        output_file = self.resolve_output_path(markdown_file, output_file)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        with open(markdown_file, 'rb') as f:
+            # An empty file cannot be mapped
+            if not os.fstat(f.fileno()).st_size:
+                return self.convert_content('', markdown_file, output_file)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                bounds, title = self._window_bounds(data)
+                if title is None:
+                    title = self._extract_title('', markdown_file)
+                write_chunks_if_changed(
+                    output_file, self._render_windowed(data, bounds, title, markdown_file, output_file)
+                )
+                if self.markdown_source == 'external':
+                    source_file = output_file.with_name(output_file.stem + SOURCE_FILE_SUFFIX)
+                    write_chunks_if_changed(source_file, (window_text(data, start, end) for start, end in bounds))
+        self._write_side_files(output_file)
+        
+        return output_file
+    
+    def _write_side_files(self, output_file):
+        """Write the assets, images and chapters of the page just written to output_file
+        
+        With precompression, the page and the text files it loads are
+        compressed too.
+        """
+        for asset_name, asset_content in {**self.assets, **self.image_files}.items():
+            write_asset(output_file.parent / ASSETS_DIR / asset_name, asset_content)
+        chapter_dir = output_file.with_name(output_file.stem + CHAPTER_DIR_SUFFIX)
+        self._write_chapters(chapter_dir, self.chapters)
+        
+        # Images are already compressed; everything else the page loads is text
+        if self.precompress:
+            text_files = [output_file]
+            text_files += [output_file.parent / ASSETS_DIR / asset_name for asset_name in self.assets]
+            text_files += [chapter_dir / f'chapter-{number}.html' for number in range(1, len(self.chapters) + 1)]
+            if self.markdown_source == 'external':
+                text_files.append(output_file.with_name(output_file.stem + SOURCE_FILE_SUFFIX))
+            for text_file in text_files:
+                write_precompressed(text_file, self.precompress)
+    
+    def render(self, markdown_file, output_file=None):
+        """Yield the HTML page for markdown_file in chunks
+        
+        The head, static stylesheet included, is yielded before the markdown
+        is rendered. The code highlighting rules, pruned to the classes the
+        content uses, follow in a stylesheet of their own, then the TOC,
+        content and trailing scripts. Links to chapter fragments and the
+        markdown side file are relative to output_file. Chapters for split
+        output are left in self.chapters, optimized images to be written to
+        the assets directory in self.image_files and the content's headings
+        in self.headings. Use convert_string() to convert from several
+        threads.
+        """
+        markdown_file = Path(markdown_file).resolve()
+        output_file = self.resolve_output_path(markdown_file, output_file)
+        
+        # Read markdown content
+        with open(markdown_file, 'r', encoding='utf-8') as f:
+            md_content = f.read()
+        
+        yield from self.render_content(md_content, markdown_file, output_file)
+    
+    def render_content(self, md_content, markdown_file, output_file=None):
+        """Yield the HTML page for md_content in chunks, like render()
+        
+        markdown_file need not exist: it only provides the fallback title
+        and the directory local images are resolved against.
+        """
+        markdown_file = Path(markdown_file).resolve()
+        output_file = self.resolve_output_path(markdown_file, output_file)
+        
+        self.chapters = []
+        self.image_files = {}
+        self.headings = []
+        
+        # Get title from first H1 or filename
+        title = self._extract_title(md_content, markdown_file)
+        
+        # Fields known before rendering; the rest, starting with the code
+        # highlighting CSS pruned to the classes in use, are filled in on
+        # first use, after the static head has been yielded
+        fields = {
+            'title': html.escape(title),
+        }
+        for literal, field in self.template_parts:
+            yield literal
+            if field is None:
+                continue
+            if field not in fields:
+                fields.update(self._render_fields(md_content, title, markdown_file, output_file))
+            yield fields[field]
+    
+    def _render_fields(self, md_content, title, markdown_file, output_file):
+        """Render md_content and return the template fields that depend on it"""
+        # Convert to HTML and extract the TOC. Cross-references are linked
+        # and a first H1 matching the title is dropped (it is shown in the
+        # page header) while the document is still an element tree.
+        html_content, toc_html = self._render_markdown(md_content, title, output_file)
+        
+        # Image paths are relative to the markdown file
+        if self.image_optimizer:
+            html_content, self.image_files = self.image_optimizer.rewrite(html_content, markdown_file.parent)
+        
+        # Only the highlighting rules for token classes that occur are embedded
+        pygments_css = prune_pygments_css('github-dark', used_classes(html_content))
+        
+        # Index the rendered content for the sidebar search
+        index = SearchIndexBuilder().build(html_content)
+        search_sections, search_index = self._build_search_index(index)
+        self.headings = index.headings
+        
+        # Large TOCs only render their top level up front
+        if toc_html.count('<a ') >= TOC_COLLAPSE_MIN_LINKS:
+            toc_html = collapse_toc(toc_html)
+        
+        # In split output mode the page only carries the first chapter
+        chapter_map = {}
+        if self.split_chapters:
+            html_content, self.chapters, chapter_map = self._split_chapters(html_content, index.section_starts)
+        
+        # Done after indexing and splitting, which work on the full markup,
+        # so table rows stay searchable
+        if self.lazy_sections:
+            offsets = top_level_offsets(index.section_starts)
+            if self.chapters:
+                # Each chapter is one top-level section, as is the shell after its leading content
+                offsets = offsets[:1]
+                self.chapters = [wrap_sections(chapter, [0], self.virtual_tables) for chapter in self.chapters]
+            html_content = wrap_sections(html_content, offsets, self.virtual_tables)
+        elif self.virtual_tables:
+            html_content = virtualize_tables(html_content, self.virtual_tables)
+            self.chapters = [virtualize_tables(chapter, self.virtual_tables) for chapter in self.chapters]
+        
+        chapter_dir = output_file.with_name(output_file.stem + CHAPTER_DIR_SUFFIX)
+        source_file = output_file.with_name(output_file.stem + SOURCE_FILE_SUFFIX)
+        if self.chapters:
+            html_content += ''.join(
+                f'\n<div class="chapter-placeholder" data-chapter="{number}" '
+                f'data-src="{quote(chapter_dir.name)}/chapter-{number}.html" '
+                f'style="min-height: {len(chapter) // 4}px"></div>'
+                for number, chapter in enumerate(self.chapters, start=1)
+            )
+        
+        return {
+            'pygments_css': pygments_css,
+            'content': html_content,
+            'toc': toc_html,
+            # Escape the markdown content for JavaScript
+            'markdown_content': self._embed_markdown_source(md_content, source_file),
+            'search_sections': search_sections,
+            'search_index': search_index,
+            'chapter_map': script_json(chapter_map),
+        }
+    
+    def _externalize_assets(self, template):
+        """Move the stylesheet and main script out of template into hashed assets
+        
+        Returns the new template and a dict of asset file names to content.
+        Each name carries a hash of its content, so pages can cache it forever.
+        """
+        style_start = template.index('<style>')
+        style_end = template.index('</style>') + len('</style>')
+        # The highlighting rules follow in a stylesheet of their own; the
+        # asset carries all of them instead, so every page can share it
+        pygments_end = template.index('</style>', style_end) + len('</style>')
+        css = minify_css(
+            template[style_start + len('<style>'):style_end - len('</style>')].format()
+            + get_pygments_css('github-dark')
+        )
+        
+        # The main script is the last one in the body
+        script_start = template.rindex('<script>')
+        script_end = template.index('</script>', script_start) + len('</script>')
+        js = minify_js(template[script_start + len('<script>'):script_end - len('</script>')].format())
+        
+        assets = {}
+        links = []
+        for content, extension in ((css, 'css'), (js, 'js')):
+            digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+            name = f'md2html.{digest}.{extension}'
+            assets[name] = content
+            links.append(f'{ASSETS_DIR}/{name}')
+        
+        template = (
+            template[:style_start]
+            + f'<link rel="stylesheet" href="{links[0]}">'
+            + template[pygments_end:script_start]
+            + f'<script src="{links[1]}"></script>'
+            + template[script_end:]
+        )
+        return template, assets
+    
+    def _lazy_sections_template(self, template):
+        """Return template styled for lazily rendered sections
+        
+        The transitions on every element and on content links are dropped,
+        as they make every style recalculation of a large document touch
+        each element; the sidebar, search, buttons and dialogs keep theirs.
+        """
+        template, universal = UNIVERSAL_TRANSITION_PATTERN.subn('\n', template)
+        template, links = LINK_TRANSITION_PATTERN.subn(r'\1', template)
+        if not universal or not links:
+            raise ValueError('template lacks the transitions lazy sections drop')
+        
+        style_end = template.index('</style>')
+        return template[:style_end] + '''    /* Lazy sections: laid out and painted only near the viewport */
+        .lazy-section {{
+            content-visibility: auto;
+        }}
+        
+        @media print {{
+            .lazy-section {{
+                content-visibility: visible;
+            }}
+        }}
+    ''' + template[style_end:]
+    
+    def _embed_markdown_source(self, md_content, source_file):
+        """Return the JavaScript value the page uses to copy the markdown source
+        
+        Inline mode embeds the source as a string. Compressed mode embeds it
+        gzipped and base64 encoded, and external mode points at the side file
+        written next to the output. Both are loaded only when the copy button
+        is used. With no source the value is null.
+        """
+        if self.markdown_source == 'inline':
+            return json.dumps(md_content)
+        if self.markdown_source == 'compressed':
+            import gzip
+            # A fixed mtime keeps the output identical across runs
+            compressed = gzip.compress(md_content.encode('utf-8'), compresslevel=9, mtime=0)
+            return json.dumps({'gzip': base64.b64encode(compressed).decode('ascii')})
+        if self.markdown_source == 'external':
+            return json.dumps({'src': quote(source_file.name)})
+        return 'null'
+    
+    def _split_chapters(self, html_content, section_starts):
+        """Split content into the shell's first chapter and the remaining chapters
+        
+        Chapters start at the shallowest top-level heading level that occurs
+        more than once. Returns (shell content, chapter fragments, chapter map),
+        where the map gives the chapter number holding each element id.
+        """
+        offsets = top_level_offsets(section_starts)
+        if not offsets:
+            return html_content, [], {}
+        
+        # The shell keeps everything before the second chapter heading
+        boundaries = offsets[1:]
+        boundaries.append(len(html_content))
+        chapters = [
+            html_content[start:end].strip()
+            for start, end in zip(boundaries, boundaries[1:])
+        ]
+        
+        anchors = {}
+        for number, chapter in enumerate(chapters, start=1):
+            for element_id in ELEMENT_ID_PATTERN.findall(chapter):
+                anchors[html.unescape(element_id)] = number
+        
+        return html_content[:boundaries[0]].rstrip(), chapters, {'anchors': anchors}
+    
+    def _write_chapters(self, chapter_dir, chapters):
+        """Write chapter fragments and remove ones left over from earlier runs"""
+        current = {f'chapter-{number}.html' for number in range(1, len(chapters) + 1)}
+        if chapter_dir.is_dir():
+            # Precompressed copies go with their chapter
+            for stale in chapter_dir.glob('chapter-*.html*'):
+                if stale.name.split('.html', 1)[0] + '.html' not in current:
+                    stale.unlink()
+        
+        if not chapters:
+            if chapter_dir.is_dir() and not any(chapter_dir.iterdir()):
+                chapter_dir.rmdir()
+            return
+        
+        chapter_dir.mkdir(parents=True, exist_ok=True)
+        for number, chapter in enumerate(chapters, start=1):
+            write_if_changed(chapter_dir / f'chapter-{number}.html', chapter + '\n')
+    
+    def convert_string(self, md_text, markdown_file=None):
+        """Return the HTML page for md_text, like convert_string_result()"""
+        return self.convert_string_result(md_text, markdown_file).html
+    
+    def convert_string_result(self, md_text, markdown_file=None):
+        """Convert md_text in memory and return a ConversionResult
+        
+        Safe to call from several threads at once: each call renders with
+        its own copy of the converter's per-document state and the calling
+        thread's markdown engine, and nothing is written to disk except the
+        highlight and image caches. markdown_file need not exist: it only
+        provides the fallback title, the directory local images are resolved
+        against and the names of the files in the result (document.md in the
+        working directory by default). The section cache is not used.
+        """
+        if self.low_memory or self.precompress:
+            raise ValueError('low_memory and precompress work on files; convert the document with convert()')
+        
+        converter = self._call_converter()
+        markdown_file = Path(markdown_file).resolve() if markdown_file else Path.cwd() / STDIN_NAME
+        output_file = converter.resolve_output_path(markdown_file)
+        title = converter._extract_title(md_text, markdown_file)
+        fields = {
+            'title': html.escape(title),
+            **converter._render_fields(md_text, title, markdown_file, output_file),
+        }
+        page = ''.join(
+            literal + (fields[field] if field is not None else '') for literal, field in converter.template_parts
+        )
+        
+        files = {
+            f'{ASSETS_DIR}/{asset_name}': asset_content
+            for asset_name, asset_content in {**converter.assets, **converter.image_files}.items()
+        }
+        chapter_dir = output_file.stem + CHAPTER_DIR_SUFFIX
+        for number, chapter in enumerate(converter.chapters, start=1):
+            files[f'{chapter_dir}/chapter-{number}.html'] = chapter + '\n'
+        if self.markdown_source == 'external':
+            files[output_file.stem + SOURCE_FILE_SUFFIX] = md_text
+        return ConversionResult(page, title, fields['toc'], converter.headings, files)
+    
+    def _call_converter(self):
+        """Return a copy of the converter for one conversion on the current thread
+        
+        The copy shares the settings, template and caches, and has its own
+        chapters, images and headings. The calling thread's markdown engine
+        is created on first use and kept for its later conversions.
+        """
+        import copy
+        
+        converter = copy.copy(self)
+        md = getattr(self.thread_engines, 'md', None)
+        if md is None:
+            md = self.thread_engines.md = self._create_markdown()
+        converter.md = md
+        converter.section_cache = False
+        converter.section_headings = OrderedDict()
+        converter.fragments = OrderedDict()
+        converter.chapters = []
+        converter.image_files = {}
+        converter.headings = []
+        return converter
+    
+    def resolve_output_path(self, markdown_file, output_file=None):
+        """Return the absolute HTML path a markdown file is converted to"""
+        if output_file is None:
+            # Default: same directory as input, with .html extension
+            return Path(markdown_file).resolve().with_suffix('.html')
+        
+        output_file = Path(output_file)
+        # If not absolute, make it relative to current working directory
+        if not output_file.is_absolute():
+            output_file = Path.cwd() / output_file
+        return output_file
+    
+    def settings(self):
+        """Return the settings that affect the generated HTML"""
+        return {
+            'version': __version__,
+            'toc_depth': self.toc_depth,
+            'template': hashlib.sha256(self.html_template.encode('utf-8')).hexdigest(),
+            'split_chapters': self.split_chapters,
+            'markdown_source': self.markdown_source,
+            'images': self.image_optimizer.settings() if self.image_optimizer else None,
+            'virtual_tables': self.virtual_tables,
+            'precompress': self.precompress,
+            # Whether references may link into other documents; which ones
+            # they link to is tracked by HeadingIndex
+            'heading_index': bool(self.corpus_headings),
+            'low_memory': self.low_memory,
+            'lazy_sections': self.lazy_sections,
+        }
+    
+    def _render_markdown(self, md_content, title=None, output_file=None):
+        """Render markdown to (html, toc), reusing cached sections when enabled
+        
+        A first H1 whose text is title is left out of the html. References to
+        other documents' headings are linked relative to output_file.
+        """
+        # Reuse one markdown engine across conversions, clearing its
+        # per-document state (TOC, footnotes, metadata) before each run
+        if self.md is None:
+            self.md = self._create_markdown()
+        md = self.md
+        cross_references = md.treeprocessors['cross_references']
+        output_file = str(output_file) if output_file else None
+        
+        sections = None
+        if self.section_cache or (self.section_jobs > 1 and len(md_content) >= PARALLEL_SECTION_MIN_SIZE):
+            sections = self._split_sections(md_content)
+        if not sections or len(sections) < 2:
+            md.reset()
+            cross_references.title = title
+            cross_references.headings = None
+            cross_references.corpus_headings = self.corpus_headings
+            cross_references.output_file = output_file
+            definitions = md.treeprocessors['footnote']
+            definitions.definitions = definitions.footnote_refs = None
+            html_content = md.convert(md_content)
+            return html_content, md.toc if hasattr(md, 'toc') else ''
+        
+        # Sections link against the document's headings and definitions, which
+        # are only known for certain once every section is rendered. Start
+        # from the headings of this document's last render while its heading
+        # lines are unchanged, or an outline of the heading lines, and the
+        # definitions found by rendering the definition lines alone, and
+        # render again in the rare case that they turn out to differ.
+        heading_lines = [line for section in sections for line in atx_heading_lines(section)]
+        outline_key = hashlib.sha256('\0'.join([str(title)] + heading_lines).encode('utf-8')).hexdigest()
+        known = self.section_headings.get(output_file)
+        if known and known[0] == outline_key:
+            headings = known[1]
+            self.section_headings.move_to_end(output_file)
+        else:
+            headings = self._outline_headings(heading_lines)
+        definitions = self._outline_definitions(md_content)
+        while True:
+            parts, toc_tokens, document_headings, document_definitions = self._render_sections(
+                sections, headings, definitions, title, output_file
+            )
+            if list(document_headings.items()) == list(headings.items()) and document_definitions == definitions:
+                break
+            headings = document_headings
+            definitions = document_definitions
+        if self.section_cache:
+            self.section_headings[output_file] = (outline_key, headings)
+            if len(self.section_headings) > SECTION_HEADINGS_SIZE:
+                self.section_headings.popitem(last=False)
+        
+        from markdown.extensions.toc import nest_toc_tokens
+        
+        # Rebuild the TOC from the combined headings
+        md.reset()
+        toc_div = md.treeprocessors['toc'].build_toc_div(nest_toc_tokens(toc_tokens))
+        toc_html = md.serializer(toc_div)
+        for postprocessor in md.postprocessors:
+            toc_html = postprocessor.run(toc_html)
+        
+        return '\n'.join(parts).strip(), toc_html
+    
+    def _render_sections(self, sections, headings, definitions, title, output_file=None):
+        """Render (or fetch) each section and combine them into one document
+        
+        Heading ids are assigned across the whole document exactly as the TOC
+        extension would, and footnote references numbered as the footnotes
+        extension would, with the document's footnotes in one list at the
+        end. Returns the html parts, the TOC tokens, the document's linkable
+        headings and the definitions its sections make.
+        """
+        from md2html_extensions import linkable_headings
+        # Links into other documents depend on the corpus and where the page goes
+        links = [headings, definitions]
+        if self.corpus_headings:
+            links += [output_file, sorted(self.corpus_headings.items())]
+        headings_key = hashlib.sha256(json.dumps(links).encode('utf-8')).hexdigest()
+        fragments = [None] * len(sections)
+        pending = []
+        for number, section in enumerate(sections):
+            # Only the document's first section can start with the title
+            section_title = title if number == 0 else None
+            key = hashlib.sha256(
+                f'{self.toc_depth}\0{headings_key}\0{section_title}\0{section}'.encode('utf-8')
+            ).hexdigest()
+            fragment = self.fragments.get(key)
+            if fragment is not None:
+                self.fragments.move_to_end(key)
+                fragments[number] = fragment
+            else:
+                pending.append((number, key, (section, section_title)))
+        
+        # Worker processes only pay off for large amounts of markdown
+        pending_size = sum(len(section) for _, _, (section, _) in pending)
+        if self.section_jobs > 1 and len(pending) > 1 and pending_size >= PARALLEL_SECTION_MIN_SIZE:
+            from concurrent.futures import ProcessPoolExecutor
+            
+            jobs = min(self.section_jobs, len(pending))
+            # The headings and definitions go to each worker once rather than
+            # with every section
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=init_section_worker,
+                initargs=(self._worker_options(), headings, output_file, definitions)
+            ) as executor:
+                rendered = list(executor.map(
+                    render_section,
+                    [arguments for _, _, arguments in pending],
+                    chunksize=max(1, len(pending) // (jobs * 4))
+                ))
+        else:
+            rendered = [
+                self._render_section(section, headings, section_title, output_file, definitions)
+                for _, _, (section, section_title) in pending
+            ]
+        
+        for (number, key, _), fragment in zip(pending, rendered):
+            fragments[number] = fragment
+            if self.section_cache:
+                self.fragments[key] = fragment
+                if len(self.fragments) > FRAGMENT_CACHE_SIZE:
+                    self.fragments.popitem(last=False)
+        
+        # Later definitions win, as in a whole document, but a redefined
+        # footnote keeps its place in the numbering
+        document_definitions = {'references': {}, 'abbreviations': {}, 'footnotes': []}
+        footnotes = OrderedDict()
+        for fragment in fragments:
+            found = fragment['definitions']
+            document_definitions['references'].update(found['references'])
+            document_definitions['abbreviations'].update(found['abbreviations'])
+            footnotes.update(found['footnotes'])
+        document_definitions['footnotes'] = list(footnotes.items())
+        
+        if definitions['footnotes']:
+            # Number repeated references to a footnote across the document,
+            # then add the footnote list with a back link to each
+            footnote_refs = Counter()
+            
+            def number_footnote_ref(match):
+                ref = 'fnref:' + html.unescape(match.group(1))
+                footnote_refs[ref] += 1
+                count = footnote_refs[ref]
+                return f'<sup id="fnref{count if count > 1 else ""}:{match.group(1)}">'
+            
+            fragments = [
+                dict(fragment, html=FOOTNOTE_REF_PATTERN.sub(number_footnote_ref, fragment['html']))
+                for fragment in fragments
+            ]
+            fragments.append(self._render_section(
+                FOOTNOTE_PLACEHOLDER, headings, None, output_file, definitions, dict(footnote_refs)
+            ))
+            document_definitions['references'].update(fragments[-1]['definitions']['references'])
+            document_definitions['abbreviations'].update(fragments[-1]['definitions']['abbreviations'])
+        
+        used_ids = set()
+        for fragment in fragments:
+            used_ids.update(fragment['explicit_ids'])
+        
+        parts = []
+        toc_tokens = []
+        heading_table = []
+        for fragment in fragments:
+            fragment_html, fragment_tokens, fragment_table = self._rename_heading_ids(fragment, used_ids)
+            if fragment_html:
+                parts.append(fragment_html)
+            toc_tokens.extend(fragment_tokens)
+            heading_table.extend(fragment_table)
+        
+        return parts, toc_tokens, linkable_headings(heading_table), document_definitions
+    
+    def _rename_heading_ids(self, fragment, used_ids):
+        """Give the generated heading ids of a rendered section their document-wide values
+        
+        used_ids holds the ids taken so far and gains the section's. Returns
+        the section's html, TOC tokens and heading table with the ids renamed.
+        """
+        from markdown.extensions.toc import unique
+        
+        renamed = {}
+        for slug, local_id in fragment['auto_ids']:
+            heading_id = unique(slug, used_ids)
+            if heading_id != local_id:
+                renamed[local_id] = heading_id
+        
+        fragment_html = fragment['html']
+        if renamed:
+            fragment_html = HEADING_ID_PATTERN.sub(
+                lambda match: match.group(1) + renamed.get(match.group(2), match.group(2)) + match.group(3),
+                fragment_html
+            )
+        toc_tokens = [dict(token, id=renamed.get(token['id'], token['id'])) for token in fragment['toc_tokens']]
+        heading_table = [
+            (heading_text, renamed.get(heading_id, heading_id))
+            for heading_text, heading_id in fragment['heading_table']
+        ]
+        return fragment_html, toc_tokens, heading_table
+    
+    def _outline_headings(self, heading_lines):
+        """Return the linkable headings of a document from its ATX heading lines alone"""
+        from md2html_extensions import linkable_headings
+        md = self.md
+        md.reset()
+        cross_references = md.treeprocessors['cross_references']
+        cross_references.title = None
+        cross_references.headings = {}
+        cross_references.output_file = None
+        definitions = md.treeprocessors['footnote']
+        definitions.definitions = definitions.footnote_refs = None
+        md.convert('\n\n'.join(heading_lines))
+        return linkable_headings(md.heading_table)
+    
+    def _outline_definitions(self, md_content):
+        """Return the reference, footnote and abbreviation definitions of a document
+        
+        Only the definition lines are rendered, so fenced code that looks
+        like a definition can make these differ from the ones a full render
+        finds.
+        """
+        definitions = {'references': {}, 'abbreviations': {}, 'footnotes': []}
+        definition_lines = '\n\n'.join(match.group() for match in DEFINITION_PATTERN.finditer(md_content))
+        if not definition_lines:
+            return definitions
+        return self._render_section(definition_lines, {}, None, definitions=definitions)['definitions']
+    
+    def extract_headings(self, md_content):
+        """Return a document's linkable {heading text: id} without rendering all of it
+        
+        Only the ATX heading lines are rendered, so the ids are the ones a
+        full render assigns.
+        """
+        if self.md is None:
+            self.md = self._create_markdown()
+        return self._outline_headings(atx_heading_lines(md_content))
+    
+    def _worker_options(self):
+        """Return the converter options section workers need to render identically"""
+        cache_dir = self.highlight_cache.cache_dir if self.highlight_cache else None
+        return {
+            'toc_depth': self.toc_depth,
+            'highlight_cache': str(cache_dir) if cache_dir else None,
+            'highlight_cache_size': self.highlight_cache.max_bytes if self.highlight_cache else HIGHLIGHT_CACHE_SIZE,
+            'corpus_headings': self.corpus_headings,
+        }
+    
+    def _render_section(self, section, headings, title, output_file=None, definitions=None, footnote_refs=None):
+        """Render one section on its own, linking against the document's headings
+        
+        With the document's definitions, these replace the section's own,
+        which are returned in the fragment. footnote_refs, the document's
+        {'fnref:id': count} of footnote references, renders its footnote list.
+        """
+        if self.md is None:
+            self.md = self._create_markdown()
+        md = self.md
+        md.reset()
+        cross_references = md.treeprocessors['cross_references']
+        cross_references.title = title
+        cross_references.headings = headings
+        cross_references.corpus_headings = self.corpus_headings
+        cross_references.output_file = output_file
+        document_definitions = md.treeprocessors['footnote']
+        document_definitions.definitions = definitions
+        document_definitions.footnote_refs = footnote_refs
+        document_definitions.found = None
+        md.convert(section)
+        return {
+            # Keep trailing whitespace from raw HTML blocks, which a full
+            # render leaves in place between sections
+            'html': md.unstripped_output,
+            'toc_tokens': flatten_toc_tokens(md.toc_tokens),
+            'explicit_ids': md.heading_ids['explicit'],
+            'auto_ids': md.heading_ids['auto'],
+            'heading_table': md.heading_table,
+            'definitions': document_definitions.found,
+        }
+    
+    def _split_sections(self, md_content):
+        """Split markdown at top-level headings where a split cannot change the output
+        
+        Returns None when the document has raw HTML blocks, which may span
+        a heading, or places or removes document-wide content (a [TOC] marker,
+        a footnote placeholder or an abbreviation removal), since those need a
+        full render.
+        """
+        match = WHOLE_DOCUMENT_PATTERN.search(md_content)
+        if match:
+            if self.section_jobs > 1 and len(md_content) >= PARALLEL_SECTION_MIN_SIZE:
+                print(
+                    f"Note: rendering in one process, since the document contains "
+                    f"{WHOLE_DOCUMENT_CONSTRUCTS[match.lastgroup]}",
+                    file=sys.stderr
+                )
+            return None
+        
+        lines = md_content.splitlines(keepends=True)
+        candidates = []
+        fence = None
+        previous_blank = True
+        for number, line in enumerate(lines):
+            if fence:
+                if line.rstrip() == fence:
+                    fence = None
+            else:
+                fence_match = FENCE_PATTERN.match(line)
+                if fence_match:
+                    fence = fence_match.group(1)
+                else:
+                    heading_match = SPLIT_HEADING_PATTERN.match(line)
+                    if heading_match and previous_blank and number:
+                        candidates.append((number, len(heading_match.group(1))))
+            previous_blank = not line.strip()
+        
+        split_level = top_level([level for _, level in candidates])
+        if split_level is None:
+            return None
+        
+        import zlib
+        
+        sections = []
+        start = 0
+        for number, level in candidates:
+            if level <= split_level:
+                section = ''.join(lines[start:number])
+                if len(section) >= SECTION_GROUP_SIZE or not zlib.crc32(lines[number].encode('utf-8')) % SECTION_GROUP_CUT:
+                    sections.append(section)
+                    start = number
+        sections.append(''.join(lines[start:]))
+        return [section for section in sections if section.strip()]
+    
+    def _window_bounds(self, data):
+        """Return the (start, end) byte offsets of a mapped document's windows, and its title
+        
+        A window ends once it holds self.low_memory bytes and the next line
+        is a heading after a blank line, or LOW_MEMORY_BLOCK_SPLIT times that
+        and the next line starts a block of its own. Fenced code is never
+        split, and a single block larger than that stays in one window. The
+        title is the text of the first H1, as _extract_title() finds it.
+        """
+        bounds = []
+        start = position = 0
+        title = None
+        fence = None
+        previous_blank = True
+        data.seek(0)
+        for raw_line in iter(data.readline, b''):
+            line = raw_line.decode('utf-8')
+            if title is None:
+                title_match = TITLE_PATTERN.match(line)
+                if title_match:
+                    title = title_match.group(1).strip()
+            if fence:
+                if line.rstrip() == fence:
+                    fence = None
+            else:
+                size = position - start
+                if previous_blank and size >= self.low_memory and line.strip() and (
+                        SPLIT_HEADING_PATTERN.match(line)
+                        or (size >= self.low_memory * LOW_MEMORY_BLOCK_SPLIT
+                            and not BLOCK_CONTINUATION_PATTERN.match(line))):
+                    bounds.append((start, position))
+                    start = position
+                fence_match = FENCE_PATTERN.match(line)
+                if fence_match:
+                    fence = fence_match.group(1)
+            previous_blank = not line.strip()
+            position += len(raw_line)
+        bounds.append((start, position))
+        return bounds, title
+    
+    def _windowed_headings(self, data, bounds):
+        """Return the linkable headings and the explicit heading ids of a mapped document
+        
+        Like _outline_headings(), from the ATX heading lines alone, rendered
+        a window at a time.
+        """
+        from md2html_extensions import linkable_headings
+        outlines = []
+        explicit_ids = set()
+        for start, end in bounds:
+            fragment = self._render_section('\n\n'.join(atx_heading_lines(window_text(data, start, end))), {}, None)
+            explicit_ids.update(fragment['explicit_ids'])
+            outlines.append(dict(fragment, html='', toc_tokens=[]))
+        
+        used_ids = set(explicit_ids)
+        heading_table = []
+        for fragment in outlines:
+            heading_table.extend(self._rename_heading_ids(fragment, used_ids)[2])
+        return linkable_headings(heading_table), explicit_ids
+    
+    def _windowed_wrap_level(self, data, bounds, title):
+        """Return the heading level of a mapped document's top-level sections, or None
+        
+        Like top_level_offsets(), from the ATX heading lines alone; a first
+        H1 whose text is title is left out, as it is from the page.
+        """
+        levels = []
+        first_h1 = True
+        for start, end in bounds:
+            for line in atx_heading_lines(window_text(data, start, end)):
+                level = len(SPLIT_HEADING_PATTERN.match(line).group(1))
+                if level == 1 and first_h1:
+                    first_h1 = False
+                    if line.strip('#').strip() == title:
+                        continue
+                levels.append(level)
+        return top_level(levels)
+    
+    def _render_windowed(self, data, bounds, title, markdown_file, output_file):
+        """Yield the HTML page for a mapped document in chunks, like render_content()"""
+        from contextlib import ExitStack
+        
+        self.chapters = []
+        self.image_files = {}
+        self.headings = []
+        fields = {
+            'title': html.escape(title),
+        }
+        # The spool files live until the page is written
+        with ExitStack() as spools:
+            for literal, field in self.template_parts:
+                yield literal
+                if field is None:
+                    continue
+                if field not in fields:
+                    fields.update(self._render_windows(data, bounds, title, markdown_file, output_file, spools))
+                value = fields[field]
+                if isinstance(value, str):
+                    yield value
+                else:
+                    yield from value
+    
+    def _render_windows(self, data, bounds, title, markdown_file, output_file, spools):
+        """Render a mapped document a window at a time and return the template fields
+        
+        Each window goes through the steps _render_fields() applies to a whole
+        document. Fields that grow with the document are written to spool
+        files entered on spools and returned as generators that read them
+        back in blocks. Sections of the search index are numbered across the
+        document; the index itself is a list of one index per window, which
+        the page merges.
+        """
+        import tempfile
+        import xml.etree.ElementTree as etree
+        
+        def spool():
+            return spools.enter_context(tempfile.TemporaryFile('w+', encoding='utf-8', dir=output_file.parent))
+        
+        def read_back(spool_file, prefix='', suffix=''):
+            yield prefix
+            spool_file.seek(0)
+            yield from iter(lambda: spool_file.read(self.low_memory), '')
+            yield suffix
+        
+        def read_back_collapsed(spool_file):
+            spool_file.seek(0)
+            nested = []
+            for line in spool_file:
+                yield collapse_toc(line, nested)
+        
+        content, toc, search_sections, search_index = spool(), spool(), spool(), spool()
+        toc_writer = TocWriter(toc.write)
+        headings, used_ids = self._windowed_headings(data, bounds)
+        wrap_level = self._windowed_wrap_level(data, bounds, title) if self.lazy_sections else None
+        classes = set()
+        section_count = 0
+        pending = ''
+        started = False
+        for number, (start, end) in enumerate(bounds):
+            fragment = self._render_section(
+                window_text(data, start, end), headings, title if number == 0 else None, output_file
+            )
+            used_ids.update(fragment['explicit_ids'])
+            window_html, toc_tokens, _ = self._rename_heading_ids(fragment, used_ids)
+            
+            # TOC links go through the postprocessors while the window's
+            # markdown state is current, one line per link
+            if toc_tokens:
+                links = []
+                for token in toc_tokens:
+                    link = etree.Element('a')
+                    link.text = token['name']
+                    link.attrib['href'] = '#' + token['id']
+                    links.append(self.md.serializer(link))
+                links_html = '\n'.join(links)
+                for postprocessor in self.md.postprocessors:
+                    links_html = postprocessor.run(links_html)
+                for token, link_html in zip(toc_tokens, links_html.split('\n')):
+                    toc_writer.add(token['level'], link_html)
+            
+            if self.image_optimizer:
+                window_html, image_files = self.image_optimizer.rewrite(window_html, markdown_file.parent)
+                self.image_files.update(image_files)
+            classes.update(used_classes(window_html))
+            
+            # A window's leading section continues the last section of the one before
+            index = SearchIndexBuilder().build(window_html)
+            self.headings.extend(index.headings)
+            offset = max(section_count - 1, 0)
+            for section_id in index.section_ids[1 if number else 0:]:
+                search_sections.write((',' if section_count else '') + script_json(section_id))
+                section_count += 1
+            search_index.write((',' if number else '') + script_json({
+                term: [offset + section for section in postings] for term, postings in index.terms.items()
+            }))
+            
+            # Content a window starts with, before its first top-level
+            # heading, is left unwrapped
+            if wrap_level:
+                window_html = wrap_sections(window_html, [
+                    offset for offset, level in index.section_starts if level <= wrap_level
+                ], self.virtual_tables)
+            elif self.virtual_tables:
+                window_html = virtualize_tables(window_html, self.virtual_tables)
+            
+            # Windows are joined by newlines and the content stripped, as
+            # _render_markdown() joins sections; trailing whitespace waits
+            # until more content follows it
+            if window_html:
+                window_html = pending + ('\n' if number else '') + window_html
+                if not started:
+                    window_html = window_html.lstrip()
+                stripped = window_html.rstrip()
+                if stripped:
+                    content.write(stripped)
+                    started = True
+                pending = window_html[len(stripped):]
+        toc_writer.close()
+        
+        source_file = output_file.with_name(output_file.stem + SOURCE_FILE_SUFFIX)
+        # Large TOCs only render their top level up front
+        if toc_writer.links >= TOC_COLLAPSE_MIN_LINKS:
+            toc_html = read_back_collapsed(toc)
+        else:
+            toc_html = read_back(toc)
+        return {
+            'pygments_css': prune_pygments_css('github-dark', classes),
+            'content': read_back(content),
+            'toc': toc_html,
+            'markdown_content': self._windowed_markdown_source(data, bounds, source_file),
+            'search_sections': read_back(search_sections, '[', ']'),
+            'search_index': read_back(search_index, '[', ']'),
+            'chapter_map': script_json({}),
+        }
+    
+    def _windowed_markdown_source(self, data, bounds, source_file):
+        """Yield _embed_markdown_source() for a mapped document a window at a time"""
+        if self.markdown_source == 'inline':
+            # Escaping is per character, so escaped windows join into the escaped whole
+            yield '"'
+            for start, end in bounds:
+                yield json.dumps(window_text(data, start, end))[1:-1]
+            yield '"'
+        elif self.markdown_source == 'compressed':
+            import zlib
+            
+            yield '{"gzip": "'
+            # The same stream gzip.compress() gives with a zero mtime
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+            pending = b''
+            for number, (start, end) in enumerate(bounds, start=1):
+                pending += compressor.compress(window_text(data, start, end).encode('utf-8'))
+                if number == len(bounds):
+                    pending += compressor.flush()
+                # Base64 encodes whole groups of 3 bytes; the rest waits for the next window
+                cut = len(pending) if number == len(bounds) else len(pending) // 3 * 3
+                yield base64.b64encode(pending[:cut]).decode('ascii')
+                pending = pending[cut:]
+            yield '"}'
+        else:
+            # External and no source don't embed the text
+            yield self._embed_markdown_source('', source_file)
+    
+    def _build_search_index(self, index):
+        """Return the section ids and inverted index as JSON for embedding in a script tag"""
+        return script_json(index.section_ids), script_json(index.terms)
+    
+    def _create_markdown(self):
+        """Build the markdown engine with the converter's extensions"""
+        import markdown
+        from md2html_extensions import (
+            CachedCodeHiliteExtension, CachedFencedCodeExtension, CrossReferenceTreeprocessor,
+            DocumentDefinitionsTreeprocessor, HighlightPrefetchPreprocessor, RecordingTocExtension,
+            UnstrippedOutputPostprocessor
+        )
         
-        # Configure markdown extensions
         md = markdown.Markdown(extensions=[
             'extra',
             'codehilite',
-            'fenced_code',
+            CachedFencedCodeExtension(),
             'tables',
             'toc',
             'attr_list',
@@ -50,74 +2132,35 @@ class MarkdownToHtmlConverter:
             'sane_lists',
             'footnotes',
             'meta',
-            TocExtension(
+            RecordingTocExtension(
                 baselevel=1,
                 toc_depth=self.toc_depth,  # Control TOC depth
                 permalink=False,  # Disable permalink symbols
                 slugify=self._slugify
             ),
-            CodeHiliteExtension(
+            CachedCodeHiliteExtension(
                 guess_lang=False,
-                css_class='highlight'
+                css_class='highlight',
+                **({'highlight_cache': self.highlight_cache} if self.highlight_cache else {})
             )
         ])
-        
-        # Convert to HTML
-        html_content = md.convert(md_content)
-        
-        # Extract TOC
-        toc_html = md.toc if hasattr(md, 'toc') else ''
-        
-        # Process cross-references
-        html_content = self._process_cross_references(html_content, md_content)
-        
-        # Get title from first H1 or filename
-        title = self._extract_title(md_content, markdown_file)
-        
-        # Remove the first H1 from content if it matches the title
-        # This prevents duplicate title display
-        import re as regex
-        h1_pattern = r'^<h1[^>]*>.*?</h1>\s*'
-        first_h1_match = regex.match(h1_pattern, html_content, regex.IGNORECASE | regex.DOTALL)
-        if first_h1_match:
-            # Extract text content from the H1 tag
-            h1_text = regex.sub(r'<[^>]+>', '', first_h1_match.group(0)).strip()
-            # If it matches our title, remove it
-            if h1_text == title:
-                html_content = html_content[first_h1_match.end():]
-        
-        # Get code highlighting CSS
-        pygments_css = HtmlFormatter(style='github-dark').get_style_defs('.highlight')
-        
-        # Escape the markdown content for JavaScript
-        escaped_markdown = json.dumps(self.original_markdown)
-        
-        # Build final HTML
-        final_html = self.html_template.format(
-            title=html.escape(title),
-            content=html_content,
-            toc=toc_html,
-            pygments_css=pygments_css,
-            markdown_content=escaped_markdown
+        if self.highlight_cache and self.highlight_jobs > 1:
+            # Runs just before fenced_code (priority 25)
+            md.preprocessors.register(
+                HighlightPrefetchPreprocessor(md, self.highlight_cache, self.highlight_jobs),
+                'highlight_prefetch',
+                26
+            )
+        # Replaces the footnote list builder, which runs before the inline
+        # patterns (priority 20) resolve links, abbreviations and footnotes
+        md.treeprocessors.register(
+            DocumentDefinitionsTreeprocessor(md, md.treeprocessors['footnote'].footnotes), 'footnote', 50
         )
-        
-        # Handle output file path
-        if output_file is None:
-            # Default: same directory as input, with .html extension
-            output_file = markdown_file.with_suffix('.html')
-        else:
-            output_file = Path(output_file)
-            # If not absolute, make it relative to current working directory
-            if not output_file.is_absolute():
-                output_file = Path.cwd() / output_file
-        
-        # Ensure output directory exists
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(final_html)
-        
-        return output_file
+        # Runs right after the TOC (priority 5), which records the headings
+        md.treeprocessors.register(CrossReferenceTreeprocessor(md), 'cross_references', 4)
+        # Runs last, so the section cache can see the output before stripping
+        md.postprocessors.register(UnstrippedOutputPostprocessor(md), 'unstripped_output', 0)
+        return md
     
     def _slugify(self, text, separator='-'):
         """Create URL-friendly slugs from heading text"""
@@ -128,88 +2171,13 @@ class MarkdownToHtmlConverter:
     def _extract_title(self, md_content, filename):
         """Extract title from markdown content or filename"""
         # Try to find first H1
-        match = re.search(r'^#\s+(.+)$', md_content, re.MULTILINE)
+        match = TITLE_PATTERN.search(md_content)
         if match:
             return match.group(1).strip()
         
         # Fallback to filename
         return Path(filename).stem.replace('_', ' ').title()
     
-    def _extract_headings(self, md_content):
-        """Extract all headings from markdown content"""
-        headings = {}
-        
-        # Match all heading levels (1-6)
-        heading_pattern = r'^(#{1,6})\s+(.+)$'
-        matches = re.finditer(heading_pattern, md_content, re.MULTILINE)
-        
-        for match in matches:
-            level = len(match.group(1))
-            heading_text = match.group(2).strip()
-            # Create the slug/anchor the same way as the TOC extension
-            anchor = self._slugify(heading_text)
-            headings[heading_text] = anchor
-        
-        return headings
-    
-    def _process_cross_references(self, html_content, md_content):
-        """Process cross-references and convert section titles to links"""
-        # Extract all headings from the markdown
-        headings = self._extract_headings(md_content)
-        
-        # Focus on specific patterns that are most common in the document
-        # Look for "Related Chapters" sections and similar references
-        
-        # First, find all list items in "Related Chapters" sections
-        related_sections_pattern = r'(?:<h[1-6][^>]*>.*?(?:Related Chapters|🔗 Related Chapters).*?</h[1-6]>)(.*?)(?=<h[1-6]|$)'
-        related_sections = re.findall(related_sections_pattern, html_content, re.DOTALL | re.IGNORECASE)
-        
-        for section in related_sections:
-            # Process each heading in the section
-            for heading_text, anchor in headings.items():
-                # Skip very short headings to avoid false matches
-                if len(heading_text) < 5:
-                    continue
-                
-                escaped_heading = re.escape(heading_text)
-                
-                # Simple pattern for list items
-                pattern = rf'(<li>[^<]*?)({escaped_heading})([^<]*?</li>)'
-                
-                def replace_with_link(match):
-                    # Check if already linked
-                    if '<a ' in match.group(0):
-                        return match.group(0)
-                    return f'{match.group(1)}<a href="#{anchor}">{match.group(2)}</a>{match.group(3)}'
-                
-                section_updated = re.sub(pattern, replace_with_link, section)
-                html_content = html_content.replace(section, section_updated)
-        
-        # Also process chapter/appendix references in the main text
-        for heading_text, anchor in headings.items():
-            if len(heading_text) < 5:
-                continue
-                
-            escaped_heading = re.escape(heading_text)
-            
-            # Match full chapter/appendix references
-            patterns = [
-                rf'(<strong>)(Chapter \d+: {escaped_heading})(</strong>)',
-                rf'(<strong>)(Appendix \w+: {escaped_heading})(</strong>)',
-                rf'(>)(Chapter \d+: {escaped_heading})(<)',
-                rf'(>)(Appendix \w+: {escaped_heading})(<)',
-            ]
-            
-            for pattern in patterns:
-                def replace_with_link(match):
-                    if '<a ' in match.group(0):
-                        return match.group(0)
-                    return f'{match.group(1)}<a href="#{anchor}">{match.group(2)}</a>{match.group(3)}'
-                
-                html_content = re.sub(pattern, replace_with_link, html_content)
-        
-        return html_content
-    
     def _get_html_template(self):
         """Return the HTML template with embedded CSS and JavaScript"""
         return '''<!DOCTYPE html>
@@ -455,6 +2423,48 @@ class MarkdownToHtmlConverter:
             padding-left: calc(0.75rem - 3px);
         }}
         
+        /* Large TOCs: subtrees are collapsed until expanded */
+        .toc-collapsible li {{
+            position: relative;
+        }}
+        
+        .toc-collapsible a {{
+            padding-right: 2rem;
+        }}
+        
+        .toc-toggle {{
+            position: absolute;
+            top: 0.25rem;
+            right: 0;
+            width: 1.75rem;
+            height: 1.75rem;
+            padding: 0;
+            border: none;
+            border-radius: 0.375rem;
+            background: transparent;
+            color: var(--text-secondary);
+            cursor: pointer;
+        }}
+        
+        .toc-toggle::before {{
+            content: '\\25B8';
+            display: inline-block;
+            transition: transform 0.2s;
+        }}
+        
+        .toc-toggle[aria-expanded="true"]::before {{
+            transform: rotate(90deg);
+        }}
+        
+        .toc-toggle:hover {{
+            background-color: rgba(59, 130, 246, 0.1);
+            color: var(--accent-color);
+        }}
+        
+        .toc-toggle[aria-expanded="false"] + ul {{
+            display: none;
+        }}
+        
         /* Main content area */
         .main-content {{
             flex: 1;
@@ -750,6 +2760,12 @@ class MarkdownToHtmlConverter:
             margin-bottom: 0;
         }}
         
+        /* Images */
+        article img {{
+            max-width: 100%;
+            height: auto;
+        }}
+        
         /* Code blocks */
         pre {{
             margin: 1.5rem 0;
@@ -810,6 +2826,73 @@ class MarkdownToHtmlConverter:
             background-color: rgba(59, 130, 246, 0.05);
         }}
         
+        /* Virtual tables: rows near the viewport are rendered from embedded data */
+        .virtual-table {{
+            margin: 1.5rem 0;
+        }}
+        
+        .virtual-table-controls {{
+            display: flex;
+            align-items: center;
+            gap: 1rem;
+            margin-bottom: 0.5rem;
+        }}
+        
+        .virtual-table-filter {{
+            flex: 0 1 20rem;
+            padding: 0.375rem 0.75rem;
+            border: 1px solid rgba(255, 255, 255, 0.1);
+            border-radius: 0.5rem;
+            background-color: rgba(30, 41, 59, 0.5);
+            color: var(--text-primary);
+            font-size: 0.875rem;
+        }}
+        
+        .virtual-table-filter:focus {{
+            outline: none;
+            border-color: var(--primary-color);
+        }}
+        
+        .virtual-table-count {{
+            color: var(--text-tertiary);
+            font-size: 0.875rem;
+        }}
+        
+        .virtual-table-viewport {{
+            max-height: 70vh;
+            overflow: auto;
+            border-radius: 0.5rem;
+            box-shadow: var(--shadow-md);
+        }}
+        
+        .virtual-table-viewport table {{
+            margin: 0;
+            overflow: visible;
+            box-shadow: none;
+        }}
+        
+        .virtual-table-viewport th {{
+            position: sticky;
+            top: 0;
+            z-index: 1;
+            background: var(--bg-secondary);
+            cursor: pointer;
+            user-select: none;
+        }}
+        
+        .virtual-table-viewport th[aria-sort="ascending"]::after {{
+            content: ' \\25B2';
+        }}
+        
+        .virtual-table-viewport th[aria-sort="descending"]::after {{
+            content: ' \\25BC';
+        }}
+        
+        .virtual-table-spacer td {{
+            padding: 0;
+            border: none;
+        }}
+        
         /* Horizontal rule */
         hr {{
             margin: 2rem 0;
@@ -846,8 +2929,10 @@ class MarkdownToHtmlConverter:
         .progress-fill {{
             height: 100%;
             background: linear-gradient(to right, var(--primary-color), var(--accent-color));
-            width: 0%;
-            transition: width 0.3s ease;
+            width: 100%;
+            transform: scaleX(0);
+            transform-origin: left;
+            transition: transform 0.3s ease;
             box-shadow: 0 0 10px rgba(59, 130, 246, 0.7);
         }}
         
@@ -894,6 +2979,11 @@ class MarkdownToHtmlConverter:
             }}
         }}
         
+        /* Placeholders for chapters not yet loaded in split output mode */
+        .chapter-placeholder {{
+            border-top: 1px solid var(--border-color);
+        }}
+        
         /* Print styles */
         @media print {{
             .sidebar, .menu-toggle, .progress-bar, .floating-actions, .search-highlight {{
@@ -905,11 +2995,17 @@ class MarkdownToHtmlConverter:
                 max-width: 100%;
                 padding: 2rem;
             }}
+            
+            .virtual-table-controls {{
+                display: none;
+            }}
+            
+            .virtual-table-viewport {{
+                max-height: none;
+                overflow: visible;
+            }}
         }}
         
-        /* Syntax highlighting (Pygments) */
-        {pygments_css}
-        
         /* Custom scrollbar */
         ::-webkit-scrollbar {{
             width: 8px;
@@ -959,6 +3055,10 @@ class MarkdownToHtmlConverter:
             }}
         }}
     </style>
+    <style>
+        /* Syntax highlighting (Pygments) */
+        {pygments_css}
+    </style>
 </head>
 <body>
     <!-- Progress bar -->
@@ -979,7 +3079,7 @@ class MarkdownToHtmlConverter:
             <div class="sidebar-header">
                 <div class="sidebar-title">Table of Contents</div>
                 <div class="search-container">
-                    <input type="text" class="search-input" placeholder="Search..." id="searchInput" onkeyup="performSearch()" onkeydown="handleSearchKeydown(event)">
+                    <input type="text" class="search-input" placeholder="Search..." id="searchInput" oninput="scheduleSearch()" onkeydown="handleSearchKeydown(event)">
                     <div class="search-navigation" id="searchNav" style="display: none;">
                         <span class="search-count" id="searchCount">0 / 0</span>
                         <button class="search-nav-btn" onclick="navigateSearch('prev')" title="Previous match">
@@ -1026,7 +3126,7 @@ class MarkdownToHtmlConverter:
             </svg>
             <span class="tooltip">Copy</span>
         </button>
-        <button class="action-button" onclick="window.print()" title="Print document">
+        <button class="action-button" onclick="printDocument()" title="Print document">
             <svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                 <path d="M6 9V2h12v7M6 18H4a2 2 0 01-2-2v-5a2 2 0 012-2h16a2 2 0 012 2v5a2 2 0 01-2 2h-2M6 14h12v8H6z"/>
             </svg>
@@ -1060,7 +3160,7 @@ class MarkdownToHtmlConverter:
                         <p>Copy with formatting, ready to paste into documents</p>
                     </div>
                 </div>
-                <div class="copy-option" onclick="copyMarkdown()">
+                <div class="copy-option" id="copyMarkdownOption" onclick="copyMarkdown()">
                     <div class="copy-option-icon">
                         <svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                             <path d="M16 18l2-2v-2l-2-2m-8 0l-2 2v2l2 2"/>
@@ -1076,10 +3176,71 @@ class MarkdownToHtmlConverter:
         </div>
     </div>
     
+    <!-- Search index built at conversion time: section ids and word postings -->
+    <script type="application/json" id="searchSections">{search_sections}</script>
+    <script type="application/json" id="searchIndex">{search_index}</script>
+    
+    <!-- Split output mode: the chapter holding each element id -->
+    <script type="application/json" id="chapterMap">{chapter_map}</script>
+    
+    <!-- Search worker: finds the sections that can contain a query -->
+    <script type="text/js-worker" id="searchWorkerSource">
+        let sectionCount = 0;
+        let terms = {{}};
+        let vocabulary = [];
+        
+        // Low-memory pages carry one index per window, with sections numbered
+        // across the document; a window's first section may repeat the last one
+        function mergeIndexes(indexes) {{
+            const merged = Object.create(null);
+            indexes.forEach(index => {{
+                for (const term in index) {{
+                    const postings = merged[term] || (merged[term] = []);
+                    index[term].forEach(section => {{
+                        if (postings[postings.length - 1] !== section) postings.push(section);
+                    }});
+                }}
+            }});
+            return merged;
+        }}
+        
+        self.onmessage = event => {{
+            const message = event.data;
+            if (message.index !== undefined) {{
+                const index = JSON.parse(message.index);
+                sectionCount = message.sectionCount;
+                terms = Array.isArray(index) ? mergeIndexes(index) : index;
+                vocabulary = Object.keys(terms);
+                return;
+            }}
+            
+            // A match of the query contains each of its words inside some indexed word
+            const words = message.query.match(/[\\p{{L}}\\p{{N}}_]+/gu) || [];
+            let candidates = null;
+            for (const word of words) {{
+                const found = new Set();
+                for (const term of vocabulary) {{
+                    if (term.includes(word)) {{
+                        terms[term].forEach(section => found.add(section));
+                    }}
+                }}
+                candidates = candidates === null ? found : new Set([...candidates].filter(section => found.has(section)));
+                if (candidates.size === 0) break;
+            }}
+            
+            const sections = candidates === null
+                ? Array.from({{ length: sectionCount }}, (_, section) => section)
+                : [...candidates].sort((a, b) => a - b);
+            self.postMessage({{ seq: message.seq, sections }});
+        }};
+    </script>
+    
     <script>
         // Store the original markdown content
         const markdownContent = {markdown_content};
-        
+    </script>
+    
+    <script>
         // Sidebar toggle
         function toggleSidebar() {{
             const sidebar = document.getElementById('sidebar');
@@ -1128,9 +3289,37 @@ class MarkdownToHtmlConverter:
             }}
         }}
         
+        // Load the markdown source, which may be compressed or a separate file
+        let markdownText = null;
+        
+        function loadMarkdown() {{
+            if (markdownText === null) {{
+                if (typeof markdownContent === 'string') {{
+                    markdownText = Promise.resolve(markdownContent);
+                }} else if (markdownContent.gzip) {{
+                    const bytes = Uint8Array.from(atob(markdownContent.gzip), c => c.charCodeAt(0));
+                    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+                    markdownText = new Response(stream).text();
+                }} else {{
+                    markdownText = fetch(markdownContent.src).then(response => {{
+                        if (!response.ok) throw new Error(`${{response.status}} loading ${{markdownContent.src}}`);
+                        return response.text();
+                    }});
+                }}
+                // Let a failed load be retried
+                markdownText.catch(() => {{ markdownText = null; }});
+            }}
+            return markdownText;
+        }}
+        
+        // Pages built without the source cannot offer to copy it
+        if (markdownContent === null) {{
+            document.getElementById('copyMarkdownOption').style.display = 'none';
+        }}
+        
         // Copy markdown content to clipboard
         function copyMarkdown() {{
-            navigator.clipboard.writeText(markdownContent).then(() => {{
+            loadMarkdown().then(text => navigator.clipboard.writeText(text)).then(() => {{
                 showNotification('Markdown copied to clipboard!', '#3b82f6');
                 closeCopyOptions();
             }}).catch(err => {{
@@ -1166,22 +3355,95 @@ class MarkdownToHtmlConverter:
         let searchMatches = [];
         let currentMatchIndex = 0;
         
+        // Queries go to a worker holding the search index; only the
+        // sections it returns are walked and highlighted
+        const searchSections = JSON.parse(document.getElementById('searchSections').textContent);
+        const searchSectionIds = new Set(searchSections.filter(id => id !== null));
+        let searchWorker = null;
+        let searchSeq = 0;
+        let searchTimer = null;
+        
+        function getSearchWorker() {{
+            if (searchWorker === null) {{
+                const source = document.getElementById('searchWorkerSource').textContent;
+                try {{
+                    searchWorker = new Worker(URL.createObjectURL(new Blob([source], {{ type: 'text/javascript' }})));
+                }} catch (err) {{
+                    // Workers can be unavailable; run the same search code inline
+                    searchWorker = createInlineSearch(source);
+                }}
+                searchWorker.onmessage = event => showSearchResults(event.data);
+                searchWorker.postMessage({{
+                    index: document.getElementById('searchIndex').textContent,
+                    sectionCount: searchSections.length
+                }});
+            }}
+            return searchWorker;
+        }}
+        
+        function createInlineSearch(source) {{
+            const search = {{ onmessage: null }};
+            const scope = {{ postMessage: data => setTimeout(() => search.onmessage({{ data }})) }};
+            new Function('self', source)(scope);
+            search.postMessage = data => scope.onmessage({{ data }});
+            return search;
+        }}
+        
+        function getSectionElements(section) {{
+            const content = document.getElementById('content');
+            const sectionId = searchSections[section];
+            const start = sectionId === null ? content.firstElementChild : document.getElementById(sectionId);
+            const elements = [];
+            for (let el = start; el; el = el.nextElementSibling) {{
+                // A lazy section holds whole search sections
+                if (el !== start && (searchSectionIds.has(el.id) || el.classList.contains('lazy-section'))) break;
+                elements.push(el);
+            }}
+            return elements;
+        }}
+        
+        function scheduleSearch() {{
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(performSearch, 120);
+        }}
+        
         function performSearch() {{
             const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-            const searchNav = document.getElementById('searchNav');
+            searchSeq += 1;
             
             if (searchTerm.length < 2) {{
                 removeHighlights();
-                searchNav.style.display = 'none';
+                document.getElementById('searchNav').style.display = 'none';
                 searchMatches = [];
                 return;
             }}
             
+            getSearchWorker().postMessage({{ seq: searchSeq, query: searchTerm }});
+        }}
+        
+        function showSearchResults(result) {{
+            // Ignore answers to queries that have since been replaced
+            if (result.seq !== searchSeq) return;
+            
+            const searchTerm = document.getElementById('searchInput').value.toLowerCase();
+            const searchNav = document.getElementById('searchNav');
+            
+            // Matching sections may sit in chapters that are not loaded yet
+            const chapters = result.sections
+                .map(section => chapterAnchors[searchSections[section]])
+                .filter(chapter => chapter !== undefined);
+            if (chapters.some(chapter => !loadedChapters.has(chapter))) {{
+                Promise.all(chapters.map(loadChapter)).then(() => showSearchResults(result));
+                return;
+            }}
+            
             removeHighlights();
             searchMatches = [];
             currentMatchIndex = 0;
             
-            highlightSearchTerm(document.getElementById('content'), searchTerm);
+            result.sections.forEach(section => {{
+                getSectionElements(section).forEach(el => highlightSearchTerm(el, searchTerm));
+            }});
             
             if (searchMatches.length > 0) {{
                 searchNav.style.display = 'flex';
@@ -1193,9 +3455,10 @@ class MarkdownToHtmlConverter:
         }}
         
         function removeHighlights() {{
-            const highlighted = document.querySelectorAll('.search-highlight');
-            highlighted.forEach(el => {{
+            // Only the spans from the last search need undoing
+            searchMatches.forEach(el => {{
                 const parent = el.parentNode;
+                if (!parent) return;
                 parent.replaceChild(document.createTextNode(el.textContent), el);
                 parent.normalize();
             }});
@@ -1306,6 +3569,8 @@ class MarkdownToHtmlConverter:
         
         function clearSearch() {{
             document.getElementById('searchInput').value = '';
+            clearTimeout(searchTimer);
+            searchSeq += 1;
             removeHighlights();
             document.getElementById('searchNav').style.display = 'none';
             searchMatches = [];
@@ -1325,35 +3590,316 @@ class MarkdownToHtmlConverter:
             }}
         }}
         
-        // Active TOC tracking
+        // Active TOC tracking. TOC links are indexed by heading id once, with
+        // the toggles of the collapsed subtrees (<template>s) that hold them.
+        const tocLinks = new Map();
+        
+        function indexTocLinks(root, toggles) {{
+            // Neither query descends into nested templates
+            root.querySelectorAll('a[href^="#"]').forEach(link => {{
+                tocLinks.set(link.getAttribute('href').slice(1), {{ link, toggles }});
+            }});
+            root.querySelectorAll('template').forEach(template => {{
+                indexTocLinks(template.content, toggles.concat(template.previousElementSibling));
+            }});
+        }}
+        
+        indexTocLinks(document.querySelector('nav.toc'), []);
+        
+        function expandTocItem(toggle) {{
+            const subtree = toggle.nextElementSibling;
+            if (subtree && subtree.tagName === 'TEMPLATE') subtree.replaceWith(subtree.content);
+            toggle.setAttribute('aria-expanded', 'true');
+        }}
+        
+        document.querySelector('nav.toc').addEventListener('click', event => {{
+            const toggle = event.target.closest('.toc-toggle');
+            if (!toggle) return;
+            if (toggle.getAttribute('aria-expanded') === 'true') {{
+                toggle.setAttribute('aria-expanded', 'false');
+            }} else {{
+                expandTocItem(toggle);
+            }}
+            // Subtrees the reader opened stay open while scrolling on
+            toggle.dataset.pinned = '';
+        }});
+        
+        let activeTocEntry = null;
+        
+        function setActiveHeading(id) {{
+            const entry = tocLinks.get(id);
+            if (!entry || entry === activeTocEntry) return;
+            if (activeTocEntry) {{
+                activeTocEntry.link.classList.remove('active');
+                // Collapse subtrees that were opened only to show the previous heading
+                activeTocEntry.toggles.forEach(toggle => {{
+                    if (!entry.toggles.includes(toggle) && !('pinned' in toggle.dataset)) {{
+                        toggle.setAttribute('aria-expanded', 'false');
+                    }}
+                }});
+            }}
+            entry.toggles.forEach(expandTocItem);
+            entry.link.classList.add('active');
+            activeTocEntry = entry;
+        }}
+        
         const observerOptions = {{
             rootMargin: '-20% 0px -70% 0px'
         }};
         
         const observer = new IntersectionObserver(entries => {{
+            // Of the headings entering the band, the last one wins
+            let current = null;
             entries.forEach(entry => {{
-                const id = entry.target.getAttribute('id');
-                const tocLink = document.querySelector(`.toc a[href="#${{id}}"]`);
+                if (entry.intersectionRatio > 0) current = entry.target;
+            }});
+            if (current) setActiveHeading(current.getAttribute('id'));
+        }}, observerOptions);
+        
+        // Observe the headings listed in the TOC
+        function observeHeadings(root) {{
+            root.querySelectorAll('h1[id], h2[id], h3[id], h4[id], h5[id], h6[id]').forEach(heading => {{
+                if (tocLinks.has(heading.getAttribute('id'))) observer.observe(heading);
+            }});
+        }}
+        
+        observeHeadings(document);
+        
+        // Split output mode: chapters after the first are fetched as they
+        // near the viewport or when a link, search or print needs them
+        const chapterAnchors = JSON.parse(document.getElementById('chapterMap').textContent).anchors || {{}};
+        const chapterRequests = new Map();
+        const loadedChapters = new Set();
+        
+        function getChapterPlaceholder(chapter) {{
+            return document.querySelector(`.chapter-placeholder[data-chapter="${{chapter}}"]`);
+        }}
+        
+        function fetchChapterText(chapter) {{
+            if (!chapterRequests.has(chapter)) {{
+                const placeholder = getChapterPlaceholder(chapter);
+                const request = placeholder
+                    ? fetch(placeholder.dataset.src).then(response => {{
+                        if (!response.ok) throw new Error(`${{response.status}} loading chapter ${{chapter}}`);
+                        return response.text();
+                    }})
+                    : Promise.resolve(null);
+                // Let a failed request be retried later
+                request.catch(() => chapterRequests.delete(chapter));
+                chapterRequests.set(chapter, request);
+            }}
+            return chapterRequests.get(chapter);
+        }}
+        
+        function loadChapter(chapter) {{
+            if (loadedChapters.has(chapter)) return Promise.resolve();
+            return fetchChapterText(chapter).then(text => {{
+                const placeholder = getChapterPlaceholder(chapter);
+                if (text === null || !placeholder || loadedChapters.has(chapter)) return;
+                
+                const template = document.createElement('template');
+                template.innerHTML = text;
+                observeHeadings(template.content);
+                chapterObserver.unobserve(placeholder);
+                placeholder.replaceWith(template.content);
+                loadedChapters.add(chapter);
+                initVirtualTables(document.getElementById('content'));
                 
-                if (entry.intersectionRatio > 0) {{
-                    document.querySelectorAll('.toc a').forEach(a => a.classList.remove('active'));
-                    if (tocLink) tocLink.classList.add('active');
+                // Warm the neighbours so scrolling on stays smooth
+                fetchChapterText(chapter + 1).catch(() => {{}});
+                if (chapter > 1) fetchChapterText(chapter - 1).catch(() => {{}});
+            }}).catch(err => console.error(err));
+        }}
+        
+        const chapterObserver = new IntersectionObserver(entries => {{
+            entries.forEach(entry => {{
+                if (entry.isIntersecting) loadChapter(Number(entry.target.dataset.chapter));
+            }});
+        }}, {{ rootMargin: '1500px 0px' }});
+        
+        document.querySelectorAll('.chapter-placeholder').forEach(placeholder => {{
+            chapterObserver.observe(placeholder);
+        }});
+        
+        function scrollToAnchor(id) {{
+            const chapter = chapterAnchors[id];
+            if (chapter === undefined || document.getElementById(id)) return false;
+            loadChapter(chapter).then(() => {{
+                const target = document.getElementById(id);
+                if (target) target.scrollIntoView();
+            }});
+            return true;
+        }}
+        
+        // Links into chapters that are not loaded yet
+        document.addEventListener('click', event => {{
+            const link = event.target.closest('a[href^="#"]');
+            if (!link) return;
+            const id = decodeURIComponent(link.getAttribute('href').slice(1));
+            if (scrollToAnchor(id)) {{
+                event.preventDefault();
+                history.pushState(null, '', '#' + encodeURIComponent(id));
+            }}
+        }});
+        
+        window.addEventListener('hashchange', () => {{
+            scrollToAnchor(decodeURIComponent(location.hash.slice(1)));
+        }});
+        
+        if (location.hash) {{
+            scrollToAnchor(decodeURIComponent(location.hash.slice(1)));
+        }}
+        
+        // Virtual tables: rows live in an embedded data array, sorted and
+        // filtered there, and only the ones near the viewport are rendered
+        const VIRTUAL_TABLE_OVERSCAN = 20;
+        const virtualTables = [];
+        const tableCollator = new Intl.Collator(undefined, {{ numeric: true, sensitivity: 'base' }});
+        const entities = {{ '&amp;': '&', '&lt;': '<', '&gt;': '>', '&quot;': '"', '&#39;': "'" }};
+        
+        function cellText(html) {{
+            return html.replace(/<[^>]*>/g, '').replace(/&(?:amp|lt|gt|quot|#39);/g, entity => entities[entity]).trim();
+        }}
+        
+        function virtualRowHtml(table, row) {{
+            const columns = table.data.columns;
+            return '<tr>' + table.data.rows[row].map((cell, column) => `<td${{columns[column]}}>${{cell}}</td>`).join('') + '</tr>';
+        }}
+        
+        function virtualSpacerHtml(table, height) {{
+            return `<tr class="virtual-table-spacer" style="height: ${{height}}px"><td colspan="${{table.data.columns.length}}"></td></tr>`;
+        }}
+        
+        function renderVirtualRows(table, measure = true) {{
+            const {{ viewport, tbody, order }} = table;
+            const first = Math.max(0, Math.floor(viewport.scrollTop / table.rowHeight) - VIRTUAL_TABLE_OVERSCAN);
+            const last = Math.min(order.length, first + Math.ceil(viewport.clientHeight / table.rowHeight) + 2 * VIRTUAL_TABLE_OVERSCAN);
+            let html = virtualSpacerHtml(table, first * table.rowHeight);
+            for (let index = first; index < last; index++) html += virtualRowHtml(table, order[index]);
+            tbody.innerHTML = html + virtualSpacerHtml(table, (order.length - last) * table.rowHeight);
+            
+            // Spacers are sized from the average height of the rendered rows
+            if (last > first) {{
+                const rows = tbody.rows;
+                const height = (rows[rows.length - 1].offsetTop - rows[1].offsetTop) / (last - first);
+                if (measure && height > 0 && Math.abs(height - table.rowHeight) > 1) {{
+                    table.rowHeight = height;
+                    renderVirtualRows(table, false);
                 }}
+            }}
+        }}
+        
+        function scheduleVirtualRows(table) {{
+            if (table.frame) return;
+            table.frame = requestAnimationFrame(() => {{
+                table.frame = 0;
+                renderVirtualRows(table);
             }});
-        }}, observerOptions);
+        }}
+        
+        function updateVirtualOrder(table) {{
+            const {{ data }} = table;
+            const query = table.filter.value.trim().toLowerCase();
+            let order = data.rows.map((_, row) => row);
+            if (query) {{
+                table.texts = table.texts || data.rows.map(row => row.map(cellText).join(' ').toLowerCase());
+                order = order.filter(row => table.texts[row].includes(query));
+            }}
+            if (table.sortColumn >= 0) {{
+                const column = table.sortColumn;
+                // Numeric cells sort by value, the rest with a natural collation
+                const keys = table.sortKeys[column] = table.sortKeys[column] || data.rows.map(row => {{
+                    const text = cellText(row[column]);
+                    const number = Number(text.replace(/[,%$]/g, ''));
+                    return text !== '' && !isNaN(number) ? number : text;
+                }});
+                order.sort((a, b) => {{
+                    const x = keys[a], y = keys[b];
+                    const result = typeof x === 'number' && typeof y === 'number' ? x - y
+                        : typeof x === 'number' ? -1
+                        : typeof y === 'number' ? 1
+                        : tableCollator.compare(x, y);
+                    return result * table.sortDirection;
+                }});
+            }}
+            table.order = order;
+            table.count.textContent = query ? `${{order.length}} of ${{data.rows.length}} rows` : `${{data.rows.length}} rows`;
+            table.viewport.scrollTop = 0;
+            renderVirtualRows(table);
+        }}
+        
+        function initVirtualTables(root) {{
+            root.querySelectorAll('.virtual-table:not([data-ready])').forEach(container => {{
+                container.dataset.ready = '';
+                const data = JSON.parse(container.querySelector('.virtual-table-data').textContent);
+                const viewport = container.querySelector('.virtual-table-viewport');
+                const table = {{
+                    data,
+                    viewport,
+                    tbody: viewport.querySelector('tbody'),
+                    filter: container.querySelector('.virtual-table-filter'),
+                    count: container.querySelector('.virtual-table-count'),
+                    order: [],
+                    rowHeight: 45,
+                    frame: 0,
+                    texts: null,
+                    sortKeys: [],
+                    sortColumn: -1,
+                    sortDirection: 1,
+                }};
+                virtualTables.push(table);
+                
+                viewport.addEventListener('scroll', () => scheduleVirtualRows(table), {{ passive: true }});
+                let filterTimer = 0;
+                table.filter.addEventListener('input', () => {{
+                    clearTimeout(filterTimer);
+                    filterTimer = setTimeout(() => updateVirtualOrder(table), 150);
+                }});
+                viewport.querySelector('thead').addEventListener('click', event => {{
+                    const header = event.target.closest('th');
+                    if (!header) return;
+                    const column = header.cellIndex;
+                    table.sortDirection = table.sortColumn === column ? -table.sortDirection : 1;
+                    table.sortColumn = column;
+                    viewport.querySelectorAll('th[aria-sort]').forEach(th => th.removeAttribute('aria-sort'));
+                    header.setAttribute('aria-sort', table.sortDirection > 0 ? 'ascending' : 'descending');
+                    updateVirtualOrder(table);
+                }});
+                updateVirtualOrder(table);
+            }});
+        }}
+        
+        initVirtualTables(document);
         
-        // Observe all headings
-        document.querySelectorAll('h1[id], h2[id], h3[id], h4[id], h5[id], h6[id]').forEach(heading => {{
-            observer.observe(heading);
+        // Printing renders every row of every virtual table, in source order
+        window.addEventListener('beforeprint', () => {{
+            virtualTables.forEach(table => {{
+                table.tbody.innerHTML = table.data.rows.map((_, row) => virtualRowHtml(table, row)).join('');
+            }});
         }});
         
-        // Progress bar
+        window.addEventListener('afterprint', () => virtualTables.forEach(table => renderVirtualRows(table)));
+        
+        function printDocument() {{
+            // Print the whole document, not just the loaded chapters
+            const chapters = Array.from(document.querySelectorAll('.chapter-placeholder'), placeholder => Number(placeholder.dataset.chapter));
+            Promise.all(chapters.map(loadChapter)).then(() => window.print());
+        }}
+        
+        // Progress bar, updated at most once per animation frame
+        const progressFill = document.querySelector('.progress-fill');
+        let progressFrame = 0;
+        
         window.addEventListener('scroll', () => {{
-            const winScroll = document.body.scrollTop || document.documentElement.scrollTop;
-            const height = document.documentElement.scrollHeight - document.documentElement.clientHeight;
-            const scrolled = (winScroll / height) * 100;
-            document.querySelector('.progress-fill').style.width = scrolled + '%';
-        }});
+            if (progressFrame) return;
+            progressFrame = requestAnimationFrame(() => {{
+                progressFrame = 0;
+                const winScroll = document.body.scrollTop || document.documentElement.scrollTop;
+                const height = document.documentElement.scrollHeight - document.documentElement.clientHeight;
+                const scrolled = height > 0 ? winScroll / height : 0;
+                progressFill.style.transform = `scaleX(${{scrolled}})`;
+            }});
+        }}, {{ passive: true }});
         
         // Initialize on load
         window.addEventListener('DOMContentLoaded', () => {{
@@ -1365,6 +3911,195 @@ class MarkdownToHtmlConverter:
 </html>'''
 
 
+@functools.lru_cache(maxsize=STRING_CONVERTERS)
+def string_converter(**options):
+    """Return the converter convert_string() shares between calls with the same options"""
+    return MarkdownToHtmlConverter(**options)
+
+
+def convert_string(md_text, markdown_file=None, **options):
+    """Convert md_text to an HTML page with MarkdownToHtmlConverter options, thread-safely"""
+    return string_converter(**options).convert_string(md_text, markdown_file)
+
+
+def convert_string_result(md_text, markdown_file=None, **options):
+    """Convert md_text to a ConversionResult with MarkdownToHtmlConverter options, thread-safely"""
+    return string_converter(**options).convert_string_result(md_text, markdown_file)
+
+
+# Converter owned by each batch worker process, built once by init_worker
+worker_converter = None
+
+
+def init_worker(converter_options):
+    """Build one warm converter per worker process"""
+    global worker_converter
+    worker_converter = MarkdownToHtmlConverter(**converter_options)
+
+
+# Linkable headings, output file and definitions of the document whose
+# sections a worker renders
+worker_headings = None
+worker_output_file = None
+worker_definitions = None
+
+
+def init_section_worker(converter_options, headings, output_file=None, definitions=None):
+    """Build a warm converter for rendering the sections of one document"""
+    global worker_headings, worker_output_file, worker_definitions
+    init_worker(converter_options)
+    worker_headings = headings
+    worker_output_file = output_file
+    worker_definitions = definitions
+
+
+def render_section(arguments):
+    """Render one (section, title) of a large document in a worker process"""
+    section, title = arguments
+    return worker_converter._render_section(section, worker_headings, title, worker_output_file, worker_definitions)
+
+
+def convert_file(input_file, output_file=None, converter=None):
+    """Convert one file and report (input, output, seconds, error, traceback)"""
+    converter = converter or worker_converter
+    start = time.perf_counter()
+    try:
+        result = converter.convert(input_file, output_file)
+        return input_file, result, time.perf_counter() - start, None, None
+    except Exception as e:
+        import traceback
+        return input_file, None, time.perf_counter() - start, str(e), traceback.format_exc()
+
+
+def convert_stdio(converter, input_file, output_file=None):
+    """Convert one document where '-' names stdin or stdout, returning the output
+    
+    A document read from stdin is written to stdout unless output_file is
+    given. Its images are resolved against the working directory.
+    """
+    if input_file == STDIO_PATH:
+        markdown_file = Path.cwd() / STDIN_NAME
+        md_content = sys.stdin.buffer.read().decode('utf-8')
+    else:
+        markdown_file = Path(input_file).resolve()
+        with open(markdown_file, 'r', encoding='utf-8') as f:
+            md_content = f.read()
+    
+    if output_file not in (None, STDIO_PATH):
+        return converter.convert_content(md_content, markdown_file, output_file)
+    
+    # Chunks are written as they are rendered, so a reader downstream in
+    # the pipe gets the head of the page before the body is done
+    stdout = sys.stdout.buffer
+    for chunk in converter.render_content(md_content, markdown_file):
+        stdout.write(chunk.encode('utf-8'))
+    stdout.flush()
+    return STDIO_PATH
+
+
+def convert_parallel(input_files, output_file, converter_options, jobs):
+    """Convert files in a process pool, yielding results in input order"""
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(input_files)),
+        initializer=init_worker,
+        initargs=(converter_options,)
+    ) as executor:
+        futures = [executor.submit(convert_file, input_file, output_file) for input_file in input_files]
+        for input_file, future in zip(input_files, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # A crashed worker only fails the files it was holding
+                yield input_file, None, 0.0, f'worker failed: {e}', None
+
+
+def print_summary(timings, failures, total_time, verbose=False, up_to_date=0):
+    """Print per-file timings and failures at the end of a batch run"""
+    converted = sum(1 for _, _, error in timings if error is None)
+    total = converted + len(failures) + up_to_date
+    print(f"\nConverted {converted} of {total} file(s) in {total_time:.2f}s", end='')
+    print(f" ({up_to_date} up to date)" if up_to_date else '')
+    
+    if verbose:
+        for input_file, elapsed, error in timings:
+            status = '✓' if error is None else '✗'
+            print(f"  {status} {elapsed:8.2f}s  {input_file}")
+    elif timings:
+        slowest = max(timings, key=lambda timing: timing[1])
+        print(f"Slowest: {slowest[0]} ({slowest[1]:.2f}s)")
+    
+    if failures:
+        print(f"Failed ({len(failures)}):", file=sys.stderr)
+        for input_file in failures:
+            print(f"  ✗ {input_file}", file=sys.stderr)
+
+
+def file_signature(path):
+    """Return (mtime, size) for change detection, or None if the file is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(converter, input_files, output_file=None, port=8000, interval=0.25, debounce=0.3, verbose=False):
+    """Re-render each input when it changes and live reload the pages showing it
+    
+    Saves are coalesced: a file is rendered once it has been left alone for
+    `debounce` seconds, so a burst of edits triggers a single render.
+    """
+    outputs = {input_file: converter.resolve_output_path(input_file, output_file) for input_file in input_files}
+    signatures = {input_file: file_signature(input_file) for input_file in input_files}
+    pending = {}
+    
+    server = None
+    if port:
+        from md2html_server import LiveReloadServer
+        
+        root = Path(os.path.commonpath([str(path.parent) for path in outputs.values()]))
+        server = LiveReloadServer(('127.0.0.1', port), root, verbose)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        for result in outputs.values():
+            print(f"Serving http://127.0.0.1:{server.server_port}/{result.relative_to(root).as_posix()}")
+    print(f"Watching {len(input_files)} file(s) for changes (Ctrl+C to stop)")
+    
+    try:
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            for input_file in input_files:
+                signature = file_signature(input_file)
+                if signature != signatures[input_file]:
+                    signatures[input_file] = signature
+                    pending[input_file] = now
+            
+            for input_file, changed_at in list(pending.items()):
+                if now - changed_at < debounce or signatures[input_file] is None:
+                    continue
+                del pending[input_file]
+                input_file, result, elapsed, error, details = convert_file(input_file, outputs[input_file], converter)
+                if converter.highlight_cache:
+                    converter.highlight_cache.prune(throttle=True)
+                if error is None:
+                    print(f"✓ {result} ({elapsed:.2f}s)")
+                    if server:
+                        server.notify(result)
+                else:
+                    print(f"Error converting '{input_file}': {error}", file=sys.stderr)
+                    if verbose and details:
+                        print(details, file=sys.stderr, end='')
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Convert Markdown to beautiful, modern HTML',
@@ -1374,18 +4109,41 @@ Examples:
   %(prog)s document.md
   %(prog)s document.md -o output.html
   %(prog)s *.md --batch
+  %(prog)s *.md --batch --jobs 8
+  %(prog)s *.md --batch --cache
+  %(prog)s *.md --batch --highlight-cache
+  %(prog)s reports/*.md --batch --cache --heading-index
+  %(prog)s *.md --batch --assets external
+  %(prog)s document.md --watch
+  %(prog)s document.md --split-chapters
+  %(prog)s document.md --markdown-source compressed
+  %(prog)s document.md --images optimize --image-format avif
+  %(prog)s document.md --virtual-tables 500
+  %(prog)s docs/*.md --batch --precompress
+  %(prog)s data_dictionary.md --low-memory --markdown-source external
+  %(prog)s handbook.md --lazy-sections --virtual-tables
+  %(prog)s --serve --port 8080 --jobs 4
+  cat document.md | %(prog)s - > document.html
+  %(prog)s document.md -o - | gzip > document.html.gz
         '''
     )
     
+    parser.add_argument(
+        '--version',
+        action='version',
+        version=f'%(prog)s {__version__}'
+    )
+    
     parser.add_argument(
         'input',
-        nargs='+',
-        help='Input markdown file(s)'
+        nargs='*',
+        help=f'Input markdown file(s), or {STDIO_PATH} to read one document from stdin'
     )
     
     parser.add_argument(
         '-o', '--output',
-        help='Output HTML file (default: same name as input with .html extension)'
+        help=f'Output HTML file, or {STDIO_PATH} for stdout (default: same name as input with '
+             '.html extension, or stdout when reading stdin)'
     )
     
     parser.add_argument(
@@ -1394,6 +4152,100 @@ Examples:
         help='Process multiple files in batch mode'
     )
     
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Number of worker processes used to convert files in parallel (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        nargs='?',
+        const=DEFAULT_CACHE_FILE,
+        metavar='MANIFEST',
+        help=f'Skip files whose content and settings are unchanged since the last run, '
+             f'tracked in MANIFEST (default: {DEFAULT_CACHE_FILE})'
+    )
+    
+    parser.add_argument(
+        '--heading-index',
+        nargs='?',
+        const=DEFAULT_HEADING_INDEX_FILE,
+        metavar='INDEX',
+        help='Link "Chapter N: <heading>" references to headings in the other documents, '
+             'indexed across runs in INDEX; only new and changed files are indexed again '
+             f'(default: {DEFAULT_HEADING_INDEX_FILE})'
+    )
+    
+    parser.add_argument(
+        '--highlight-cache',
+        nargs='?',
+        const=DEFAULT_HIGHLIGHT_CACHE_DIR,
+        metavar='DIR',
+        help=f'Reuse highlighted code blocks from earlier runs, stored in DIR '
+             f'(default: {DEFAULT_HIGHLIGHT_CACHE_DIR})'
+    )
+    
+    parser.add_argument(
+        '--highlight-cache-size',
+        type=int,
+        default=HIGHLIGHT_CACHE_SIZE // (1024 * 1024),
+        metavar='MB',
+        help='Size limit of the highlight cache; least recently used blocks are evicted first '
+             f'(default: {HIGHLIGHT_CACHE_SIZE // (1024 * 1024)})'
+    )
+    
+    parser.add_argument(
+        '--highlight-jobs',
+        type=int,
+        default=1,
+        help='Worker processes used to highlight the fenced code blocks of a document (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--section-jobs',
+        type=int,
+        default=1,
+        help='Worker processes used to render the sections of documents over '
+             f'{PARALLEL_SECTION_MIN_SIZE // (1024 * 1024)} MB in parallel (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and re-render each input when it changes, serving the output with live reload'
+    )
+    
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=8000,
+        help='Port for the live reload server in watch mode, 0 disables serving; '
+             'or for the render service (default: 8000)'
+    )
+    
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Run an HTTP service that renders markdown POSTed to /render, '
+             'with --jobs warm worker processes'
+    )
+    
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Address the render service listens on (default: 127.0.0.1)'
+    )
+    
+    parser.add_argument(
+        '--max-pending',
+        type=int,
+        metavar='N',
+        help='Requests the render service accepts at once before answering 503 '
+             '(default: 8 per job)'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -1408,31 +4260,307 @@ Examples:
         help='Maximum heading level to include in table of contents (default: 1, shows only # headings)'
     )
     
+    parser.add_argument(
+        '--assets',
+        choices=ASSET_MODES,
+        default='inline',
+        help='inline embeds the stylesheet and script in every page; external writes '
+             f'them once, minified and content-hashed, to {ASSETS_DIR}/ (default: inline)'
+    )
+    
+    parser.add_argument(
+        '--markdown-source',
+        choices=MARKDOWN_SOURCE_MODES,
+        default='inline',
+        help='How to ship the source for "Copy Markdown": inline, compressed, '
+             'external (a side file fetched on demand) or none (default: inline)'
+    )
+    
+    parser.add_argument(
+        '--split-chapters',
+        action='store_true',
+        help='Write chapters after the first to <output>_chapters/ and load them on demand (needs an HTTP server)'
+    )
+    
+    parser.add_argument(
+        '--images',
+        choices=IMAGE_MODES,
+        default='link',
+        help='link leaves images as they are; optimize resizes and transcodes local images '
+             'with Pillow, inlining small ones as data URIs (default: link)'
+    )
+    
+    parser.add_argument(
+        '--image-format',
+        choices=IMAGE_FORMATS,
+        default='webp',
+        help='Format optimized images are transcoded to (default: webp)'
+    )
+    
+    parser.add_argument(
+        '--image-max-width',
+        type=int,
+        default=IMAGE_MAX_WIDTH,
+        metavar='PX',
+        help=f'Optimized images wider than this are scaled down (default: {IMAGE_MAX_WIDTH})'
+    )
+    
+    parser.add_argument(
+        '--image-inline-limit',
+        type=int,
+        default=IMAGE_INLINE_LIMIT // 1024,
+        metavar='KB',
+        help='Optimized images up to this size are embedded as data URIs; larger ones are '
+             f'written to {ASSETS_DIR}/ (default: {IMAGE_INLINE_LIMIT // 1024})'
+    )
+    
+    parser.add_argument(
+        '--image-cache',
+        default=DEFAULT_IMAGE_CACHE_DIR,
+        metavar='DIR',
+        help=f'Directory of optimized images kept between runs (default: {DEFAULT_IMAGE_CACHE_DIR})'
+    )
+    
+    parser.add_argument(
+        '--virtual-tables',
+        nargs='?',
+        type=int,
+        const=VIRTUAL_TABLE_MIN_ROWS,
+        metavar='ROWS',
+        help='Embed tables with at least ROWS rows as data, rendering only the rows in view '
+             f'with sorting and filtering; printing renders them in full (default: {VIRTUAL_TABLE_MIN_ROWS})'
+    )
+    
+    parser.add_argument(
+        '--precompress',
+        nargs='*',
+        choices=PRECOMPRESS_FORMATS,
+        metavar='FORMAT',
+        help='Also write gzip (.gz) and Brotli (.br) copies of each page, chapter and text asset '
+             f"for precompressed serving; FORMAT is {' or '.join(PRECOMPRESS_FORMATS)} (default: both)"
+    )
+    
+    parser.add_argument(
+        '--low-memory',
+        nargs='?',
+        type=int,
+        const=LOW_MEMORY_WINDOW // 1024,
+        metavar='KB',
+        help='Map each input instead of reading it and render it in windows of about KB, '
+             'so memory use does not grow with the size of the document '
+             f'(default: {LOW_MEMORY_WINDOW // 1024})'
+    )
+    
+    parser.add_argument(
+        '--lazy-sections',
+        action='store_true',
+        help='Let the browser lay out and paint top-level sections only as they near the view, '
+             'and drop the transitions on every element, for long documents'
+    )
+    
     args = parser.parse_args()
     
-    converter = MarkdownToHtmlConverter(toc_depth=args.toc_depth)
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.highlight_jobs < 1:
+        parser.error('--highlight-jobs must be at least 1')
+    if args.section_jobs < 1:
+        parser.error('--section-jobs must be at least 1')
+    if args.image_max_width < 1:
+        parser.error('--image-max-width must be at least 1')
+    if args.virtual_tables is not None and args.virtual_tables < 1:
+        parser.error('--virtual-tables must be at least 1')
+    if args.low_memory is not None:
+        if args.low_memory < 1:
+            parser.error('--low-memory must be at least 1')
+        if args.split_chapters or args.section_jobs > 1:
+            parser.error('--low-memory renders one window at a time; it cannot be combined '
+                         'with --split-chapters or --section-jobs')
+    # A bare --precompress writes every format
+    if args.precompress == []:
+        args.precompress = list(PRECOMPRESS_FORMATS)
+    if args.precompress and 'brotli' in args.precompress and find_spec('brotli') is None:
+        parser.error('--precompress brotli requires Brotli (pip install Brotli)')
+    if args.images == 'optimize' and find_spec('PIL') is None:
+        parser.error('--images optimize requires Pillow (pip install Pillow)')
+    if args.images == 'optimize' and args.image_format != 'webp':
+        from PIL import Image
+        Image.init()
+        if args.image_format.upper() not in Image.SAVE:
+            parser.error(f'this Pillow build cannot write {args.image_format.upper()}; '
+                         'use --image-format webp or a Pillow with AVIF support')
+    writes_side_files = args.split_chapters or args.assets == 'external' \
+        or args.markdown_source == 'external' or args.images == 'optimize' or args.precompress
+    from_stdin = STDIO_PATH in args.input
+    to_stdout = args.output == STDIO_PATH or (from_stdin and not args.output)
+    if from_stdin and (len(args.input) > 1 or args.batch or args.watch or args.cache or args.heading_index):
+        parser.error(f'{STDIO_PATH} reads a single document from stdin; it cannot be combined '
+                     'with other inputs, --batch, --watch, --cache or --heading-index')
+    if (from_stdin or to_stdout) and args.low_memory is not None:
+        parser.error('--low-memory maps the input file and spools the page to disk; '
+                     'it cannot read stdin or write stdout')
+    if to_stdout:
+        if len(args.input) > 1 or args.batch or args.watch or args.cache or args.heading_index:
+            parser.error('stdout takes a single page; it cannot be combined with several inputs, '
+                         '--batch, --watch, --cache or --heading-index')
+        if writes_side_files:
+            parser.error('stdout takes a single page; chapters, assets, images, markdown '
+                         'side files and precompressed copies cannot be written next to it')
+    if args.serve:
+        if args.input or args.watch or args.heading_index or args.low_memory is not None:
+            parser.error('--serve takes no input files and cannot be combined with --watch, '
+                         '--heading-index or --low-memory')
+        if writes_side_files:
+            parser.error('--serve returns a single page; it cannot write chapters, assets, '
+                         'images, markdown side files or precompressed copies')
+        if args.max_pending is not None and args.max_pending < 1:
+            parser.error('--max-pending must be at least 1')
+    elif not args.input:
+        parser.error('the following arguments are required: input')
+    if args.jobs > 1 and args.output and not args.batch and len(args.input) > 1:
+        parser.error('--output cannot be shared by parallel jobs; use --batch')
     
-    # Process files
+    # Missing files are reported up front and count as failures
+    input_files = []
+    failures = []
     for input_file in args.input:
-        if not os.path.exists(input_file):
+        if input_file != STDIO_PATH and not os.path.exists(input_file):
             print(f"Error: File '{input_file}' not found", file=sys.stderr)
-            continue
-        
+            failures.append(input_file)
+        else:
+            input_files.append(input_file)
+    
+    output_file = args.output if not args.batch else None
+    batch_start = time.perf_counter()
+    
+    converter_options = {
+        'toc_depth': args.toc_depth,
+        'split_chapters': args.split_chapters,
+        'markdown_source': args.markdown_source,
+        'assets': args.assets,
+        'highlight_cache': args.highlight_cache,
+        'highlight_cache_size': args.highlight_cache_size * 1024 * 1024,
+        'highlight_jobs': args.highlight_jobs,
+        'section_jobs': args.section_jobs,
+        'images': args.images,
+        'image_format': args.image_format,
+        'image_max_width': args.image_max_width,
+        'image_inline_limit': args.image_inline_limit * 1024,
+        'image_cache': args.image_cache,
+        'virtual_tables': args.virtual_tables,
+        'precompress': args.precompress or (),
+        'low_memory': args.low_memory * 1024 if args.low_memory is not None else None,
+        'lazy_sections': args.lazy_sections,
+    }
+    if args.serve:
+        from md2html_server import serve
+        return serve(MarkdownToHtmlConverter, converter_options, args.host, args.port, args.jobs, args.max_pending,
+                     args.verbose)
+    
+    # Watch mode re-renders the same documents, so cache their sections
+    converter = MarkdownToHtmlConverter(**converter_options, section_cache=args.watch)
+    
+    # Status lines go to stderr here, as stdout may carry the page
+    if (from_stdin or to_stdout) and input_files:
+        start = time.perf_counter()
         try:
-            output_file = args.output if not args.batch else None
-            result = converter.convert(input_file, output_file)
-            
-            if args.verbose:
-                print(f"✓ Converted: {input_file} → {result}")
-            else:
-                print(f"✓ {result}")
-                
+            result = convert_stdio(converter, input_files[0], output_file)
+        except BrokenPipeError:
+            # The reader closed the pipe early; keep the flush at exit quiet
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
         except Exception as e:
-            print(f"Error converting '{input_file}': {e}", file=sys.stderr)
+            print(f"Error converting '{input_files[0]}': {e}", file=sys.stderr)
             if args.verbose:
                 import traceback
                 traceback.print_exc()
+            return 1
+        finally:
+            if converter.highlight_cache:
+                converter.highlight_cache.prune()
+        if args.verbose:
+            source = 'stdin' if from_stdin else input_files[0]
+            target = 'stdout' if to_stdout else result
+            print(f"✓ Converted: {source} → {target} ({time.perf_counter() - start:.2f}s)", file=sys.stderr)
+        return 0
+    
+    # With a heading index, references may link to headings of any indexed
+    # document. Only new and changed documents are indexed again.
+    heading_index = HeadingIndex(args.heading_index) if args.heading_index else None
+    changed_headings = set()
+    if heading_index:
+        for input_file in input_files:
+            try:
+                heading_index.update(converter, input_file, output_file)
+            except (OSError, UnicodeDecodeError):
+                # Reported when the file is converted
+                pass
+        heading_index.prune()
+        corpus_headings = heading_index.lookup()
+        changed_headings = {
+            reference_words(heading_text) for heading_text in heading_index.changed_headings(corpus_headings)
+        }
+        converter.corpus_headings = converter_options['corpus_headings'] = corpus_headings
+    
+    # With a cache, only files whose content or settings changed are converted,
+    # plus those that may reference a heading that moved between documents
+    cache = BuildCache(args.cache, converter.settings()) if args.cache else None
+    cache_keys = {}
+    up_to_date = {}
+    if cache:
+        for input_file in input_files:
+            result = converter.resolve_output_path(input_file, output_file)
+            key = cache.key(input_file)
+            if cache.is_fresh(input_file, result, key) and not (
+                    changed_headings and HeadingIndex.mentions(input_file, changed_headings)):
+                up_to_date[input_file] = result
+            else:
+                cache_keys[input_file] = key
+    stale_files = [input_file for input_file in input_files if input_file not in up_to_date]
+    
+    if args.jobs > 1 and len(stale_files) > 1:
+        results = convert_parallel(stale_files, output_file, converter_options, args.jobs)
+    else:
+        results = (convert_file(input_file, output_file, converter) for input_file in stale_files)
+    
+    # Results arrive in input order
+    timings = []
+    for input_file in input_files:
+        if input_file in up_to_date:
+            if args.verbose:
+                print(f"= Up to date: {input_file} → {up_to_date[input_file]}")
+            continue
+        
+        input_file, result, elapsed, error, details = next(results)
+        timings.append((input_file, elapsed, error))
+        if error is None:
+            if cache:
+                cache.record(input_file, result, cache_keys[input_file])
+            if args.verbose:
+                print(f"✓ Converted: {input_file} → {result} ({elapsed:.2f}s)")
+            else:
+                print(f"✓ {result}")
+        else:
+            failures.append(input_file)
+            print(f"Error converting '{input_file}': {error}", file=sys.stderr)
+            if args.verbose and details:
+                print(details, file=sys.stderr, end='')
+    
+    if cache:
+        cache.save()
+    if heading_index:
+        heading_index.save()
+    if converter.highlight_cache:
+        converter.highlight_cache.prune()
+    
+    if len(args.input) > 1:
+        print_summary(timings, failures, time.perf_counter() - batch_start, args.verbose, len(up_to_date))
+    
+    if args.watch and input_files:
+        return watch(converter, input_files, output_file, args.port, verbose=args.verbose)
+    
+    return 1 if failures else 0
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,613 @@
+"""
+Python-Markdown extensions for the Markdown to HTML converter
+Imported by the first conversion, so the CLI answers --help and --version
+without loading Markdown or Pygments
+"""
+
+import functools
+import hashlib
+import html
+import json
+import os
+import re
+import xml.etree.ElementTree as etree
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+import pygments
+
+from markdown import util
+from markdown.extensions.attr_list import AttrListExtension, get_attrs_and_remainder
+from markdown.extensions.codehilite import CodeHilite, CodeHiliteExtension, HiliteTreeprocessor, parse_hl_lines
+from markdown.extensions.fenced_code import FencedBlockPreprocessor, FencedCodeExtension
+from markdown.extensions.footnotes import FootnoteTreeprocessor
+from markdown.extensions.toc import (
+    TocExtension, TocTreeprocessor, remove_fnrefs, render_inner_html, strip_tags
+)
+from markdown.postprocessors import Postprocessor
+from markdown.preprocessors import Preprocessor
+from markdown.serializers import _escape_attrib_html
+from markdown.treeprocessors import Treeprocessor
+
+# Documents with fewer uncached fenced blocks are highlighted serially
+PARALLEL_HIGHLIGHT_MIN_BLOCKS = 32
+
+# Patterns used by the cross-reference linker
+RELATED_MARKER_PATTERN = re.compile(r'Related Chapters', re.IGNORECASE)
+CHAPTER_REFERENCE_PATTERN = re.compile(r'(?:Chapter \d+|Appendix \w+): (?P<heading>.*)', re.DOTALL)
+# Headings shorter than this are not linked, to avoid false matches
+MIN_LINKED_HEADING_LENGTH = 5
+# Placeholders left in element text for stashed HTML and escaped characters
+TEXT_PLACEHOLDER_PATTERN = re.compile(r'\x02(?:wzxhzdk:)?\d+\x03')
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+
+def linkable_headings(heading_table):
+    """Return {heading text: id} for headings long enough to link, first occurrence winning"""
+    headings = {}
+    for heading_text, heading_id in heading_table:
+        if len(heading_text) >= MIN_LINKED_HEADING_LENGTH:
+            headings.setdefault(heading_text, heading_id)
+    return headings
+
+
+@functools.lru_cache(maxsize=4096)
+def relative_url(target_file, from_dir):
+    """Return the URL of target_file relative to the directory from_dir"""
+    return quote(Path(os.path.relpath(target_file, from_dir)).as_posix())
+
+
+class HeadingMatcher:
+    """Aho-Corasick automaton that finds every heading title occurring in a text"""
+    
+    def __init__(self, headings):
+        self.source = headings
+        self.headings = list(headings)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        # Build the trie of heading titles
+        for index, heading_text in enumerate(self.headings):
+            state = 0
+            for char in heading_text:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(index)
+        
+        # Breadth-first pass to compute failure links
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.output[self.fail[next_state]]:
+                    self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+    
+    def find_all(self, text):
+        """Yield (heading index, end offset) for every occurrence, overlapping included"""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                yield index, position + 1
+
+
+class RecordingTocTreeprocessor(TocTreeprocessor):
+    """TOC treeprocessor that also records the headings and their ids
+    
+    After each run, md.heading_ids holds the ids that were already set before
+    the TOC ran ('explicit') and, for every heading it named, the slug and the
+    unique id it was given ('auto'), in document order. md.heading_table
+    lists (text, id) for every heading in document order, with the text as
+    the TOC slugified it; later treeprocessors link against this table.
+    """
+    
+    def run(self, doc):
+        explicit_ids = [el.attrib['id'] for el in doc.iter() if 'id' in el.attrib]
+        headings = [el for el in doc.iter() if isinstance(el.tag, str) and self.header_rgx.match(el.tag)]
+        named = [el for el in headings if 'id' not in el.attrib]
+        # Only headings without an id are slugified, so name the rest here
+        names = {
+            id(el): html.unescape(strip_tags(render_inner_html(remove_fnrefs(el), self.md)))
+            for el in headings if 'id' in el.attrib
+        }
+        
+        slugs = []
+        values = []
+        slugify = self.slugify
+        
+        def recording_slugify(value, separator):
+            slug = slugify(value, separator)
+            slugs.append(slug)
+            values.append(value)
+            return slug
+        
+        self.slugify = recording_slugify
+        try:
+            super().run(doc)
+        finally:
+            self.slugify = slugify
+        
+        self.md.heading_ids = {
+            'explicit': explicit_ids,
+            'auto': [(slug, el.attrib['id']) for slug, el in zip(slugs, named)],
+        }
+        names.update((id(el), value) for el, value in zip(named, values))
+        self.md.heading_table = [(names[id(el)], el.attrib['id']) for el in headings]
+
+
+class RecordingTocExtension(TocExtension):
+    """TocExtension that records heading id assignment (see RecordingTocTreeprocessor)"""
+    
+    TreeProcessorClass = RecordingTocTreeprocessor
+
+
+class CrossReferenceTreeprocessor(Treeprocessor):
+    """Drop the title heading and link cross-references to headings
+    
+    Runs right after the TOC and links against the heading table it records:
+    
+    - the first element is removed if it is an h1 whose text is self.title
+    - plain list items after a "Related Chapters" heading link the first
+      heading title (in document order) that any of them mentions
+    - text reading "Chapter N: <heading>" or "Appendix X: <heading>" links
+      to that heading
+    
+    When a section is rendered on its own, self.headings supplies the
+    document-wide {heading text: id} table instead.
+    
+    References to headings the document lacks are looked up in
+    self.corpus_headings, {heading text: (output file, id)} for the other
+    documents of a batch, and linked relative to self.output_file.
+    """
+    
+    def __init__(self, md):
+        super().__init__(md)
+        self.title = None
+        self.headings = None
+        self.corpus_headings = {}
+        self.output_file = None
+        # The automaton for the last headings, reused while they stay the same
+        self.matcher = None
+    
+    def run(self, root):
+        heading_table = self.md.heading_table
+        if (self.title is not None and len(root) and root[0].tag == 'h1'
+                and heading_table and heading_table[0][0] == self.title):
+            root.remove(root[0])
+        
+        headings = self.headings if self.headings is not None else linkable_headings(heading_table)
+        if headings:
+            self._link_related_sections(root, headings)
+        if headings or (self.corpus_headings and self.output_file):
+            self._link_chapter_references(root, headings)
+    
+    def _resolve(self, text):
+        """Split text into (source, plain text) segments around placeholders"""
+        segments = []
+        position = 0
+        for match in TEXT_PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > position:
+                segments.append((text[position:match.start()], text[position:match.start()]))
+            placeholder = match.group(0)
+            if placeholder.startswith(util.STX + 'wzxhzdk:'):
+                raw = self.md.htmlStash.rawHtmlBlocks[int(placeholder[9:-1])]
+                plain = html.unescape(strip_tags(raw)) if isinstance(raw, str) else ''.join(raw.itertext())
+            else:
+                plain = chr(int(placeholder[1:-1]))
+            segments.append((placeholder, plain))
+            position = match.end()
+        if position < len(text):
+            segments.append((text[position:], text[position:]))
+        return segments
+    
+    def _link_related_sections(self, root, headings):
+        """Link heading titles mentioned in "Related Chapters" list items"""
+        sections = []
+        for parent in root.iter():
+            children = list(parent)
+            for index, child in enumerate(children):
+                if child.tag not in HEADING_TAGS or not RELATED_MARKER_PATTERN.search(''.join(child.itertext())):
+                    continue
+                # The section runs up to the next heading
+                items = []
+                for sibling in children[index + 1:]:
+                    if sibling.tag in HEADING_TAGS:
+                        break
+                    items.extend(
+                        item for item in sibling.iter('li')
+                        if not item.attrib and not len(item) and item.text
+                    )
+                if items:
+                    sections.append(items)
+        if not sections:
+            return
+        
+        if self.matcher is None or self.matcher.source is not headings:
+            self.matcher = HeadingMatcher(headings)
+        matcher = self.matcher
+        for items in sections:
+            resolved = [self._resolve(item.text) for item in items]
+            texts = [''.join(plain for _, plain in segments) for segments in resolved]
+            
+            # A section is linked against the first heading (in document
+            # order) that appears in any of its list items
+            best = None
+            for text in texts:
+                for index, _ in matcher.find_all(text):
+                    if best is None or index < best:
+                        best = index
+            if best is None:
+                continue
+            
+            heading_text = matcher.headings[best]
+            for item, segments, text in zip(items, resolved, texts):
+                position = text.find(heading_text)
+                if position == -1:
+                    continue
+                bounds = self._source_bounds(segments, position, position + len(heading_text))
+                if bounds is None:
+                    continue
+                start, end = bounds
+                link = etree.Element('a', {'href': f'#{headings[heading_text]}'})
+                link.text = item.text[start:end]
+                link.tail = item.text[end:]
+                item.text = item.text[:start]
+                item.append(link)
+    
+    def _source_bounds(self, segments, start, end):
+        """Map a plain-text span back to the source text, or None if it splits a placeholder"""
+        bounds = []
+        source_offset = plain_offset = 0
+        for source, plain in segments:
+            for target in (start, end)[len(bounds):]:
+                if not plain_offset <= target <= plain_offset + len(plain):
+                    break
+                if source == plain:
+                    bounds.append(source_offset + target - plain_offset)
+                elif target == plain_offset:
+                    bounds.append(source_offset)
+                elif target == plain_offset + len(plain):
+                    bounds.append(source_offset + len(source))
+                else:
+                    return None
+            source_offset += len(source)
+            plain_offset += len(plain)
+        return tuple(bounds) if len(bounds) == 2 else None
+    
+    def _link_chapter_references(self, element, headings):
+        """Link text nodes reading "Chapter N: <heading>" or "Appendix X: <heading>" """
+        if element.tag in ('a', 'pre', 'code'):
+            return
+        
+        index = 0
+        link = self._reference_link(element.text, headings)
+        if link is not None:
+            element.text = None
+            element.insert(index, link)
+            index += 1
+        
+        for child in list(element):
+            index += 1
+            self._link_chapter_references(child, headings)
+            link = self._reference_link(child.tail, headings)
+            if link is not None:
+                child.tail = None
+                element.insert(index, link)
+                index += 1
+    
+    def _reference_link(self, text, headings):
+        """Return a link wrapping text if it is a reference to a heading, else None"""
+        if not text or isinstance(text, util.AtomicString) or ': ' not in text:
+            return None
+        plain = ''.join(plain for _, plain in self._resolve(text))
+        match = CHAPTER_REFERENCE_PATTERN.fullmatch(plain)
+        if not match:
+            return None
+        heading_text = match.group('heading')
+        if heading_text in headings:
+            href = f'#{headings[heading_text]}'
+        elif heading_text in self.corpus_headings and self.output_file:
+            target_file, heading_id = self.corpus_headings[heading_text]
+            if target_file == self.output_file:
+                return None
+            href = f'{relative_url(target_file, os.path.dirname(self.output_file))}#{heading_id}'
+        else:
+            return None
+        link = etree.Element('a', {'href': href})
+        link.text = text
+        return link
+
+
+class DocumentDefinitionsTreeprocessor(FootnoteTreeprocessor):
+    """Footnote treeprocessor that lets the sections of a document share its definitions
+    
+    A whole document gets its footnote list as usual. When a section is
+    rendered on its own, self.definitions holds the document's definitions:
+    
+        {'references': {id: (url, title)}, 'abbreviations': {abbr: title},
+         'footnotes': [(id, text)]}
+    
+    Before the inline patterns run, the section's own definitions are
+    recorded in self.found and the document's take their place, so links,
+    abbreviations and footnote numbers resolve as in the whole document.
+    No footnote list is added, unless self.footnote_refs holds the
+    {'fnref:id': count} of the document's footnote references: then the
+    document's list goes where the footnote placeholder is, with a back
+    link for each reference, and self.found holds the definitions made in
+    the footnotes, which a whole document applies last.
+    """
+    
+    def __init__(self, md, footnotes):
+        super().__init__(footnotes)
+        self.md = md
+        self.definitions = None
+        self.footnote_refs = None
+        self.found = None
+    
+    def run(self, root):
+        if self.definitions is None:
+            super().run(root)
+            return
+        
+        md = self.md
+        footnotes = self.footnotes
+        abbreviations = md.treeprocessors['abbr'].abbrs
+        self.found = {
+            'references': dict(md.references),
+            'abbreviations': dict(abbreviations),
+            'footnotes': list(footnotes.footnotes.items()),
+        }
+        md.references.update(self.definitions['references'])
+        abbreviations.update(self.definitions['abbreviations'])
+        own_footnotes = footnotes.footnotes
+        footnotes.footnotes = OrderedDict(self.definitions['footnotes'])
+        for footnote_id, text in own_footnotes.items():
+            footnotes.footnotes.setdefault(footnote_id, text)
+        
+        if self.footnote_refs is not None:
+            # Later references, inside footnotes, continue the document's numbering
+            separator = footnotes.get_separator()
+            footnotes.found_refs = dict(self.footnote_refs)
+            for ref, count in self.footnote_refs.items():
+                prefix, rest = ref.split(separator, 1)
+                footnotes.used_refs.add(ref)
+                footnotes.used_refs.update(f'{prefix}{number}{separator}{rest}' for number in range(2, count + 1))
+            # Footnotes are parsed here, but their links and abbreviations
+            # are only resolved by the inline patterns
+            references = md.references
+            md.references = {}
+            abbreviations.clear()
+            super().run(root)
+            self.found = {'references': md.references, 'abbreviations': dict(abbreviations), 'footnotes': []}
+            md.references = {**references, **md.references}
+            abbreviations.update(self.definitions['abbreviations'])
+            abbreviations.update(self.found['abbreviations'])
+
+
+class UnstrippedOutputPostprocessor(Postprocessor):
+    """Record the rendered output before Markdown.convert strips it"""
+    
+    def run(self, text):
+        self.md.unstripped_output = text
+        return text
+
+
+class CachedCodeHilite(CodeHilite):
+    """CodeHilite that reuses blocks from the HighlightCache in its options
+    
+    CodeHiliteExtension forwards unknown settings to each highlighter, so the
+    cache arrives as the highlight_cache option. Without one this behaves
+    exactly like CodeHilite.
+    """
+    
+    def __init__(self, src, **options):
+        self.highlight_cache = options.pop('highlight_cache', None)
+        super().__init__(src, **options)
+    
+    def cache_key(self, shebang=True):
+        """Return the HighlightCache key for this block"""
+        settings = dict(
+            self.options,
+            lang=self.lang,
+            guess_lang=self.guess_lang,
+            use_pygments=self.use_pygments,
+            lang_prefix=self.lang_prefix,
+            pygments_formatter=self.pygments_formatter,
+        )
+        payload = json.dumps(
+            [pygments.__version__, shebang, settings, self.src.strip('\n')],
+            sort_keys=True,
+            default=repr
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def hilite(self, shebang=True):
+        if self.highlight_cache is None:
+            return super().hilite(shebang)
+        
+        key = self.cache_key(shebang)
+        content = self.highlight_cache.get(key)
+        if content is None:
+            content = super().hilite(shebang)
+            self.highlight_cache.put(key, content)
+        return content
+
+
+class CachedHiliteTreeprocessor(HiliteTreeprocessor):
+    """HiliteTreeprocessor that highlights indented code blocks with CachedCodeHilite"""
+    
+    def run(self, root):
+        for block in root.iter('pre'):
+            if len(block) == 1 and block[0].tag == 'code':
+                local_config = self.config.copy()
+                text = block[0].text
+                if text is None:
+                    continue
+                code = CachedCodeHilite(
+                    self.code_unescape(text),
+                    tab_length=self.md.tab_length,
+                    style=local_config.pop('pygments_style', 'default'),
+                    **local_config
+                )
+                placeholder = self.md.htmlStash.store(code.hilite())
+                # The placeholder paragraph is replaced by the stashed HTML
+                block.clear()
+                block.tag = 'p'
+                block.text = placeholder
+
+
+class CachedCodeHiliteExtension(CodeHiliteExtension):
+    """CodeHiliteExtension whose highlighter reuses the highlight_cache option's blocks"""
+    
+    def extendMarkdown(self, md):
+        hiliter = CachedHiliteTreeprocessor(md)
+        hiliter.config = self.getConfigs()
+        md.treeprocessors.register(hiliter, 'hilite', 30)
+        md.registerExtension(self)
+
+
+class CachedFencedBlockPreprocessor(FencedBlockPreprocessor):
+    """FencedBlockPreprocessor that highlights with CachedCodeHilite
+    
+    Follows the stock run() block for block, so the output is the same.
+    """
+    
+    def run(self, lines):
+        if not self.checked_for_deps:
+            for ext in self.md.registeredExtensions:
+                if isinstance(ext, CodeHiliteExtension):
+                    self.codehilite_conf = ext.getConfigs()
+                if isinstance(ext, AttrListExtension):
+                    self.use_attr_list = True
+            self.checked_for_deps = True
+        
+        text = '\n'.join(lines)
+        index = 0
+        while True:
+            m = self.FENCED_BLOCK_RE.search(text, index)
+            if not m:
+                break
+            lang, id_value, classes, config = None, '', [], {}
+            if m.group('attrs'):
+                attrs, remainder = get_attrs_and_remainder(m.group('attrs'))
+                if remainder:
+                    # Unbalanced braces are not a fence; skip past them
+                    index = m.end('attrs')
+                    continue
+                id_value, classes, config = self.handle_attrs(attrs)
+                if classes:
+                    lang = classes.pop(0)
+            else:
+                if m.group('lang'):
+                    lang = m.group('lang')
+                if m.group('hl_lines'):
+                    config['hl_lines'] = parse_hl_lines(m.group('hl_lines'))
+            
+            if self.codehilite_conf and self.codehilite_conf['use_pygments'] and config.get('use_pygments', True):
+                local_config = self.codehilite_conf.copy()
+                local_config.update(config)
+                # Pygments may suffix css_class, so the block's classes go first
+                if classes:
+                    local_config['css_class'] = '{} {}'.format(' '.join(classes), local_config['css_class'])
+                highliter = CachedCodeHilite(
+                    m.group('code'),
+                    lang=lang,
+                    style=local_config.pop('pygments_style', 'default'),
+                    **local_config
+                )
+                code = highliter.hilite(shebang=False)
+            else:
+                id_attr = lang_attr = class_attr = kv_pairs = ''
+                if lang:
+                    prefix = self.config.get('lang_prefix', 'language-')
+                    lang_attr = f' class="{prefix}{_escape_attrib_html(lang)}"'
+                if classes:
+                    class_attr = f' class="{_escape_attrib_html(" ".join(classes))}"'
+                if id_value:
+                    id_attr = f' id="{_escape_attrib_html(id_value)}"'
+                if self.use_attr_list and config and not config.get('use_pygments', False):
+                    kv_pairs = ''.join(
+                        f' {k}="{_escape_attrib_html(v)}"' for k, v in config.items() if k != 'use_pygments'
+                    )
+                code = self._escape(m.group('code'))
+                code = f'<pre{id_attr}{class_attr}><code{lang_attr}{kv_pairs}>{code}</code></pre>'
+            
+            placeholder = self.md.htmlStash.store(code)
+            text = f'{text[:m.start()]}\n{placeholder}\n{text[m.end():]}'
+            index = m.start() + 1 + len(placeholder)
+        return text.split('\n')
+
+
+class CachedFencedCodeExtension(FencedCodeExtension):
+    """FencedCodeExtension whose fenced blocks are highlighted with CachedCodeHilite"""
+    
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        md.preprocessors.register(CachedFencedBlockPreprocessor(md, self.getConfigs()), 'fenced_code_block', 25)
+
+
+def highlight_block(block):
+    """Highlight one fenced code block given as (code, options)"""
+    code, options = block
+    return CachedCodeHilite(code, **options).hilite(shebang=False)
+
+
+class HighlightPrefetchPreprocessor(Preprocessor):
+    """Highlight a document's uncached fenced code blocks in parallel
+    
+    Runs just before fenced_code and fills the highlight cache, so the
+    blocks it then highlights one at a time are all cache hits. Blocks
+    with {attribute} lists are left to fenced_code.
+    """
+    
+    def __init__(self, md, highlight_cache, jobs):
+        super().__init__(md)
+        self.highlight_cache = highlight_cache
+        self.jobs = jobs
+    
+    def run(self, lines):
+        # The same settings fenced_code takes from the last codehilite extension
+        codehilite_conf = {}
+        for ext in self.md.registeredExtensions:
+            if isinstance(ext, CodeHiliteExtension):
+                codehilite_conf = ext.getConfigs()
+        if not codehilite_conf.get('use_pygments'):
+            return lines
+        
+        pending = {}
+        for match in FencedBlockPreprocessor.FENCED_BLOCK_RE.finditer('\n'.join(lines)):
+            if match.group('attrs'):
+                continue
+            options = dict(codehilite_conf, lang=match.group('lang') or None)
+            if match.group('hl_lines'):
+                options['hl_lines'] = parse_hl_lines(match.group('hl_lines'))
+            options['style'] = options.pop('pygments_style', 'default')
+            options.pop('highlight_cache', None)
+            
+            key = CachedCodeHilite(match.group('code'), **options).cache_key(shebang=False)
+            if key not in pending and self.highlight_cache.get(key) is None:
+                pending[key] = (match.group('code'), options)
+        
+        # Starting worker processes only pays off for many blocks
+        if len(pending) >= PARALLEL_HIGHLIGHT_MIN_BLOCKS:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                chunksize = max(1, len(pending) // (self.jobs * 4))
+                for key, content in zip(pending, executor.map(highlight_block, pending.values(), chunksize=chunksize)):
+                    self.highlight_cache.put(key, content)
+        return lines
+
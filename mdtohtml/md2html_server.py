@@ -0,0 +1,373 @@
+"""
+HTTP servers for the Markdown to HTML converter: live reload for watch mode
+and the render service started by --serve
+"""
+
+import hashlib
+import json
+import signal
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+# Watch mode pages subscribe to this server-sent events endpoint
+LIVE_RELOAD_PATH = '/__livereload'
+LIVE_RELOAD_SCRIPT = f'''<script>
+new EventSource('{LIVE_RELOAD_PATH}').onmessage = function (event) {{
+    if (event.data === decodeURIComponent(location.pathname)) location.reload();
+}};
+</script>
+'''
+
+# The render service (--serve) converts markdown POSTed to this path
+RENDER_PATH = '/render'
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+# Rendered pages kept for repeated requests
+RESPONSE_CACHE_SIZE = 64 * 1024 * 1024
+# Requests waiting per worker before the service answers 503
+PENDING_REQUESTS_PER_JOB = 8
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 5
+
+
+class LiveReloadServer(ThreadingHTTPServer):
+    """HTTP server for watch mode that tells open pages when to reload"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, directory, verbose=False):
+        self.directory = directory
+        self.verbose = verbose
+        self.generation = 0
+        self.changes = deque(maxlen=100)
+        self.changed = threading.Condition()
+        super().__init__(address, LiveReloadHandler)
+    
+    def notify(self, output_file):
+        """Push a reload to pages showing output_file"""
+        path = '/' + Path(output_file).relative_to(self.directory).as_posix()
+        with self.changed:
+            self.generation += 1
+            self.changes.append((self.generation, path))
+            self.changed.notify_all()
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    """Serve generated pages with the live reload client injected"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(args[2].directory), **kwargs)
+    
+    def do_GET(self):
+        if self.path == LIVE_RELOAD_PATH:
+            self._stream_reloads()
+        elif self.path.split('?', 1)[0].endswith('.html'):
+            self._send_page()
+        else:
+            super().do_GET()
+    
+    def _send_page(self):
+        """Send an HTML page with the reload script before </body>"""
+        try:
+            with open(self.translate_path(self.path), 'r', encoding='utf-8') as f:
+                page = f.read()
+        except OSError:
+            self.send_error(404, 'File not found')
+            return
+        
+        body = page.replace('</body>', LIVE_RELOAD_SCRIPT + '</body>', 1).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _stream_reloads(self):
+        """Hold a server-sent events stream open and send changed page paths"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        
+        server = self.server
+        with server.changed:
+            seen = server.generation
+        try:
+            while True:
+                with server.changed:
+                    server.changed.wait_for(lambda: server.generation > seen, timeout=15)
+                    changes = [path for generation, path in server.changes if generation > seen]
+                    seen = server.generation
+                # An empty comment keeps idle connections alive
+                message = ''.join(f'data: {path}\n\n' for path in changes) or ': ping\n\n'
+                self.wfile.write(message.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+# Converter owned by each render service worker, built once by init_render_worker
+render_converter = None
+
+
+def init_render_worker(converter_class, converter_options):
+    """Build and warm one converter per render service worker"""
+    global render_converter
+    # Ctrl+C reaches the whole process group; the server drains requests instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Portals re-render edited documents, so reuse their unchanged sections
+    render_converter = converter_class(**converter_options, section_cache=True)
+    render_converter._render_markdown('')
+
+
+def render_request(md_content, name):
+    """Render one service request to an encoded page with the worker's converter"""
+    return ''.join(render_converter.render_content(md_content, Path.cwd() / name)).encode('utf-8')
+
+
+def prune_render_worker():
+    """Keep the worker's highlight cache within its size, at most once per interval"""
+    render_converter.highlight_cache.prune(throttle=True)
+
+
+class ResponseCache:
+    """Rendered pages by ETag, dropping the least recently used beyond max_bytes"""
+    
+    def __init__(self, max_bytes=RESPONSE_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached page for key, or None"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            return self.entries.get(key)
+    
+    def put(self, key, page):
+        """Cache page under key"""
+        with self.lock:
+            if key in self.entries or len(page) > self.max_bytes:
+                return
+            self.entries[key] = page
+            self.size += len(page)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class RenderServer(ThreadingHTTPServer):
+    """HTTP service that renders POSTed markdown with a pool of warm converters
+    
+    Each worker builds its converter as converter_class(**converter_options).
+    A worker that dies, for instance killed for running out of memory, is
+    replaced by a new one. Request threads are joined by server_close(), so
+    requests in flight are answered before the workers stop.
+    """
+    
+    daemon_threads = False
+    
+    def __init__(self, address, converter_class, converter_options, jobs=1, max_pending=None, verbose=False):
+        self.verbose = verbose
+        self.stopping = False
+        self.converter_class = converter_class
+        self.converter_options = converter_options
+        self.settings = converter_class(**converter_options).settings()
+        # Workers share an on-disk highlight cache, which only pruning bounds
+        self.prunes_highlight_cache = bool(converter_options.get('highlight_cache'))
+        self.cache = ResponseCache()
+        self.pending = threading.BoundedSemaphore(max_pending or jobs * PENDING_REQUESTS_PER_JOB)
+        # One single-process pool per worker, so a document can be sent back
+        # to the worker holding its rendered sections
+        self.executors = [self._start_worker() for _ in range(jobs)]
+        self.busy = [0] * jobs
+        self.busy_lock = threading.Lock()
+        # Start the workers now so the first requests don't pay for it
+        for executor in self.executors:
+            executor.submit(time.sleep, 0).result()
+        super().__init__(address, RenderHandler)
+    
+    def _start_worker(self):
+        """Return a new single-process pool whose worker builds the converter"""
+        return ProcessPoolExecutor(
+            max_workers=1,
+            initializer=init_render_worker,
+            initargs=(self.converter_class, self.converter_options)
+        )
+    
+    def _restart_worker(self, index, broken):
+        """Replace worker index's broken pool, unless another request already has"""
+        with self.busy_lock:
+            if self.executors[index] is broken:
+                self.executors[index] = self._start_worker()
+                broken.shutdown(wait=False)
+    
+    def render(self, md_content, name):
+        """Render md_content in the worker that name hashes to, or an idle one if it is busy"""
+        with self.busy_lock:
+            index = zlib.crc32(name.encode('utf-8')) % len(self.executors)
+            if self.busy[index] and 0 in self.busy:
+                index = self.busy.index(0)
+            self.busy[index] += 1
+        try:
+            # A dead worker is replaced and the request tried once more
+            for attempt in range(2):
+                executor = self.executors[index]
+                try:
+                    page = executor.submit(render_request, md_content, name).result()
+                    break
+                except BrokenProcessPool:
+                    self._restart_worker(index, executor)
+                    if attempt:
+                        raise
+            # Queued behind the render, so the response doesn't wait for it
+            if self.prunes_highlight_cache:
+                try:
+                    executor.submit(prune_render_worker)
+                except BrokenProcessPool:
+                    pass
+            return page
+        finally:
+            with self.busy_lock:
+                self.busy[index] -= 1
+    
+    def etag(self, body, name):
+        """Return the ETag of the page for markdown body, from its content and the settings"""
+        settings = json.dumps([self.settings, name], sort_keys=True).encode('utf-8')
+        return '"' + hashlib.sha256(settings + b'\0' + body).hexdigest()[:32] + '"'
+    
+    def shutdown(self):
+        self.stopping = True
+        super().shutdown()
+    
+    def server_close(self):
+        super().server_close()
+        for executor in self.executors:
+            executor.shutdown()
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """Answer POST /render with the page for the markdown in the body
+    
+    The optional name query parameter is the file name the title falls
+    back to. Pages carry an ETag derived from the markdown and settings,
+    so a client sending it back in If-None-Match gets a 304 without a render.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEP_ALIVE_TIMEOUT
+    
+    def do_GET(self):
+        if urlsplit(self.path).path != '/health':
+            self._send(404, b'Not found\n', 'text/plain; charset=utf-8')
+            return
+        status = {'version': self.server.settings['version'], 'cached_pages': len(self.server.cache.entries)}
+        self._send(200, json.dumps(status).encode('utf-8'), 'application/json')
+    
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != RENDER_PATH:
+            self.close_connection = True
+            self._send(404, b'Not found\n', 'text/plain; charset=utf-8')
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self._send(411, b'Content-Length required\n', 'text/plain; charset=utf-8')
+            return
+        if length < 0:
+            self.close_connection = True
+            self._send(400, b'Invalid Content-Length\n', 'text/plain; charset=utf-8')
+            return
+        if length > MAX_REQUEST_SIZE:
+            self.close_connection = True
+            self._send(413, b'Markdown too large\n', 'text/plain; charset=utf-8')
+            return
+        body = self.rfile.read(length)
+        
+        name = Path(parse_qs(url.query).get('name', ['document'])[0]).stem or 'document'
+        server = self.server
+        etag = server.etag(body, f'{name}.md')
+        if_none_match = self.headers.get('If-None-Match', '')
+        # '*' matches any current page, which a POST has none of, so it is ignored
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if etag in tags or 'W/' + etag in tags:
+            self._send(304, b'', etag=etag)
+            return
+        
+        page = server.cache.get(etag)
+        if page is None:
+            try:
+                md_content = body.decode('utf-8')
+            except UnicodeDecodeError:
+                self._send(400, b'Markdown must be UTF-8\n', 'text/plain; charset=utf-8')
+                return
+            if not server.pending.acquire(blocking=False):
+                self._send(503, b'Too many pending requests\n', 'text/plain; charset=utf-8', retry_after=1)
+                return
+            try:
+                page = server.render(md_content, f'{name}.md')
+            except BrokenProcessPool:
+                self._send(503, b'Worker stopped while rendering\n', 'text/plain; charset=utf-8', retry_after=1)
+                return
+            except Exception as e:
+                self._send(500, f'Error rendering markdown: {e}\n'.encode('utf-8'), 'text/plain; charset=utf-8')
+                return
+            finally:
+                server.pending.release()
+            server.cache.put(etag, page)
+        self._send(200, page, etag=etag)
+    
+    def _send(self, status, body, content_type='text/html; charset=utf-8', etag=None, retry_after=None):
+        if self.server.stopping:
+            self.close_connection = True
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if retry_after:
+            self.send_header('Retry-After', str(retry_after))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(converter_class, converter_options, host='127.0.0.1', port=8000, jobs=1, max_pending=None, verbose=False):
+    """Run the render service until SIGINT or SIGTERM, then finish requests in flight"""
+    server = RenderServer((host, port), converter_class, converter_options, jobs, max_pending, verbose)
+    
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it needs its own thread
+        threading.Thread(target=server.shutdown).start()
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Serving POST http://{host}:{server.server_port}{RENDER_PATH} "
+          f"with {jobs} worker(s) (Ctrl+C to stop)")
+    server.serve_forever()
+    server.server_close()
+    print("Stopped serving")
+    return 0
+
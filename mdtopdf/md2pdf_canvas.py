@@ -0,0 +1,57 @@
+"""
+Page canvas for md2pdf: numbered pages with a header and footer
+"""
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+
+
+class NumberedCanvas(canvas.Canvas):
+    def __init__(self, *args, **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self._saved_page_states = []
+        self.page_num = 0
+        self.total_pages = 0
+
+    def showPage(self):
+        self._saved_page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        num_pages = len(self._saved_page_states)
+        for state in self._saved_page_states:
+            self.__dict__.update(state)
+            self.draw_page_number(num_pages)
+            canvas.Canvas.showPage(self)
+        canvas.Canvas.save(self)
+
+    def draw_page_number(self, page_count):
+        self.page_num += 1
+        
+        # Modern design elements with gradient effect
+        self.setStrokeColor(colors.HexColor("#E0E0E0"))
+        self.setLineWidth(0.5)
+        
+        # Header line with gradient effect
+        for i in range(3):
+            opacity = 1.0 - (i * 0.3)
+            self.setStrokeColorRGB(0.878, 0.878, 0.878, opacity)
+            self.line(inch, letter[1] - inch * 0.75 + i, letter[0] - inch, letter[1] - inch * 0.75 + i)
+        
+        # Footer line
+        self.setStrokeColor(colors.HexColor("#E0E0E0"))
+        self.line(inch, inch * 0.75, letter[0] - inch, inch * 0.75)
+        
+        # Page numbers
+        self.setFont("Helvetica", 9)
+        self.setFillColor(colors.HexColor("#666666"))
+        self.drawRightString(letter[0] - inch, inch * 0.5, f"Page {self.page_num} of {page_count}")
+        
+        # Copyright notice
+        self.drawString(inch, inch * 0.5, "Copyright Tiran Dagan, Signalsphere")
+        
+        # Header with document title
+        self.setFont("Helvetica-Bold", 10)
+        self.setFillColor(colors.HexColor("#2C3E50"))
+        self.drawCentredString(letter[0] / 2, letter[1] - inch * 0.5, "Sutherland Global Services - AI Innovation Strategy")